@@ -0,0 +1,99 @@
+"""
+Verifica os backends do cache unificado (memória e Redis).
+
+Roda o mesmo roteiro nos dois: round-trip de DataFrame/dict, isolamento por
+tenant, limpeza por tenant/região, TTL e single-flight. Para o Redis usa o
+fakeredis se estiver instalado; com --redis-url usa um servidor real.
+
+Uso:
+    python check_cache_backends.py [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import threading
+import time
+
+import pandas as pd
+
+from utils.cache import BICache, InvalidSignature, MemoryBackend, RedisBackend, dumps, loads
+
+
+def check(label, cache: BICache):
+    print(f"--- {label} ---")
+    df = pd.DataFrame({"n_mes": range(1, 13), "v_faturamento": [i * 1000.5 for i in range(12)]})
+
+    cache.set("faturamento", (2025,), df, tenant_id="11111111000111")
+    cache.set("filters", (), {"industries": [{"for_codigo": 1, "for_nomered": "ACME"}]}, tenant_id="11111111000111")
+    cache.set("faturamento", (2025,), df.head(1), tenant_id="22222222000122")
+
+    got = cache.get("faturamento", (2025,), tenant_id="11111111000111")
+    assert got is not None and got.equals(df), "DataFrame round-trip"
+    assert len(cache.get("faturamento", (2025,), tenant_id="22222222000122")) == 1, "isolamento por tenant"
+    assert cache.get("faturamento", (2024,), tenant_id="11111111000111") is None, "miss"
+    print("  round-trip / tenants: ok")
+
+    # Alterar o valor devolvido (como os payloads de full_tab/insights) não muda o cache
+    cache.get("filters", (), tenant_id="11111111000111")["industries"].clear()
+    got["v_faturamento"] = 0.0
+    assert cache.get("filters", (), tenant_id="11111111000111")["industries"], "cópia do dict"
+    assert cache.get("faturamento", (2025,), tenant_id="11111111000111").equals(df), "cópia do DataFrame"
+    print("  valor devolvido é cópia: ok")
+
+    cache.clear(tenant_id="11111111000111", region="faturamento")
+    assert cache.get("faturamento", (2025,), tenant_id="11111111000111") is None
+    assert cache.get("filters", (), tenant_id="11111111000111") is not None
+    assert cache.get("faturamento", (2025,), tenant_id="22222222000122") is not None
+    cache.clear(tenant_id="22222222000122")
+    assert cache.get("faturamento", (2025,), tenant_id="22222222000122") is None
+    print("  clear por tenant/região: ok")
+
+    cache.set("kpis", ("ttl",), {"v": 1}, ttl=1, tenant_id="t")
+    time.sleep(1.1)
+    assert cache.get("kpis", ("ttl",), tenant_id="t") is None, "TTL"
+    print("  TTL: ok")
+
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total": 42}
+
+    threads = [threading.Thread(target=lambda: cache.get_or_compute("kpis", ("sf",), slow, tenant_id="t")) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, f"single-flight: {len(calls)} cálculos"
+    print(f"  single-flight: ok (coalesced={cache.stats()['regions']['kpis']['coalesced']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    big = pd.DataFrame({"cliente": [f"CLIENTE {i}" for i in range(5000)], "valor": range(5000)})
+    secret = b"bi-check"
+    print(f"Serialização DataFrame 5000x2: {len(big.to_json()) / 1024:.1f} KiB json -> "
+          f"{len(dumps(big, secret)) / 1024:.1f} KiB")
+    assert loads(dumps(big, secret), secret).equals(big)
+    forged = dumps(big, b"outra-chave")
+    try:
+        loads(forged, secret)
+        raise AssertionError("valor com assinatura de outra chave foi aceito")
+    except InvalidSignature:
+        print("  assinatura: ok (valor forjado rejeitado)")
+
+    check("memory", BICache(MemoryBackend()))
+
+    if args.redis_url:
+        import redis
+        client = redis.Redis.from_url(args.redis_url)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("--- redis: pulado (instale fakeredis ou use --redis-url) ---")
+            raise SystemExit(0)
+        client = fakeredis.FakeRedis()
+    check("redis", BICache(RedisBackend(client=client, prefix="bi-check", secret=secret)))
@@ -0,0 +1,98 @@
+"""
+Regressão de planos: os filtros de período (services/periods.py) precisam usar
+índice em pedidos.ped_data.
+
+Roda EXPLAIN (FORMAT JSON) com enable_seqscan=off: um predicado sargável vira
+Index/Bitmap scan com `ped_data` no Index Cond; EXTRACT(YEAR FROM ped_data)
+só escapa do Seq Scan com índice de expressão. Sai com código 1 se algum
+filtro do builder perder o índice.
+
+Uso:
+    python check_period_indexes.py [--schema ro_consult] [--ano 2025]
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import text
+
+from services.database import engine_local
+from services.periods import (
+    filtro_meses, filtro_periodo, filtro_periodo_sql,
+    periodo_ano, periodo_anterior, periodo_mes, resolve_periodo,
+)
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(conn, sql, params):
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(_walk(plan[0]["Plan"]))
+
+
+def usa_indice_data(nodes):
+    seq_pedidos = any(n["Node Type"] == "Seq Scan" and n.get("Relation Name") == "pedidos" for n in nodes)
+    index_data = any("ped_data" in (n.get("Index Cond") or "") for n in nodes)
+    return index_data and not seq_pedidos
+
+
+def casos(ano: int):
+    ano_sql, ano_params = filtro_periodo(*periodo_ano(ano))
+    mes_sql, mes_params = filtro_periodo(*periodo_mes(ano, 3))
+    range_sql, range_params = filtro_periodo(*resolve_periodo(ano, None, f"{ano}-02-10", f"{ano}-04-20"))
+    meses_sql, meses_params = filtro_meses(ano, ["1", "3", "7"])
+    atual_sql, atual_params = filtro_periodo(*resolve_periodo(ano, 5), nome="atual")
+    ant_sql, ant_params = filtro_periodo(*periodo_anterior(ano, 5), nome="anterior")
+
+    base = "SELECT SUM(p.ped_totliq) FROM pedidos p WHERE p.ped_situacao IN ('P', 'F') AND "
+    return [
+        ("ano", base + ano_sql, ano_params, True),
+        ("mês", base + mes_sql, mes_params, True),
+        ("range", base + range_sql, range_params, True),
+        ("lista de meses", base + meses_sql, meses_params, True),
+        ("atual OR anterior", base + f"(({atual_sql}) OR ({ant_sql}))", {**atual_params, **ant_params}, True),
+        ("literal (client_dashboard)", base + filtro_periodo_sql(*periodo_ano(ano)), {}, True),
+        # Controle (só informativo): o padrão antigo depende do índice de expressão
+        ("EXTRACT (antigo)", base + "EXTRACT(YEAR FROM p.ped_data) = :ano", {"ano": ano}, None),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schema", default=None)
+    parser.add_argument("--ano", type=int, default=2025)
+    args = parser.parse_args()
+
+    falhas = 0
+    with engine_local.connect() as conn:
+        if args.schema:
+            conn.execute(text(f'SET search_path TO "{args.schema}", public'))
+        conn.execute(text("SET enable_seqscan = off"))
+
+        indices = conn.execute(text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = 'pedidos' AND indexdef LIKE '%ped_data%' AND schemaname = current_schema()"
+        )).fetchall()
+        if not indices:
+            print("⚠️  Nenhum índice em pedidos.ped_data: rode optimize_bi_performance.py")
+            sys.exit(1)
+        for nome, definicao in indices:
+            print(f"   {nome}: {definicao}")
+
+        for label, sql, params, esperado in casos(args.ano):
+            nodes = explain(conn, sql, params)
+            tipos = ", ".join(sorted({n["Node Type"] for n in nodes}))
+            if esperado is None:
+                print(f"ℹ️  {label:<28} {tipos}")
+                continue
+            ok = usa_indice_data(nodes)
+            print(f"{'✅' if ok else '❌'} {label:<28} {tipos}")
+            falhas += 0 if ok else 1
+
+    sys.exit(1 if falhas else 0)
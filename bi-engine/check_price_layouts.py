@@ -0,0 +1,131 @@
+"""
+Verifica que um layout de tabela de preço aceito numa importação é reaproveitado
+pelo /api/price-table/analyze-sheet sem chamar a IA (services/price_layouts.py).
+
+Sobe o router de importação num app FastAPI de teste (TestClient), com a
+tabela bi_price_layouts simulada em memória e a IA / o merge no banco
+substituídos por dublês que contam as chamadas:
+  1. analyze-sheet com industry_id -> sem layout salvo, mapeamento via IA
+  2. import com o mapeamento aceito -> layout gravado para a indústria
+  3. analyze-sheet do mesmo arquivo com industry_id -> "layout", IA não chamada
+  4. mesmo arquivo com outra indústria / sem indústria -> IA de novo
+
+Uso:
+    python check_price_layouts.py
+"""
+import io
+import json
+import sys
+from unittest import mock
+
+import openpyxl
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import price_table_import
+from services import price_layouts
+
+MAPPING = {"codigo": 1, "descricao": 2, "preco": 3}
+
+
+def synthetic_xlsx() -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Tabela"
+    ws.append(["DISTRIBUIDORA EXEMPLO LTDA"])
+    ws.append(["Item", "Código", "Descrição", "Preço"])
+    for i in range(20):
+        ws.append([i + 1, f"{i:06d}", f"PRODUTO {i}", 10 + i * 0.5])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+class LayoutTable:
+    """bi_price_layouts em memória: o upsert de save_layout e a busca de find_layout"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, _statement, params):
+        self.rows[(params["fingerprint"], params["industria"])] = {
+            "fingerprint": params["fingerprint"], "industria": params["industria"],
+            "header_row": params["header_row"], "data_start_row": params["data_start_row"],
+            "mapping": params["mapping"],
+        }
+
+    def lookup(self, _sql, params):
+        return [row for (fingerprint, industria), row in self.rows.items()
+                if fingerprint in params["fingerprints"] and industria == params["industria"]]
+
+
+def main():
+    table = LayoutTable()
+    ai_calls = []
+
+    def fake_ai(sample_text, total_cols):
+        ai_calls.append(total_cols)
+        return {"header_row": 1, "data_start_row": 2, "mapping": MAPPING}
+
+    def fake_import(chunks, mapping, industria, tabela):
+        return {"inserted": 20, "updated": 0, "skipped": 0, "prices_inserted": 20, "prices_updated": 0,
+                "errors": [], "ms": 0}
+
+    app = FastAPI()
+    app.include_router(price_table_import.router)
+    client = TestClient(app)
+    data = synthetic_xlsx()
+
+    def analyze(industry_id=None):
+        form = {"sheet_name": "Tabela"}
+        if industry_id is not None:
+            form["industry_id"] = industry_id
+        response = client.post("/api/price-table/analyze-sheet", data=form,
+                               files={"file": ("tabela.xlsx", data)})
+        assert response.status_code == 200, response.text
+        return response.json()["data"]
+
+    falhas = 0
+    with mock.patch.object(price_layouts, "_has_table", return_value=True), \
+            mock.patch.object(price_layouts, "get_current_engine", return_value=table), \
+            mock.patch.object(price_layouts, "execute_rows", table.lookup), \
+            mock.patch.object(price_table_import, "analyze_with_ai", fake_ai), \
+            mock.patch.object(price_table_import, "import_price_rows", fake_import):
+        first = analyze("7")
+        response = client.post("/api/price-table/import", data={
+            "sheet_name": "Tabela", "mapping": json.dumps(first["mapping"]), "header_row": first["header_row"],
+            "data_start_row": first["data_start_row"], "industry_id": "7", "table_name": "LP TESTE",
+            "session_id": first["session_id"],
+        })
+        assert response.status_code == 200, response.text
+
+        second = analyze("7")
+        other = analyze("8")
+        without = analyze()
+
+    checks = [
+        ("1º upload usa a IA", first["mapping_source"] == "ai"),
+        ("import grava o layout", len(table.rows) == 1),
+        ("2º upload reaproveita o layout", second["mapping_source"] == "layout"),
+        ("layout traz o mesmo mapeamento", second["mapping"] == MAPPING and second["header_row"] == 1),
+        ("outra indústria não usa o layout", other["mapping_source"] == "ai"),
+        ("sem indústria não usa o layout", without["mapping_source"] == "ai"),
+        ("IA chamada só quando não há layout", len(ai_calls) == 3),
+    ]
+    for label, ok in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+        falhas += not ok
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
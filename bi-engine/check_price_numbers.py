@@ -0,0 +1,62 @@
+"""
+Verifica a leitura de preços/percentuais em texto da importação de tabela de preço
+(services/price_import._numbers, usada por build_staging_rows).
+
+Texto com vírgula é pt-BR: os pontos são separador de milhar ("1.234,50" ->
+1234.50). Sem vírgula o ponto é decimal ("1234.5"). Confere a coluna só de
+texto e a misturada (texto + números do Excel), e que a linha com preço
+"R$ 1.234,50" não é rejeitada.
+
+Uso:
+    python check_price_numbers.py
+"""
+import math
+import sys
+
+import pandas as pd
+
+from services.price_import import ROW_COLUMNS, _numbers, build_staging_rows
+
+CASES = [
+    ("1.234,50", 1234.50),
+    ("R$ 1.234,50", 1234.50),
+    ("1234.5", 1234.5),
+    ("10,5", 10.5),
+    ("R$ 2.000.000,01", 2000000.01),
+    ("12%", 12.0),
+    ("abc", None),
+    (None, None),
+]
+
+
+def same(got, expected) -> bool:
+    if expected is None:
+        return got is None or math.isnan(got)
+    return got is not None and abs(got - expected) < 1e-9
+
+
+def main():
+    falhas = 0
+    textos = [texto for texto, _ in CASES]
+    for label, serie in (("texto", pd.Series(textos, dtype=object)),
+                         ("misturada", pd.Series(textos + [3.5], dtype=object))):
+        got = _numbers(serie).tolist()
+        for (texto, expected), value in zip(CASES, got):
+            if not same(value, expected):
+                print(f"❌ [{label}] {texto!r}: esperado {expected}, veio {value}")
+                falhas += 1
+
+    chunk = pd.DataFrame([["A1", "PRODUTO", "R$ 1.234,50"], ["A2", "PRODUTO", "1234.5"]], index=[1, 2])
+    rows, skipped, errors = build_staging_rows(chunk, {"codigo": 0, "descricao": 1, "preco": 2})
+    precos = [row[ROW_COLUMNS.index("precobruto")] for row in rows]
+    if skipped or errors or not all(same(p, 1234.5) for p in precos):
+        print(f"❌ build_staging_rows: preços {precos}, ignoradas {skipped}, erros {errors}")
+        falhas += 1
+
+    if not falhas:
+        print(f"✅ {len(CASES)} formatos de número lidos corretamente")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
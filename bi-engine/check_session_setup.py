@@ -0,0 +1,77 @@
+"""
+Verifica o setup de sessão por conexão (utils/db_session.py).
+
+Conta os comandos que passam pelo SQLAlchemy durante N chamadas de
+execute_query/execute_rows e falha se algum SET for enviado por query.
+Também confere que os parâmetros da sessão continuam valendo depois de a
+conexão voltar ao pool (o rollback do checkin não pode desfazer os SETs).
+
+Uso:
+    python check_session_setup.py [--queries 50] [--schema ro_consult]
+"""
+import argparse
+import sys
+
+from sqlalchemy import create_engine, event
+
+from config import DATABASE_URL, DB_APPLICATION_NAME, DB_STATEMENT_TIMEOUT_MS
+from services.database import execute_rows, execute_scalar_row
+from utils.db_session import install_session_setup
+from utils.tenant_context import tenant_engine_var
+
+
+def main(queries: int, schema: str = None):
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    install_session_setup(engine, search_path=schema)
+
+    statements = []
+    conexoes = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, stmt, *a: statements.append(stmt))
+    event.listen(engine, "connect", lambda dbapi_conn, rec: conexoes.append(1))
+
+    token = tenant_engine_var.set(engine)
+    try:
+        for _ in range(queries):
+            execute_rows("SELECT 1 AS ok")
+        settings = execute_scalar_row("""
+            SELECT current_setting('client_encoding') AS client_encoding,
+                   current_setting('application_name') AS application_name,
+                   current_setting('statement_timeout') AS statement_timeout,
+                   current_setting('search_path') AS search_path
+        """)
+    finally:
+        tenant_engine_var.reset(token)
+        engine.dispose()
+
+    sets = [s for s in statements if s.lstrip().upper().startswith("SET ")]
+    print(f"Queries: {queries + 1} | comandos enviados: {len(statements)} | SETs por query: {len(sets)} | conexões físicas: {len(conexoes)}")
+    print(f"Sessão: {settings}")
+
+    falhas = []
+    if sets:
+        falhas.append(f"{len(sets)} SET(s) enviados por query")
+    if not settings:
+        falhas.append("não foi possível ler os parâmetros da sessão")
+    else:
+        if settings["client_encoding"].upper() != "UTF8":
+            falhas.append(f"client_encoding={settings['client_encoding']}")
+        if settings["application_name"] != DB_APPLICATION_NAME:
+            falhas.append(f"application_name={settings['application_name']}")
+        if DB_STATEMENT_TIMEOUT_MS and settings["statement_timeout"] in ("0", ""):
+            falhas.append("statement_timeout não aplicado")
+        if schema and schema not in settings["search_path"]:
+            falhas.append(f"search_path={settings['search_path']}")
+
+    for f in falhas:
+        print(f"❌ {f}")
+    if not falhas:
+        print("✅ Setup de sessão aplicado uma vez por conexão, nenhum SET por query")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--schema", default=None)
+    args = parser.parse_args()
+    sys.exit(main(args.queries, args.schema))
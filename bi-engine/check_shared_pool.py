@@ -0,0 +1,91 @@
+"""
+Verifica o modo de pool compartilhado (DB_POOL_MODE=shared).
+
+Um único engine (pool pequeno) atende vários schemas; requisições de
+tenants diferentes rodam intercaladas em threads, cada uma com seu contexto,
+e conferem o search_path que a conexão realmente tem. Qualquer divergência
+é vazamento de schema entre tenants. Testa os dois caminhos usados no BI:
+execute_* (SQLAlchemy) e raw_connection() (produtos / importação de tabelas).
+
+Uso:
+    python check_shared_pool.py [--schemas 8] [--requests 400] [--threads 32]
+"""
+import argparse
+import contextvars
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
+
+from services.database import execute_scalar_row, get_current_engine
+from config import DATABASE_URL
+from utils.tenant_context import TenantEngineRegistry, tenant_engine_var, tenant_schema_var
+
+
+def db_config_from_url(url: str, schema: str) -> dict:
+    u = urlparse(url)
+    return {
+        "host": u.hostname, "port": u.port or 5432, "database": u.path.lstrip("/"),
+        "user": unquote(u.username or ""), "password": unquote(u.password or ""), "schema": schema,
+    }
+
+
+def request(registry, schema: str, raw: bool):
+    """Simula uma requisição do tenant: contexto próprio + query"""
+    def run():
+        tenant_engine_var.set(registry.get_engine(db_config_from_url(DATABASE_URL, schema), tenant=schema))
+        tenant_schema_var.set(schema)
+        time.sleep(random.random() / 200)
+        if raw:
+            conn = get_current_engine().raw_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT current_setting('search_path'), pg_backend_pid()")
+                search_path, pid = cur.fetchone()
+                cur.close()
+            finally:
+                conn.close()
+        else:
+            row = execute_scalar_row("SELECT current_setting('search_path') AS sp, pg_backend_pid() AS pid")
+            search_path, pid = row["sp"], row["pid"]
+        return schema, search_path, pid
+    return contextvars.copy_context().run(run)
+
+
+def main(n_schemas: int, n_requests: int, n_threads: int):
+    registry = TenantEngineRegistry(shared=True, pool_min=2, pool_max=2)
+    schemas = [f"bi_check_tenant_{i}" for i in range(n_schemas)]
+
+    jobs = [(random.choice(schemas), i % 3 == 0) for i in range(n_requests)]
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        results = list(pool.map(lambda job: request(registry, *job), jobs))
+
+    leaks = [(esperado, obtido) for esperado, obtido, _ in results if obtido.strip('"') != esperado]
+    pids = {pid for _, _, pid in results}
+    stats = registry.stats()
+
+    # Checkout sem tenant no contexto volta para o schema padrão
+    def sem_tenant():
+        tenant_engine_var.set(registry.get_engine(db_config_from_url(DATABASE_URL, schemas[0])))
+        return execute_scalar_row("SELECT current_setting('search_path') AS sp")["sp"]
+    default_sp = contextvars.Context().run(sem_tenant)
+    registry.dispose_all()
+
+    print(f"Requisições: {len(results)} | schemas: {n_schemas} | engines: {stats['engines']} | "
+          f"conexões físicas distintas: {len(pids)} (pool {stats['tenants'][0]['pool_size']}+{stats['tenants'][0]['max_overflow']})")
+    print(f"Checkout sem tenant: search_path={default_sp}")
+    for esperado, obtido in leaks[:10]:
+        print(f"❌ vazamento: esperado {esperado}, conexão com {obtido}")
+    ok = not leaks and stats["engines"] == 1 and default_sp.strip('"') == "public"
+    print("✅ Nenhum vazamento de schema" if ok else "❌ Falhou")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemas", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+    sys.exit(main(args.schemas, args.requests, args.threads))
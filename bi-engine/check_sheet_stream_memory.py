@@ -0,0 +1,151 @@
+"""
+Verifica que a leitura em streaming da tabela de preço (services/price_sheet.iter_sheet_chunks)
+mantém a memória limitada ao lote.
+
+Gera xlsx sintéticos com N linhas em dois formatos: o do openpyxl write_only
+(textos inline, sem <dimension>) e o do Excel (tabela de textos compartilhados
+em xl/sharedStrings.xml e <dimension> no início da aba). Compara o pico de
+memória Python (tracemalloc) de:
+  - pd.read_excel: a aba inteira em memória (modo antigo)
+  - iter_sheet_chunks: lotes de PRICE_IMPORT_CHUNK_ROWS linhas, descartados a cada passo,
+    lidos de um arquivo temporário como o UploadFile do /import
+O pico do streaming deve ficar praticamente igual entre N e 4xN (a tabela de
+textos compartilhados do xlsx fica em arquivo temporário, não no heap).
+
+Uso:
+    python check_sheet_stream_memory.py [--rows 50000] [--chunk 5000]
+"""
+import argparse
+import io
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+import openpyxl
+import pandas as pd
+
+from services.price_sheet import iter_sheet_chunks
+
+
+HEADER = ["Código", "Descrição", "Preço", "IPI", "Aplicação"]
+
+
+def synthetic_rows(rows: int):
+    for i in range(rows):
+        yield [f"{i:08d}", f"PRODUTO SINTETICO {i}", round(10 + i % 997 * 0.37, 2), 5.0,
+               f"APLICACAO {i % 211} LINHA LEVE"]
+
+
+def synthetic_xlsx(rows: int) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Tabela")
+    ws.append(HEADER)
+    for row in synthetic_rows(rows):
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+    "xl/workbook.xml": (
+        f'<workbook {_NS} xmlns:r="{_REL_NS}"><sheets>'
+        '<sheet name="Tabela" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+        '</Relationships>'),
+}
+
+
+def excel_style_xlsx(rows: int) -> bytes:
+    """Como o Excel grava: textos em xl/sharedStrings.xml (um por código/descrição) e <dimension>"""
+    strings = {}
+
+    def cell(col: str, row: int, value) -> str:
+        if isinstance(value, str):
+            idx = strings.setdefault(value, len(strings))
+            return f'<c r="{col}{row}" t="s"><v>{idx}</v></c>'
+        return f'<c r="{col}{row}"><v>{value}</v></c>'
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _PARTS.items():
+            zf.writestr(name, xml)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(f'<worksheet {_NS}><dimension ref="A1:E{rows + 1}"/><sheetData>'.encode())
+            for number, values in enumerate([HEADER, *synthetic_rows(rows)], start=1):
+                cells = "".join(cell(col, number, v) for col, v in zip("ABCDE", values))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode())
+            sheet.write(b"</sheetData></worksheet>")
+        with zf.open("xl/sharedStrings.xml", "w") as sst:
+            sst.write(f'<sst {_NS} count="{len(strings)}" uniqueCount="{len(strings)}">'.encode())
+            for text in strings:
+                sst.write(f"<si><t>{escape(text)}</t></si>".encode())
+            sst.write(b"</sst>")
+    return buffer.getvalue()
+
+
+def peak_mb(func) -> tuple:
+    tracemalloc.start()
+    try:
+        count = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return count, peak / 1024 / 1024
+
+
+def main(rows: int, chunk: int):
+    falhas = 0
+    for label, build in (("write_only", synthetic_xlsx), ("excel", excel_style_xlsx)):
+        picos = []
+        for n in (rows, rows * 4):
+            with tempfile.TemporaryFile() as upload:
+                upload.write(build(n))
+                size = upload.tell()
+                total, pico = peak_mb(lambda: sum(len(c) for c in iter_sheet_chunks(upload, "Tabela", 1, chunk)))
+            picos.append(pico)
+            print(f"iter_sheet_chunks [{label:>10}] {n:>8} linhas ({size / 1024 / 1024:5.1f} MB): "
+                  f"{total:>8} lidas | pico {pico:7.1f} MB")
+            falhas += total != n
+
+        # 4x mais linhas não pode custar muito mais memória no streaming
+        if picos[1] > picos[0] * 1.5 + 5:
+            print(f"❌ [{label}] Memória do streaming cresceu com a planilha ({picos[0]:.1f} -> {picos[1]:.1f} MB)")
+            falhas += 1
+
+    data = synthetic_xlsx(rows)
+    total, pico = peak_mb(lambda: len(pd.read_excel(io.BytesIO(data), sheet_name="Tabela", header=None)) - 1)
+    print(f"pd.read_excel     [write_only] {rows:>8} linhas: {total:>8} lidas | pico {pico:7.1f} MB")
+
+    if not falhas:
+        print("✅ Leitura em streaming com memória limitada ao lote")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk", type=int, default=5000)
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.chunk))
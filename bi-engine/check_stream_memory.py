@@ -0,0 +1,69 @@
+"""
+Verifica que o streaming com cursor no servidor (services/database.stream_rows)
+mantém a memória constante.
+
+Lê N linhas sintéticas (generate_series, ~200 bytes por linha) de duas formas e
+compara o pico de memória Python (tracemalloc):
+  - execute_rows: resultado inteiro carregado de uma vez (modo antigo)
+  - stream_rows: lotes de DB_STREAM_BATCH_SIZE via fetchmany
+O pico do streaming deve ficar praticamente igual entre N e 10xN.
+
+Uso:
+    python check_stream_memory.py [--rows 200000] [--batch 2000]
+"""
+import argparse
+import sys
+import tracemalloc
+
+from services.database import execute_rows, stream_rows
+
+QUERY = """
+    SELECT g AS id, md5(g::text) AS nome, repeat('x', 150) AS descricao, g * 1.5 AS total
+    FROM generate_series(1, :n) g
+"""
+
+
+def peak_mb(func) -> tuple:
+    tracemalloc.start()
+    try:
+        count = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return count, peak / 1024 / 1024
+
+
+def carregado(n: int):
+    return len(execute_rows(QUERY, {"n": n}))
+
+
+def streaming(n: int, batch: int):
+    return sum(len(lote) for lote in stream_rows(QUERY, {"n": n}, batch_size=batch))
+
+
+def main(rows: int, batch: int):
+    falhas = 0
+    picos = []
+    for n in (rows, rows * 10):
+        total, pico = peak_mb(lambda: streaming(n, batch))
+        picos.append(pico)
+        print(f"stream_rows   {n:>9} linhas: {total:>9} lidas | pico {pico:8.1f} MB")
+        falhas += total != n
+    total, pico = peak_mb(lambda: carregado(rows))
+    print(f"execute_rows  {rows:>9} linhas: {total:>9} lidas | pico {pico:8.1f} MB")
+
+    # 10x mais linhas não pode custar muito mais memória no streaming
+    if picos[1] > picos[0] * 2 + 5:
+        print(f"❌ Memória do streaming cresceu com o resultado ({picos[0]:.1f} -> {picos[1]:.1f} MB)")
+        falhas += 1
+    if not falhas:
+        print("✅ Streaming com memória constante")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=2000)
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.batch))
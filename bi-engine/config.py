@@ -1,4 +1,5 @@
 import os
+import tempfile
 import urllib.parse
 from dotenv import load_dotenv
 
@@ -26,5 +27,54 @@ print(f"DEBUG: Connecting to {DB_USER}:***@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 
+# Parâmetros de sessão do Postgres (aplicados uma vez por conexão, ver utils/db_session.py)
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "salesmasters-bi")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 300000))
+
+# Registro de engines por tenant: orçamento global de conexões por worker,
+# máximo de engines vivos, TTL de ociosidade e faixa de pool_size por tenant
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 200))
+DB_MAX_ENGINES = int(os.getenv("DB_MAX_ENGINES", 50))
+DB_ENGINE_IDLE_TTL = int(os.getenv("DB_ENGINE_IDLE_TTL", 600))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+# "schema": um pool por host/banco/schema; "shared": um pool por host/banco/usuário
+# servindo todos os schemas (search_path trocado no checkout)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "schema").lower()
+
+# Thread-pool para queries/cálculos bloqueantes (fora do event loop)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 16))
+# Máximo de tarefas simultâneas de um mesmo tenant no pool
+DB_TENANT_CONCURRENCY = int(os.getenv("DB_TENANT_CONCURRENCY", 4))
+# Seções de um painel (utils/sections.py): simultâneas por requisição e timeout de cada uma (s)
+DB_SECTION_CONCURRENCY = int(os.getenv("DB_SECTION_CONCURRENCY", 4))
+DB_SECTION_TIMEOUT = float(os.getenv("DB_SECTION_TIMEOUT", 30))
+# Linhas por fetchmany nos resultados em streaming (cursor nomeado, services/database.stream_rows)
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", 2000))
+
+# Cache unificado do BI (LRU + TTL, por tenant)
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 300))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 5000))
+CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB", 256))
+# Backend do cache: "memory" (por processo) ou "redis" (compartilhado entre workers)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "bi")
+# Chave HMAC dos valores gravados no Redis (obrigatória para CACHE_BACKEND=redis; igual em todos os workers)
+CACHE_REDIS_SECRET = os.getenv("CACHE_REDIS_SECRET", "")
+# Sessão de importação de tabela de preço: aba lida uma vez e mantida no cache por N segundos
+PRICE_SHEET_TTL = int(os.getenv("PRICE_SHEET_TTL", 1800))
+# Acima deste tamanho (MB) a planilha é lida em streaming (openpyxl read_only), em lotes de N linhas
+PRICE_SHEET_STREAM_MB = int(os.getenv("PRICE_SHEET_STREAM_MB", 20))
+PRICE_IMPORT_CHUNK_ROWS = int(os.getenv("PRICE_IMPORT_CHUNK_ROWS", 5000))
+# Jobs de importação em segundo plano (services/import_jobs.py): pasta do estado/arquivos e jobs simultâneos
+PRICE_JOBS_DIR = os.getenv("PRICE_JOBS_DIR", os.path.join(tempfile.gettempdir(), "bi-price-jobs"))
+PRICE_JOBS_WORKERS = int(os.getenv("PRICE_JOBS_WORKERS", 2))
+# Job na fila/rodando sem heartbeat há mais de N segundos é dado como interrompido (pode ser retomado)
+PRICE_JOBS_STALE = int(os.getenv("PRICE_JOBS_STALE", 60))
+
+# Cubo diário de vendas (sql/bi_fato_vendas_diario.sql): "auto" usa quando existir no schema, "off" ignora
+BI_FATO_VENDAS = os.getenv("BI_FATO_VENDAS", "auto").lower()
+
 # CORS
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
@@ -0,0 +1,68 @@
+"""
+Cria/atualiza o cubo diário de vendas (sql/bi_fato_vendas_diario.sql)
+em todos os schemas que têm a tabela pedidos.
+
+    python create_fato_vendas.py                 # cria tabelas/triggers + carga inicial
+    python create_fato_vendas.py --refresh       # refresh incremental (cron)
+    python create_fato_vendas.py --refresh --full
+    python create_fato_vendas.py --schema ro_consult --refresh
+"""
+import argparse
+import os
+import time
+
+from services.database_native import db
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), 'sql', 'bi_fato_vendas_diario.sql')
+
+
+def list_schemas():
+    rows = db.execute_query("""
+        SELECT table_schema FROM information_schema.tables
+        WHERE table_name = 'pedidos'
+          AND table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+        ORDER BY table_schema
+    """)
+    return [r['table_schema'] for r in rows]
+
+
+def run_in_schema(schema: str, sql: str, params=None):
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'SET search_path TO "{schema}"')
+            cur.execute(sql, params)
+            return cur.fetchone() if cur.description else None
+
+
+def create(schema: str):
+    with open(SQL_PATH, 'r', encoding='utf-8') as f:
+        sql_content = f.read()
+    run_in_schema(schema, sql_content)
+    print("   ✅ Estrutura criada")
+    refresh(schema, full=True)
+
+
+def refresh(schema: str, full: bool = False):
+    start = time.time()
+    row = run_in_schema(schema, "SELECT fn_bi_fato_vendas_refresh(%s)", (full,))
+    dias = row[0] if row else 0
+    print(f"   📊 Refresh {'completo' if full else 'incremental'}: {dias} dias em {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refresh", action="store_true", help="Só atualiza (não recria estrutura)")
+    parser.add_argument("--full", action="store_true", help="Reconstrói o cubo inteiro")
+    parser.add_argument("--schema", default=None, help="Processa apenas este schema")
+    args = parser.parse_args()
+
+    schemas = [args.schema] if args.schema else list_schemas()
+    for schema in schemas:
+        print(f"📦 Schema: {schema}")
+        try:
+            if args.refresh:
+                refresh(schema, full=args.full)
+            else:
+                create(schema)
+        except Exception as e:
+            print(f"   ❌ Erro: {e}")
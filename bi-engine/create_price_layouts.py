@@ -0,0 +1,48 @@
+"""
+Cria a tabela de layouts conhecidos de tabela de preço (sql/bi_price_layouts.sql)
+em todos os schemas que têm cad_prod.
+
+    python create_price_layouts.py
+    python create_price_layouts.py --schema ro_consult
+"""
+import argparse
+import os
+
+from services.database_native import db
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), 'sql', 'bi_price_layouts.sql')
+
+
+def list_schemas():
+    rows = db.execute_query("""
+        SELECT table_schema FROM information_schema.tables
+        WHERE table_name = 'cad_prod'
+          AND table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+        ORDER BY table_schema
+    """)
+    return [r['table_schema'] for r in rows]
+
+
+def create(schema: str, sql: str):
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'SET search_path TO "{schema}"')
+            cur.execute(sql)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schema", default=None, help="Processa apenas este schema")
+    args = parser.parse_args()
+
+    with open(SQL_PATH, 'r', encoding='utf-8') as f:
+        sql_content = f.read()
+
+    schemas = [args.schema] if args.schema else list_schemas()
+    for schema in schemas:
+        print(f"📦 Schema: {schema}")
+        try:
+            create(schema, sql_content)
+            print("   ✅ bi_price_layouts")
+        except Exception as e:
+            print(f"   ❌ Erro: {e}")
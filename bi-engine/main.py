@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import CORS_ORIGINS
 from routers import dashboard, narratives, portfolio, abc_intelligence, metas, equipe, produtos, price_table_import
+from utils.serialization import FastJSONResponse
 from utils.tenant_context import db_context_middleware
 
 # ... app setup ...
@@ -10,7 +11,8 @@ from utils.tenant_context import db_context_middleware
 app = FastAPI(
     title="SalesMasters BI Engine",
     description="Microserviço Python para análises de BI e processamento de dados",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Multi-tenant Middleware
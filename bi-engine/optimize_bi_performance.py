@@ -18,7 +18,11 @@ def optimize_performance():
             continue
 
         queries = [
-            # Functional indexes for Date filtros (Year/Month)
+            # Date filtros: os services usam ranges half-open (services/periods.py)
+            f"CREATE INDEX IF NOT EXISTS idx_pedidos_data_{schema} ON {schema}.pedidos (ped_data);",
+            f"CREATE INDEX IF NOT EXISTS idx_pedidos_industria_data_{schema} ON {schema}.pedidos (ped_industria, ped_data);",
+            
+            # Functional indexes (Year/Month): ainda usados pelas functions SQL (fn_curva_abc, views)
             f"CREATE INDEX IF NOT EXISTS idx_pedidos_data_year_{schema} ON {schema}.pedidos (EXTRACT(YEAR FROM ped_data));",
             f"CREATE INDEX IF NOT EXISTS idx_pedidos_data_month_{schema} ON {schema}.pedidos (EXTRACT(MONTH FROM ped_data));",
             
@@ -0,0 +1,91 @@
+"""
+Load test: latência do /health enquanto rotas analíticas pesadas rodam.
+
+Sobe o app em processo (ASGI, sem rede) e dispara N requisições pesadas em
+paralelo, medindo o /health a cada poucos ms. Com o trabalho de banco fora do
+event loop o p99 do /health deve ficar no mesmo patamar do baseline.
+
+Uso:
+    python profile_health_latency.py [--heavy 24] [--tenant-config '<json>']
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from main import app
+
+HEAVY_ROUTES = [
+    "/api/dashboard/summary?ano=2025",
+    "/api/dashboard/comparison?ano=2025",
+    "/api/dashboard/industry-growth?ano=2025",
+    "/api/dashboard/analytics/full-tab?ano=2025",
+    "/api/analytics/abc-intelligence?ano=2025",
+    "/api/metas/status?ano=2025",
+]
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def report(label, samples):
+    if not samples:
+        print(f"{label}: sem amostras")
+        return
+    print(
+        f"{label}: n={len(samples)} "
+        f"p50={percentile(samples, 50):.2f}ms "
+        f"p99={percentile(samples, 99):.2f}ms "
+        f"max={max(samples):.2f}ms "
+        f"mean={statistics.mean(samples):.2f}ms"
+    )
+
+
+async def sample_health(client, stop: asyncio.Event, interval: float = 0.01):
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def run(heavy: int, baseline_seconds: float, headers: dict):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bi", headers=headers, timeout=300) as client:
+        # Baseline: /health sozinho
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_health(client, stop))
+        await asyncio.sleep(baseline_seconds)
+        stop.set()
+        report("/health (idle)", await sampler)
+
+        # Sob carga: rotas pesadas em paralelo
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_health(client, stop))
+        start = time.perf_counter()
+        routes = [HEAVY_ROUTES[i % len(HEAVY_ROUTES)] for i in range(heavy)]
+        results = await asyncio.gather(*(client.get(r) for r in routes), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        report("/health (under load)", await sampler)
+
+        errors = sum(1 for r in results if isinstance(r, Exception) or r.status_code >= 500)
+        print(f"Heavy requests: {heavy} em {elapsed:.2f}s ({errors} erros)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heavy", type=int, default=24)
+    parser.add_argument("--baseline", type=float, default=2.0)
+    parser.add_argument("--tenant-config", default=None, help="JSON do header x-tenant-db-config")
+    args = parser.parse_args()
+
+    headers = {"x-tenant-db-config": args.tenant_config} if args.tenant_config else {}
+    asyncio.run(run(args.heavy, args.baseline, headers))
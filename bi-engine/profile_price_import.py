@@ -0,0 +1,110 @@
+"""
+Benchmark da importação de tabela de preço (services/price_import.py).
+
+Gera uma planilha sintética (mesmo layout de colunas do mapeamento da IA) e mede:
+  - parse das linhas (build_staging_rows), sem banco;
+  - COPY para a staging + merge set-based em cad_prod/cad_tabelaspre;
+  - o fluxo antigo (3 round-trips por linha) numa amostra, extrapolado para o total.
+Tudo roda numa transação desfeita no final (ROLLBACK): nada fica gravado.
+
+Uso:
+    python profile_price_import.py [--rows 50000] [--industria 1] [--tabela BENCH] [--sample 500] [--no-db]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.database import get_current_engine
+from services.price_import import build_staging_rows, merge_staging_rows
+
+MAPPING = {"codigo": 0, "descricao": 1, "preco": 2, "preco_promocao": 3, "ipi": 4, "st": 5,
+           "embalagem": 6, "ncm": 7, "codbarras": 8}
+
+
+def _mix(mask, a, b):
+    """np.where que preserva tipos mistos (texto, float, NaN) como na leitura do Excel"""
+    out = np.empty(len(mask), dtype=object)
+    out[:] = list(np.broadcast_to(np.asarray(b, dtype=object), len(mask)))
+    out[mask] = np.broadcast_to(np.asarray(a, dtype=object), len(mask))[mask]
+    return out
+
+
+def synthetic(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Planilha com células vazias, preços em texto ('12,50') e códigos formatados"""
+    rng = np.random.default_rng(seed)
+    precos = rng.gamma(2.0, 40.0, rows).round(2)
+    df = pd.DataFrame({
+        0: [f"{i // 1000:02d}.{i % 1000:03d}-BX" for i in range(rows)],
+        1: [f"PRODUTO SINTETICO {i}" for i in range(rows)],
+        2: _mix(rng.random(rows) < 0.5, precos, [f"{p:.2f}".replace(".", ",") for p in precos]),
+        3: _mix(rng.random(rows) < 0.7, np.nan, (precos * 0.9).round(2)),
+        4: _mix(rng.random(rows) < 0.3, np.nan, 5.0),
+        5: _mix(rng.random(rows) < 0.5, np.nan, "3,5%"),
+        6: rng.integers(1, 50, rows).astype(float),
+        7: _mix(rng.random(rows) < 0.2, np.nan, 87089990.0),
+        8: rng.integers(7890000000000, 7899999999999, rows).astype(float),
+    })
+    # cabeçalho na linha 0, dados a partir da 1
+    df.index = range(1, rows + 1)
+    return df
+
+
+def legacy_sample(cur, data_df, industria, tabela, sample):
+    """Round-trips por linha do fluxo antigo (sem o batch de fn_upsert_preco)"""
+    start = time.perf_counter()
+    for row in data_df.head(sample).itertuples(index=False):
+        codigo = str(row[0]).strip()
+        cur.execute(
+            """SELECT pro_id FROM cad_prod
+               WHERE pro_industria = %s AND LTRIM(REPLACE(TRIM(pro_codprod), '.', ''), '0') = %s""",
+            (industria, codigo.replace(".", "").lstrip("0"))
+        )
+        cur.fetchone()
+        cur.execute("SELECT fn_upsert_produto(%s, %s, %s)", (industria, codigo, row[1]))
+        pro_id = cur.fetchone()[0]
+        cur.execute(
+            "SELECT itab_precobruto FROM cad_tabelaspre WHERE itab_idprod = %s AND itab_tabela = %s",
+            (pro_id, tabela)
+        )
+        cur.fetchone()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--industria", type=int, default=1)
+    parser.add_argument("--tabela", default="BENCH")
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--no-db", action="store_true")
+    args = parser.parse_args()
+
+    data_df = synthetic(args.rows)
+    start = time.perf_counter()
+    rows, skipped, errors = build_staging_rows(data_df, MAPPING)
+    t_parse = time.perf_counter() - start
+    print(f"Planilha sintética: {args.rows} linhas | válidas {len(rows)} | ignoradas {skipped} | erros {len(errors)}")
+    print(f"parse:              {t_parse * 1000:10.1f} ms")
+    if args.no_db:
+        raise SystemExit(0)
+
+    conn = get_current_engine().raw_connection()
+    try:
+        start = time.perf_counter()
+        counts = merge_staging_rows(conn, [rows], args.industria, args.tabela, commit=False)
+        t_merge = time.perf_counter() - start
+        print(f"COPY + merge:       {t_merge * 1000:10.1f} ms | {counts}")
+        conn.rollback()
+
+        cur = conn.cursor()
+        t_sample = legacy_sample(cur, data_df, args.industria, args.tabela, args.sample)
+        cur.close()
+        conn.rollback()
+        t_legacy = t_sample / args.sample * len(rows)
+        print(f"fluxo antigo:       {t_legacy * 1000:10.1f} ms (estimado a partir de {args.sample} linhas)")
+        print(f"Speed-up: {t_legacy / (t_parse + t_merge):.0f}x")
+    finally:
+        conn.rollback()
+        conn.close()
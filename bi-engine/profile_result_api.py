@@ -0,0 +1,106 @@
+"""
+Benchmark: DataFrame (execute_query) vs. fast path sem DataFrame
+(execute_rows / execute_scalar_row / execute_columns).
+
+Mede CPU por requisição e alocações (tracemalloc) só da materialização do
+resultado, usando linhas sintéticas num SQLite em memória com o mesmo formato
+dos KPIs do dashboard (1 linha x 10 colunas) e de listas curtas (50 x 6).
+
+Uso:
+    python profile_result_api.py            # sintético
+    python profile_result_api.py --live     # contra o banco configurado
+"""
+import argparse
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, text
+
+from services.database import (
+    _to_dataframe, _to_dicts, _to_tuples, _first_dict, _to_columns,
+    execute_query, execute_scalar_row
+)
+
+KPI_COLUMNS = [
+    "total_vendido_current", "qtd_pedidos_current", "clientes_atendidos_current",
+    "quantidade_vendida_current", "ticket_medio_current", "total_vendido_prev",
+    "qtd_pedidos_prev", "clientes_atendidos_prev", "quantidade_vendida_prev", "ticket_medio_prev"
+]
+LIST_COLUMNS = ["cliente", "pedidos", "ano_anterior", "ano_atual", "variacao", "status"]
+
+
+def build_sqlite():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE kpi ({', '.join(c + ' REAL' for c in KPI_COLUMNS)})"))
+        conn.execute(
+            text(f"INSERT INTO kpi VALUES ({', '.join(':' + c for c in KPI_COLUMNS)})"),
+            {c: float(i * 1000 + 1) for i, c in enumerate(KPI_COLUMNS)}
+        )
+        conn.execute(text("CREATE TABLE lista (cliente TEXT, pedidos INT, ano_anterior INT, ano_atual INT, variacao REAL, status TEXT)"))
+        conn.execute(
+            text("INSERT INTO lista VALUES (:cliente, :pedidos, :ano_anterior, :ano_atual, :variacao, :status)"),
+            [
+                {"cliente": f"CLIENTE {i}", "pedidos": i, "ano_anterior": i * 2, "ano_atual": i * 3,
+                 "variacao": i * 1.5, "status": "Crescendo"}
+                for i in range(50)
+            ]
+        )
+    return engine
+
+
+def measure(label, engine, query, consume, iterations):
+    with engine.connect() as conn:
+        # CPU
+        cpu_start = time.process_time()
+        for _ in range(iterations):
+            consume(conn.execute(text(query)))
+        cpu_us = (time.process_time() - cpu_start) / iterations * 1e6
+
+        # Alocações de uma execução
+        tracemalloc.start()
+        consume(conn.execute(text(query)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"  {label:<22} cpu={cpu_us:8.1f}us/req  peak_alloc={peak / 1024:7.1f} KiB")
+
+
+def run_synthetic(iterations):
+    engine = build_sqlite()
+
+    print(f"--- KPI (1 linha x {len(KPI_COLUMNS)} colunas), {iterations} iterações ---")
+    measure("DataFrame", engine, "SELECT * FROM kpi", _to_dataframe, iterations)
+    measure("execute_scalar_row", engine, "SELECT * FROM kpi", _first_dict, iterations)
+
+    print(f"--- Lista (50 linhas x {len(LIST_COLUMNS)} colunas), {iterations} iterações ---")
+    measure("DataFrame + records", engine, "SELECT * FROM lista", lambda r: _to_dataframe(r).to_dict('records'), iterations)
+    measure("execute_rows (dict)", engine, "SELECT * FROM lista", _to_dicts, iterations)
+    measure("execute_rows (tuple)", engine, "SELECT * FROM lista", _to_tuples, iterations)
+    measure("execute_columns", engine, "SELECT * FROM lista", _to_columns, iterations)
+
+
+def run_live(iterations):
+    query = "SELECT SUM(ped_totliq) as total, COUNT(*) as qtd FROM pedidos WHERE ped_situacao IN ('P', 'F')"
+    print(f"--- Live: {iterations} iterações ---")
+    for label, func in (("execute_query", execute_query), ("execute_scalar_row", execute_scalar_row)):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for _ in range(iterations):
+            func(query)
+        print(
+            f"  {label:<22} wall={(time.perf_counter() - wall_start) / iterations * 1000:.2f}ms/req "
+            f"cpu={(time.process_time() - cpu_start) / iterations * 1000:.2f}ms/req"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(min(args.iterations, 200))
+    else:
+        run_synthetic(args.iterations)
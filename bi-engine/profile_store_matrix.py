@@ -0,0 +1,94 @@
+"""
+Benchmark da matriz Grupos de Lojas x Indústrias (client_dashboard.get_store_industry_matrix).
+
+Compara o laço antigo (máscara booleana por grupo e por indústria) com o
+pivot vetorizado em _pivot_store_matrix, sobre um resultado sintético do
+mesmo formato da query (grupo, ped_industria, valor), e confere que o JSON
+produzido é o mesmo. Com os parâmetros padrão o laço antigo leva minutos.
+
+Uso:
+    python profile_store_matrix.py [--groups 5000] [--industries 60] [--density 0.3]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.client_dashboard import _pivot_store_matrix
+
+
+def legacy_matrix(df, industry_ids, industry_names):
+    """Implementação anterior (O(grupos x indústrias x linhas))"""
+    id_to_name = dict(zip(industry_ids, industry_names))
+    rows = []
+    column_totals = {name: 0.0 for name in industry_names}
+    grand_total = 0.0
+    for grupo in df['grupo'].unique():
+        grupo_data = df[df['grupo'] == grupo]
+        values = {}
+        row_total = 0.0
+        for ind_id in industry_ids:
+            ind_name = id_to_name[ind_id]
+            match = grupo_data[grupo_data['ped_industria'] == ind_id]
+            val = float(match.iloc[0]['valor']) if not match.empty else 0.0
+            values[ind_name] = val
+            row_total += val
+            column_totals[ind_name] += val
+        grand_total += row_total
+        rows.append({"grupo": grupo, "values": values, "total": row_total})
+    rows.sort(key=lambda x: x['total'], reverse=True)
+    column_totals['total'] = grand_total
+    return {"industries": industry_names, "rows": rows[:20], "totals": column_totals}
+
+
+def synthetic(groups: int, industries: int, density: float, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    industry_ids = list(range(1, industries + 1))
+    industry_names = [f"IND {i:03d}" for i in industry_ids]
+    grupos = np.repeat([f"GRUPO {g:05d}" for g in range(groups)], industries)
+    ids = np.tile(industry_ids, groups)
+    keep = rng.random(len(ids)) < density
+    df = pd.DataFrame({
+        "grupo": grupos[keep],
+        "ped_industria": ids[keep],
+        "valor": rng.gamma(2.0, 1500.0, keep.sum()).round(2),
+    })
+    return df, industry_ids, industry_names
+
+
+def same_json(a, b):
+    if a["industries"] != b["industries"] or len(a["rows"]) != len(b["rows"]):
+        return False
+    for ra, rb in zip(a["rows"], b["rows"]):
+        if ra["grupo"] != rb["grupo"] or not math.isclose(ra["total"], rb["total"], rel_tol=1e-9):
+            return False
+        if any(not math.isclose(ra["values"][k], rb["values"][k], rel_tol=1e-9) for k in ra["values"]):
+            return False
+    return all(math.isclose(a["totals"][k], b["totals"][k], rel_tol=1e-9) for k in a["totals"])
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--industries", type=int, default=60)
+    parser.add_argument("--density", type=float, default=0.3)
+    args = parser.parse_args()
+
+    df, industry_ids, industry_names = synthetic(args.groups, args.industries, args.density)
+    print(f"Linhas da query: {len(df)} | grupos: {args.groups} | indústrias: {args.industries}")
+
+    novo, t_novo = timed(_pivot_store_matrix, df, industry_ids, industry_names)
+    print(f"pivot vetorizado: {t_novo * 1000:.1f} ms")
+    antigo, t_antigo = timed(legacy_matrix, df, industry_ids, industry_names)
+    print(f"laço antigo:      {t_antigo * 1000:.1f} ms")
+
+    print(f"Speed-up: {t_antigo / t_novo:.0f}x")
+    print("✅ Mesmo JSON" if same_json(novo, antigo) else "❌ JSON divergente")
@@ -1,12 +1,40 @@
 from fastapi import APIRouter, Query
 from typing import Optional
 from datetime import datetime
-from services.database import execute_query
+from services.database import execute_query_async, execute_rows, stream_rows
+from services.periods import filtro_meses, filtro_periodo, periodo_ano, periodo_mes
+from utils.blocking import iterate_blocking, run_blocking
+from utils.serialization import decode_cursor, encode_cursor, stream_records
 
 MONTHS_MAP = { 'Todos': 'Todos', 'Janeiro': '01', 'Fevereiro': '02', 'Março': '03', 'Abril': '04', 'Maio': '05', 'Junho': '06', 'Julho': '07', 'Agosto': '08', 'Setembro': '09', 'Outubro': '10', 'Novembro': '11', 'Dezembro': '12' }
 
 router = APIRouter(prefix="/api/analytics", tags=["ABC Intelligence"])
 
+_CURVA_ABC_SQL = "SELECT * FROM fn_curva_abc(:ano, :meses, :industria, :clientes, :metrica)"
+
+
+def _format_produto(p):
+    """Linha de fn_curva_abc no formato das tabelas da UI"""
+    return {
+        'ite_produto': int(p['produto_id']),
+        'produto': p['produto_nome'],
+        'total': float(p['total'] or 0),
+        'qtd_clientes': int(p['qtd_clientes'] or 0),
+        'percentual': float(p['percentual'] or 0),
+        'percentual_acum': float(p['percentual_acum'] or 0),
+        'curva': p['curva'],
+        'ranking': int(p['ranking'])
+    }
+
+
+def _stream_produtos(query: str, params: dict):
+    batches = stream_rows(query, params)
+    try:
+        for batch in batches:
+            yield [_format_produto(p) for p in batch]
+    finally:
+        batches.close()
+
 
 @router.get("/abc-intelligence")
 async def get_abc_intelligence(
@@ -22,12 +50,8 @@ async def get_abc_intelligence(
         if ano is None:
             ano = datetime.now().year
         
-        # Prepara filtros SQL
-        filtro_sql = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
-        
-        if meses != 'todos':
-            meses_list = meses.split(',')
-            filtro_sql += f" AND EXTRACT(MONTH FROM p.ped_data) IN ({','.join(meses_list)})"
+        # Prepara filtros SQL (período em ranges de ped_data, ver services/periods.py)
+        filtro_sql, filtro_params = filtro_meses(ano, meses.split(',') if meses != 'todos' else None)
         
         if industria != 'todos':
             filtro_sql += f" AND p.ped_industria = {industria}"
@@ -48,11 +72,9 @@ async def get_abc_intelligence(
             metrica_label = 'Valor'
         
         # ========== 1. CURVA ABC BASE (usando function SQL) ==========
-        query_abc = """
-        SELECT * FROM fn_curva_abc(:ano, :meses, :industria, :clientes, :metrica)
-        """
+        query_abc = _CURVA_ABC_SQL
         
-        df_abc = execute_query(query_abc, {
+        df_abc = await execute_query_async(query_abc, {
             'ano': ano,
             'meses': meses,
             'industria': industria,
@@ -99,7 +121,7 @@ async def get_abc_intelligence(
                 WHERE p.ped_cliente = cli_codigo AND {filtro_sql}
             )
         """
-        df_clientes = execute_query(query_clientes)
+        df_clientes = await execute_query_async(query_clientes, filtro_params)
         total_clientes_ativos = int(df_clientes.iloc[0]['total_clientes']) if not df_clientes.empty else 0
         
         oportunidades_penetracao = []
@@ -153,7 +175,7 @@ async def get_abc_intelligence(
                 WHERE i2.ite_idproduto = pr.pro_id
             )
         """
-        df_mortos = execute_query(query_mortos)
+        df_mortos = await execute_query_async(query_mortos)
         produtos_mortos = int(df_mortos.iloc[0]['qtd_mortos']) if not df_mortos.empty else 0
         
         # ========== 6. CROSS-SELL C→A ==========
@@ -165,6 +187,7 @@ async def get_abc_intelligence(
             ids_curva_a = ','.join([str(int(p['produto_id'])) for p in curva_a[:10]])
             
             if ids_curva_c and ids_curva_a:
+                filtro_ano_p2, params_ano_p2 = filtro_periodo(*periodo_ano(ano), coluna="p2.ped_data", nome="ano_p2")
                 query_cross = f"""
                 WITH clientes_curva_c AS (
                     SELECT DISTINCT p.ped_cliente
@@ -176,7 +199,7 @@ async def get_abc_intelligence(
                           SELECT 1 FROM itens_ped i2
                           INNER JOIN pedidos p2 ON i2.ite_pedido = p2.ped_pedido
                           WHERE p2.ped_cliente = p.ped_cliente
-                            AND EXTRACT(YEAR FROM p2.ped_data) = {ano}
+                            AND {filtro_ano_p2}
                             AND i2.ite_idproduto IN ({ids_curva_a})
                       )
                 )
@@ -191,7 +214,7 @@ async def get_abc_intelligence(
                     GROUP BY ped_cliente
                 ) t
                 """
-                df_cross = execute_query(query_cross)
+                df_cross = await execute_query_async(query_cross, {**filtro_params, **params_ano_p2})
                 if not df_cross.empty:
                     cross_sell_data = {
                         'qtd_clientes': int(df_cross.iloc[0]['qtd_clientes'] or 0),
@@ -221,27 +244,14 @@ async def get_abc_intelligence(
             }
         }
         
-        # Formata produtos para resposta
-        def format_produto(p):
-            return {
-                'ite_produto': int(p['produto_id']),
-                'produto': p['produto_nome'],
-                'total': float(p['total'] or 0),
-                'qtd_clientes': int(p['qtd_clientes'] or 0),
-                'percentual': float(p['percentual'] or 0),
-                'percentual_acum': float(p['percentual_acum'] or 0),
-                'curva': p['curva'],
-                'ranking': int(p['ranking'])
-            }
-        
         return {
             'success': True,
             'data': {
                 'resumo': resumo,
                 'produtos': {
-                    'A': [format_produto(p) for p in curva_a],
-                    'B': [format_produto(p) for p in curva_b],
-                    'C': [format_produto(p) for p in curva_c]
+                    'A': [_format_produto(p) for p in curva_a],
+                    'B': [_format_produto(p) for p in curva_b],
+                    'C': [_format_produto(p) for p in curva_c]
                 },
                 'insights': {
                     'alerta_curva_c': alerta_curva_c,
@@ -270,6 +280,51 @@ async def get_abc_intelligence(
         return {'success': False, 'error': str(e)}
 
 
+@router.get("/abc-intelligence/produtos")
+async def get_abc_produtos(
+    ano: int = Query(default=None, description="Ano para análise"),
+    meses: str = Query(default="todos", description="Meses separados por vírgula ou 'todos'"),
+    industria: str = Query(default="todos", description="Código da indústria ou 'todos'"),
+    clientes: str = Query(default="todos", description="Códigos de clientes separados por vírgula ou 'todos'"),
+    metrica: str = Query(default="valor", description="valor|quantidade|unidades"),
+    curva: Optional[str] = Query(default=None, pattern="^[ABC]$", description="A|B|C (default: todas)"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = Query(default=None, description="next_cursor da página anterior"),
+    format: str = Query(default="json", pattern="^(json|ndjson|csv)$", description="json (página) | ndjson/csv (streaming)")
+):
+    """
+    Lista de produtos da curva ABC sem carregar tudo em memória:
+    - format=json: página keyset por ranking (`next_cursor` null = fim)
+    - format=ndjson|csv: todos os produtos em streaming (cursor no servidor)
+    """
+    if ano is None:
+        ano = datetime.now().year
+    params = {'ano': ano, 'meses': meses, 'industria': industria, 'clientes': clientes, 'metrica': metrica}
+    where = "WHERE TRUE"
+    if curva:
+        where += " AND curva = :curva"
+        params['curva'] = curva
+
+    if format != "json":
+        query = f"SELECT * FROM ({_CURVA_ABC_SQL}) abc {where} ORDER BY ranking"
+        columns = ['ranking', 'ite_produto', 'produto', 'curva', 'total', 'qtd_clientes', 'percentual', 'percentual_acum']
+        return stream_records(iterate_blocking(_stream_produtos(query, params)), format, columns,
+                              filename=f"curva_abc_{ano}{'_' + curva if curva else ''}")
+
+    if cursor:
+        where += " AND ranking > :after"
+        params['after'] = decode_cursor(cursor, 1)[0]
+    params['limit'] = limit + 1
+    rows = await run_blocking(execute_rows, f"SELECT * FROM ({_CURVA_ABC_SQL}) abc {where} ORDER BY ranking LIMIT :limit", params)
+    has_more = len(rows) > limit
+    produtos = [_format_produto(p) for p in rows[:limit]]
+    return {
+        'success': True,
+        'data': produtos,
+        'next_cursor': encode_cursor(produtos[-1]['ranking']) if has_more else None
+    }
+
+
 @router.get("/value-qty-matrix")
 async def get_value_qty_matrix(
     ano: int = Query(..., description="Ano base para análise"),
@@ -305,16 +360,16 @@ async def get_value_qty_matrix(
         agrupamento_id = "c.cli_redeloja" if redeDeLojas else "p.ped_cliente"
         agrupamento_nome = "MAX(c.cli_nomred)" if not redeDeLojas else "COALESCE(NULLIF(c.cli_redeloja, ''), 'Sem Rede')"
         
-        # OTIMIZAÇÃO: Busca um range único para permitir uso de índices
-        data_inicio = f"{ano_anterior}-01-01"
-        data_fim = f"{ano}-12-31"
-        
-        # Os filtros de mês continuam sendo aplicados via EXTRACT para precisão dentro do range
-        filtro_mes_query = ""
+        # OTIMIZAÇÃO: ranges de ped_data (índice simples): os dois anos inteiros
+        # ou o mesmo mês nos dois anos
+        filtro_data, params = filtro_periodo(periodo_ano(ano_anterior)[0], periodo_ano(ano)[1])
         if not considerarAnoTodo and mes != 'Todos':
             mes_num = MONTHS_MAP.get(mes, mes)
             if str(mes_num).isdigit():
-                filtro_mes_query = f"AND EXTRACT(MONTH FROM p.ped_data) = {mes_num}"
+                filtro_ant, params = filtro_periodo(*periodo_mes(ano_anterior, int(mes_num)), nome="anterior")
+                filtro_atual, params_atual = filtro_periodo(*periodo_mes(ano, int(mes_num)), nome="atual")
+                params.update(params_atual)
+                filtro_data = f"(({filtro_ant}) OR ({filtro_atual}))"
 
         query = f"""
         WITH sales_data AS (
@@ -327,8 +382,7 @@ async def get_value_qty_matrix(
             FROM pedidos p
             INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido
             INNER JOIN clientes c ON p.ped_cliente = c.cli_codigo
-            WHERE p.ped_data >= '{data_inicio}' AND p.ped_data <= '{data_fim}'
-            {filtro_mes_query}
+            WHERE {filtro_data}
             {filtro_industria}
             AND p.ped_situacao IN ('P', 'F') -- Garante apenas pedidos válidos
             GROUP BY 1, 2, 3
@@ -358,7 +412,7 @@ async def get_value_qty_matrix(
         ORDER BY valor_25 DESC
         """
         
-        df = execute_query(query)
+        df = await execute_query_async(query, params)
         if df.empty:
             return {"success": True, "data": {"anomalies": []}}
 
@@ -1,10 +1,14 @@
-from fastapi import APIRouter
-from functools import lru_cache
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from services.data_fetcher import (
     fetch_faturamento_anual,
     fetch_metas_anuais,
-    fetch_metas_progresso,
-    clear_cache
+    fetch_metas_anuais_row,
+    fetch_metas_progresso
 )
 from services.measures import (
     measure_comparativo_mensal,
@@ -14,8 +18,14 @@ from services.analysis import analyze_pareto, analyze_industry_growth
 from services.insights import generate_insights, get_advanced_insights
 from services.top_industries import fetch_top_industries
 from services.dashboard_summary import fetch_dashboard_summary
+from services.periods import filtro_periodo, parse_data, periodo_ano
 from services.industry_dashboard import get_industry_details
-from services.client_dashboard import get_client_details
+from services.client_dashboard import (
+    evolution_columns,
+    get_client_details,
+    get_client_monthly_evolution_page,
+    stream_client_monthly_evolution
+)
 from services.analytics_dashboard import (
     get_critical_alerts,
     get_kpis_metrics,
@@ -24,9 +34,91 @@ from services.analytics_dashboard import (
     get_top_clients_variation,
     get_full_analytics_tab
 )
+from utils.blocking import get_coalesce_stats, iterate_blocking, run_blocking, run_coalesced
+from utils.serialization import (
+    FastJSONResponse, column_values, decode_cursor, dumps, encode_cursor, records, stream_records
+)
+from utils.cache import bi_cache, tenant_cached
+from utils.sections import get_section_stats
+from utils.tenant_context import engine_registry, get_tenant_cnpj
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
+
+def _check_intervalo(startDate: str, endDate: str):
+    """startDate/endDate malformados viram 422 (nos services estourariam como 500 ou seção vazia)"""
+    for nome, valor in (("startDate", startDate), ("endDate", endDate)):
+        if valor:
+            try:
+                parse_data(valor)
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"{nome} inválido: '{valor}' (use YYYY-MM-DD)")
+
+# TTL das lógicas cacheadas (ticket/churn do mês corrente não podem ficar velhos)
+_LOGIC_CACHE_TTL = 300
+
+def _is_success(result) -> bool:
+    """Não cachear respostas de erro"""
+    return bool(result) and result.get("success", True) is not False
+
+def _evolution_from_df(df_fat, metrica: str):
+    """Série MoM (12 meses) a partir do faturamento anual"""
+    if df_fat.empty:
+        return []
+
+    if metrica == 'valor':
+        col_name = 'v_faturamento'
+    elif metrica == 'quantidade':
+        col_name = 'q_quantidade'
+    else:
+        col_name = 'u_unidades'
+        
+    data_dict = dict(zip(column_values(df_fat['n_mes'], "int"), column_values(df_fat[col_name], "float", 0.0)))
+    
+    result = []
+    labels = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+    previous_value = 0.0
+    
+    for i in range(1, 13):
+        current_value = data_dict.get(i, 0.0)
+        delta_percent = 0.0
+        if previous_value > 0:
+            delta_percent = ((current_value - previous_value) / previous_value) * 100
+        elif previous_value == 0 and current_value > 0:
+            delta_percent = 100.0
+            
+        result.append({
+            "name": labels[i-1],
+            "mes_num": i,
+            "valor": current_value,
+            "valor_anterior": previous_value,
+            "delta_percent": round(delta_percent, 1),
+            "tendencia": "up" if delta_percent >= 0 else "down"
+        })
+        previous_value = current_value
+
+    return result
+
+def _goals_from_df(df):
+    """Progresso de metas por indústria a partir de fetch_metas_progresso"""
+    if df.empty:
+        return []
+        
+    vendas = pd.to_numeric(df['total_vendas'], errors='coerce').astype(float)
+    metas = pd.to_numeric(df['total_meta'], errors='coerce').astype(float)
+    # Avoid division by zero
+    percent = (vendas / metas.where(metas > 0) * 100).fillna(0.0)
+    
+    # Color logic: Green if >= 100%, Red if < 100%
+    goals = pd.DataFrame({
+        "industry": df['industria'],
+        "total_sales": vendas,
+        "total_goal": metas,
+        "percent": percent.round(1),
+        "status": np.where(percent >= 100, 'success', 'danger'),
+    })
+    return records(goals)
+
 @router.get("/metas")
 async def get_metas(mes: int, ano: int):
     """
@@ -37,13 +129,12 @@ async def get_metas(mes: int, ano: int):
     if not (1 <= mes <= 12):
         return {"error": "Mês deve estar entre 1 e 12"}
     
-    # Busca Metas do Ano (Cacheada)
-    df_metas = fetch_metas_anuais(ano)
+    # Busca Metas do Ano (Cacheada, sem DataFrame)
+    metas_row = await run_blocking(fetch_metas_anuais_row, ano)
     
-    if df_metas.empty:
+    if not metas_row:
         return {"meta": 0, "num_metas": 0}
         
-    metas_row = df_metas.iloc[0]
     col_name = f"met_{months[mes-1]}"
     
     total_meta = float(metas_row[col_name]) if metas_row[col_name] is not None else 0.0
@@ -63,44 +154,10 @@ async def get_evolution(ano: int, metrica: str = 'valor'):
     try:
         # 1. Fetch Data (Com Cache - traz ambas as colunas)
         print("DEBUG: Calling fetch_faturamento_anual...", flush=True)
-        df_fat = fetch_faturamento_anual(ano)
+        df_fat = await run_blocking(fetch_faturamento_anual, ano)
         print(f"DEBUG: df_fat shape: {df_fat.shape}", flush=True)
         
-        if df_fat.empty:
-            return []
-
-        if metrica == 'valor':
-            col_name = 'v_faturamento'
-        elif metrica == 'quantidade':
-            col_name = 'q_quantidade'
-        else:
-            col_name = 'u_unidades'
-            
-        data_dict = {int(row['n_mes']): float(row[col_name]) for _, row in df_fat.iterrows()}
-        
-        result = []
-        labels = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
-        previous_value = 0.0
-        
-        for i in range(1, 13):
-            current_value = data_dict.get(i, 0.0)
-            delta_percent = 0.0
-            if previous_value > 0:
-                delta_percent = ((current_value - previous_value) / previous_value) * 100
-            elif previous_value == 0 and current_value > 0:
-                delta_percent = 100.0
-                
-            result.append({
-                "name": labels[i-1],
-                "mes_num": i,
-                "valor": current_value,
-                "valor_anterior": previous_value,
-                "delta_percent": round(delta_percent, 1),
-                "tendencia": "up" if delta_percent >= 0 else "down"
-            })
-            previous_value = current_value
-            
-        return result
+        return _evolution_from_df(df_fat, metrica)
         
     except Exception as e:
         print(f"FAULT INLINE: {str(e)}", flush=True)
@@ -117,8 +174,10 @@ async def get_comparison(ano: int):
     print(f"--- BI: Processando comparação anual {ano} (Modular) ---")
     try:
         # 1. Fetch Data (Com Cache)
-        df_fat = fetch_faturamento_anual(ano)
-        df_metas = fetch_metas_anuais(ano)
+        df_fat, df_metas = await asyncio.gather(
+            run_blocking(fetch_faturamento_anual, ano),
+            run_blocking(fetch_metas_anuais, ano)
+        )
         
         # 2. Apply Measures (Lógica de Negócio)
         result = measure_comparativo_mensal(df_fat, df_metas)
@@ -132,17 +191,33 @@ async def get_comparison(ano: int):
 
 @router.post("/cache/clear")
 async def clear_dashboard_cache():
-    """Endpoint administrativo para limpar cache"""
-    clear_cache()
+    """Endpoint administrativo para limpar o cache do tenant que chamou"""
+    tenant_id = get_tenant_cnpj() or "default"
+    bi_cache.clear(tenant_id=tenant_id)
+    print(f"--- CACHE CLEARED [Tenant: {tenant_id}] ---", flush=True)
     return {"status": "Cache limpo com sucesso"}
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Contadores do cache unificado (hits, misses, evictions, memória) e das
+    requisições coalescidas no event loop (run_coalesced)
+    """
+    return {**bi_cache.stats(), "async_coalescing": get_coalesce_stats()}
+
+@router.get("/db/stats")
+async def get_db_stats():
+    """Engines por tenant: conexões abertas/em uso, pool_size e orçamento; seções rodando por pool"""
+    return {**engine_registry.stats(), "sections": get_section_stats()}
+
 @router.get("/summary")
 async def get_summary(ano: int = 2025, mes: str = 'Todos', industria: int = None, startDate: str = None, endDate: str = None):
     """
     Retorna KPIs do dashboard (Faturamento, Pedidos, Clientes, Ticket Médio, Quantidade Vendida).
     Com comparativo M-1 ou A-1 dependendo do filtro.
     """
-    data = fetch_dashboard_summary(ano, mes, industria, startDate, endDate)
+    _check_intervalo(startDate, endDate)
+    data = await run_blocking(fetch_dashboard_summary, ano, mes, industria, startDate, endDate)
     return {"success": True, "data": data}
 
 
@@ -154,33 +229,9 @@ async def get_goals_scroller(ano: int):
     """
     print(f"--- BI: Processando Scroller de Metas {ano} ---", flush=True)
     try:
-        df = fetch_metas_progresso(ano)
+        df = await run_blocking(fetch_metas_progresso, ano)
         
-        if df.empty:
-            return []
-            
-        result = []
-        for _, row in df.iterrows():
-            total_vendas = float(row['total_vendas'])
-            total_meta = float(row['total_meta'])
-            
-            # Avoid division by zero
-            percent = 0.0
-            if total_meta > 0:
-                percent = (total_vendas / total_meta) * 100
-            
-            # Color logic: Green if >= 100%, Red if < 100%
-            status = 'success' if percent >= 100 else 'danger'
-            
-            result.append({
-                "industry": row['industria'],
-                "total_sales": total_vendas,
-                "total_goal": total_meta,
-                "percent": round(percent, 1),
-                "status": status
-            })
-            
-        return result
+        return _goals_from_df(df)
 
     except Exception as e:
         print(f"FAULT: goals-scroller failed: {str(e)}", flush=True)
@@ -191,21 +242,21 @@ async def get_pareto(ano: int, metrica: str = 'valor'):
     """
     Retorna curva Pareto (80/20) de Clientes.
     """
-    return analyze_pareto(ano, metrica)
+    return await run_blocking(analyze_pareto, ano, metrica)
 
 @router.get("/industry-growth")
 async def get_industry_growth(ano: int = 2025, metrica: str = 'valor'):
     """
     Retorna desvio de crescimento por indústria (TOP 15).
     """
-    return analyze_industry_growth(ano, metrica)
+    return await run_blocking(analyze_industry_growth, ano, metrica)
 
 @router.get("/insights")
 async def get_insights(ano: int = 2025, industryId: int = None):
     """
     Retorna narrativas inteligentes sobre o desempenho do ano.
     """
-    return generate_insights(ano, industryId)
+    return await run_coalesced(generate_insights, ano, industryId)
 
 @router.get("/top-industries")
 async def get_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', limit: int = 6, startDate: str = None, endDate: str = None):
@@ -219,15 +270,107 @@ async def get_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor
         - startDate: Data inicial
         - endDate: Data final
     """
-    data = fetch_top_industries(ano, mes, metrica, limit, startDate, endDate)
+    _check_intervalo(startDate, endDate)
+    data = await run_blocking(fetch_top_industries, ano, mes, metrica, limit, startDate, endDate)
     return {"success": True, "data": data}
 
+_BUNDLE_SECTIONS = ("summary", "top_industries", "evolution", "comparison", "goals_scroller", "pareto", "industry_growth")
+
+def _bundle_jobs(ano, mes, industria, metrica, limit, startDate, endDate, sections):
+    """
+    Coroutines das seções do bundle (mesmo payload das rotas individuais).
+    fetch_faturamento_anual roda uma vez só e é compartilhado por evolution e comparison.
+    """
+    faturamento = None
+    if {"evolution", "comparison"} & set(sections):
+        faturamento = asyncio.ensure_future(run_blocking(fetch_faturamento_anual, ano))
+
+    async def summary():
+        return {"success": True, "data": await run_blocking(fetch_dashboard_summary, ano, mes, industria, startDate, endDate)}
+
+    async def top_industries():
+        return {"success": True, "data": await run_blocking(fetch_top_industries, ano, mes, metrica, limit, startDate, endDate)}
+
+    async def evolution():
+        return _evolution_from_df(await faturamento, metrica)
+
+    async def comparison():
+        df_metas = await run_blocking(fetch_metas_anuais, ano)
+        return measure_comparativo_mensal(await faturamento, df_metas)
+
+    async def goals_scroller():
+        return _goals_from_df(await run_blocking(fetch_metas_progresso, ano))
+
+    async def pareto():
+        return await run_blocking(analyze_pareto, ano, metrica)
+
+    async def industry_growth():
+        return await run_blocking(analyze_industry_growth, ano, metrica)
+
+    jobs = {
+        "summary": summary, "top_industries": top_industries, "evolution": evolution,
+        "comparison": comparison, "goals_scroller": goals_scroller, "pareto": pareto,
+        "industry_growth": industry_growth,
+    }
+    return faturamento, {name: jobs[name]() for name in sections}
+
+async def _run_section(name, coro):
+    started = time.perf_counter()
+    try:
+        return {"section": name, "data": await coro, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    except Exception as e:
+        print(f"FAULT: bundle section {name} failed: {str(e)}", flush=True)
+        return {"section": name, "error": str(e), "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+@router.get("/bundle")
+async def get_bundle(ano: int = 2025, mes: str = 'Todos', industria: int = None, metrica: str = 'valor', limit: int = 6,
+                     startDate: str = None, endDate: str = None, sections: str = None, format: str = 'ndjson'):
+    """
+    Todas as seções da página Intelligence numa requisição, em streaming.
+
+    As seções rodam em paralelo (dividindo as vagas de run_blocking do tenant,
+    o mesmo orçamento de conexões das rotas individuais) e cada uma é enviada
+    assim que fica pronta: uma linha NDJSON `{"section", "data"|"error", "ms"}`
+    ou, com format=sse, um evento `event: <seção>`. A última mensagem é
+    `{"section": "done"}`.
+        - sections: lista separada por vírgula (default: todas)
+    """
+    _check_intervalo(startDate, endDate)
+    wanted = [s.strip() for s in sections.split(",")] if sections else list(_BUNDLE_SECTIONS)
+    invalid = [s for s in wanted if s not in _BUNDLE_SECTIONS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Seções inválidas: {', '.join(invalid)}. Use: {', '.join(_BUNDLE_SECTIONS)}")
+
+    sse = format == 'sse'
+
+    def encode(message):
+        payload = dumps(message).decode("utf-8")
+        if sse:
+            return f"event: {message['section']}\ndata: {payload}\n\n"
+        return payload + "\n"
+
+    async def stream():
+        started = time.perf_counter()
+        faturamento, coros = _bundle_jobs(ano, mes, industria, metrica, limit, startDate, endDate, wanted)
+        tasks = [asyncio.ensure_future(_run_section(name, coro)) for name, coro in coros.items()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield encode(await finished)
+            yield encode({"section": "done", "ms": round((time.perf_counter() - started) * 1000, 1)})
+        finally:
+            # Cliente desconectou: não deixar seções órfãs ocupando vagas do tenant
+            for task in tasks + ([faturamento] if faturamento else []):
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/x-ndjson")
+
 @router.get("/industry-details")
 async def get_industry_details_api(ano: int = 2025, mes: str = 'Todos', industryId: int = None, metrica: str = 'valor', startDate: str = None, endDate: str = None):
     """
     Retorna detalhes completos para o painel de indústria (Funil, Gráficos, Churn).
     """
-    return get_industry_details(ano, mes, industryId, metrica, startDate, endDate)
+    _check_intervalo(startDate, endDate)
+    return FastJSONResponse(await run_blocking(get_industry_details, ano, mes, industryId, metrica, startDate, endDate))
 
 @router.get("/filters-options")
 async def get_filters_options():
@@ -235,14 +378,15 @@ async def get_filters_options():
     Retorna lista de opções para filtros (Indústrias, Clientes).
     """
     from services.data_fetcher import fetch_available_filters
-    return fetch_available_filters()
+    return await run_blocking(fetch_available_filters)
 
 @router.get("/client-details")
 async def get_client_details_api(ano: int = 2025, mes: str = 'Todos', industryId: int = None, metrica: str = 'valor', uf: str = None, startDate: str = None, endDate: str = None):
     """
     Retorna análise detalhada de clientes para o dashboard.
     """
-    return get_client_details(ano, mes, industryId, metrica, uf, startDate, endDate)
+    _check_intervalo(startDate, endDate)
+    return FastJSONResponse(await run_blocking(get_client_details, ano, mes, industryId, metrica, uf, startDate, endDate))
 
 @router.get("/client-monthly-evolution")
 async def get_client_monthly_evolution_api(ano: int = 2025, mes: str = 'Todos', industryId: int = None, metrica: str = 'valor', vendedorId: str = None):
@@ -250,7 +394,30 @@ async def get_client_monthly_evolution_api(ano: int = 2025, mes: str = 'Todos',
     Retorna matriz de evolução mensal por cliente com filtro de vendedor.
     """
     from services.client_dashboard import get_client_monthly_evolution
-    return get_client_monthly_evolution(ano, industryId, metrica, vendedorId)
+    return FastJSONResponse(await run_blocking(get_client_monthly_evolution, ano, industryId, metrica, vendedorId))
+
+@router.get("/client-monthly-evolution/page")
+async def get_client_monthly_evolution_page_api(ano: int = 2025, industryId: int = None, metrica: str = 'valor', vendedorId: str = None,
+                                                limit: int = Query(100, ge=1, le=1000), cursor: str = None):
+    """
+    Evolução mensal por cliente paginada (keyset). Passe o `next_cursor` da
+    resposta em `cursor` para a próxima página; null = última página.
+    """
+    chave = decode_cursor(cursor, 2) if cursor else None
+    page = await run_blocking(get_client_monthly_evolution_page, ano, industryId, metrica, vendedorId, limit, chave)
+    page["next_cursor"] = encode_cursor(*page["next_cursor"]) if page["next_cursor"] else None
+    return FastJSONResponse(page)
+
+@router.get("/client-monthly-evolution/stream")
+async def stream_client_monthly_evolution_api(ano: int = 2025, industryId: int = None, metrica: str = 'valor', vendedorId: str = None,
+                                              format: str = Query('ndjson', pattern='^(ndjson|csv)$')):
+    """
+    Evolução mensal de todos os clientes em streaming (NDJSON ou CSV), lida do
+    banco com cursor no servidor: memória constante qualquer que seja o tenant.
+    """
+    batches = stream_client_monthly_evolution(ano, industryId, metrica, vendedorId, flat=format == 'csv')
+    columns = ["cliente", *evolution_columns(ano), "total"]
+    return stream_records(iterate_blocking(batches), format, columns, filename=f"evolucao_clientes_{ano}")
 
 # --- ANALYTICS DASHBOARD ENDPOINTS ---
 
@@ -260,7 +427,7 @@ async def get_analytics_ai_alerts(ano: int = 2025, mes: str = 'Todos', industryI
     import time
     start = time.time()
     print(f"REQUEST [GET] /analytics/ai-alerts (ano={ano}, mes={mes})", flush=True)
-    res = generate_critical_alerts_ai(ano, mes, industryId)
+    res = await run_coalesced(generate_critical_alerts_ai, ano, mes, industryId)
     print(f"RESPONSE /analytics/ai-alerts - Duration: {time.time() - start:.2f}s", flush=True)
     return res
 
@@ -269,7 +436,7 @@ async def get_analytics_alerts(ano: int = 2025, mes: str = 'Todos'):
     import time
     start = time.time()
     print(f"REQUEST [GET] /analytics/alerts (ano={ano}, mes={mes})", flush=True)
-    res = get_critical_alerts(ano, mes)
+    res = await run_blocking(get_critical_alerts, ano, mes)
     print(f"RESPONSE /analytics/alerts - Duration: {time.time() - start:.2f}s", flush=True)
     return res
 
@@ -278,29 +445,32 @@ async def get_analytics_kpis(ano: int = 2025, mes: str = 'Todos'):
     import time
     start = time.time()
     print(f"REQUEST [GET] /analytics/kpis (ano={ano}, mes={mes})", flush=True)
-    res = get_kpis_metrics(ano, mes)
+    res = await run_blocking(get_kpis_metrics, ano, mes)
     print(f"RESPONSE /analytics/kpis - Duration: {time.time() - start:.2f}s", flush=True)
     return res
 
 @router.get("/analytics/portfolio-abc")
 async def get_analytics_portfolio(ano: int = 2025, industryId: int = None, mes: str = "Todos", startDate: str = None, endDate: str = None):
+    _check_intervalo(startDate, endDate)
     import time
     start = time.time()
     print(f"REQUEST [GET] /analytics/portfolio-abc (ano={ano}, industryId={industryId}) range={startDate}:{endDate}", flush=True)
-    res = get_portfolio_abc(ano, mes, industryId, startDate, endDate)
+    res = await run_blocking(get_portfolio_abc, ano, mes, industryId, startDate, endDate)
     print(f"RESPONSE /analytics/portfolio-abc - Duration: {time.time() - start:.2f}s", flush=True)
     return res
 
 @router.get("/analytics/top-clients-variation")
 async def get_analytics_top_clients_variation(ano: int = 2025, mes: str = "Todos", industryId: int = None, startDate: str = None, endDate: str = None):
-    return get_top_clients_variation(ano, mes, industryId, startDate, endDate)
+    _check_intervalo(startDate, endDate)
+    return await run_blocking(get_top_clients_variation, ano, mes, industryId, startDate, endDate)
 
 @router.get("/analytics/full-tab")
 async def get_analytics_full_tab(ano: int = 2025, mes: str = "Todos", industryId: int = None, startDate: str = None, endDate: str = None):
+    _check_intervalo(startDate, endDate)
     import time
     start = time.time()
     print(f"REQUEST [GET] /analytics/full-tab (ano={ano}, mes={mes}, industry={industryId}) range={startDate}:{endDate}", flush=True)
-    res = get_full_analytics_tab(ano, mes, industryId, startDate, endDate)
+    res = await run_coalesced(get_full_analytics_tab, ano, mes, industryId, startDate, endDate)
     print(f"RESPONSE /analytics/full-tab - Duration: {time.time() - start:.2f}s", flush=True)
     return res
 
@@ -309,7 +479,7 @@ async def get_client_comparison_api(ref_client: int, target_client: int):
     """
     Retorna comparativo entre dois clientes para identificar oportunidades.
     """
-    return get_client_comparison(ref_client, target_client)
+    return await run_blocking(get_client_comparison, ref_client, target_client)
 
 @router.get("/analytics/insights")
 async def get_analytics_insights_api(ano: int = 2025, industryId: int = None):
@@ -324,14 +494,14 @@ async def get_analytics_insights_api(ano: int = 2025, industryId: int = None):
     # Reutiliza a lógica existente em generate_insights do services/insights.py
     # que já retorna a estrutura { success: true, categorias: {...} }
     # O frontend fará o flattening necessário.
-    res = generate_insights(ano, industryId)
+    res = await run_coalesced(generate_insights, ano, industryId)
     
     print(f"RESPONSE /analytics/insights - Duration: {time.time() - start:.2f}s", flush=True)
     return {"success": True, "data": res}
 
 
 # Função interna com cache (não é uma rota direta)
-@lru_cache(maxsize=32)
+@tenant_cached("priority_actions", ttl=_LOGIC_CACHE_TTL, cache_if=_is_success)
 def get_priority_actions_logic(tenant_id: str, startDate: str = None, endDate: str = None):
     """Lógica interna para prioridade de ação"""
     import time
@@ -409,18 +579,19 @@ def get_priority_actions_logic(tenant_id: str, startDate: str = None, endDate: s
 
 @router.get("/analytics/priority-actions")
 async def get_priority_actions_api(ano: int = 2025, mes: str = "Todos", startDate: str = None, endDate: str = None):
+    _check_intervalo(startDate, endDate)
     from utils.tenant_context import get_tenant_cnpj
     tenant_id = get_tenant_cnpj() or "default"
-    # Chamamos a função síncrona com cache
-    return get_priority_actions_logic(tenant_id, startDate, endDate)
+    # Chamamos a função síncrona com cache (no pool de threads)
+    return await run_blocking(get_priority_actions_logic, tenant_id, startDate, endDate)
 
 
 # Função interna com cache
-@lru_cache(maxsize=32)
+@tenant_cached("commercial_efficiency", ttl=_LOGIC_CACHE_TTL, cache_if=_is_success)
 def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDate: str = None):
     """Lógica interna para eficiência comercial"""
     import time
-    from services.database import execute_query
+    from services.database import execute_scalar_row
     
     start = time.time()
     print(f"REQUEST [GET] /analytics/commercial-efficiency [Tenant: {tenant_id}] range={startDate}:{endDate}", flush=True)
@@ -471,8 +642,7 @@ def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDa
             """
             params = {}
         
-        ticket_df = execute_query(ticket_query, params)
-        ticket_row = ticket_df.iloc[0] if not ticket_df.empty else {'atual': 0, 'anterior': 0, 'variacao': 0}
+        ticket_row = execute_scalar_row(ticket_query, params) or {'atual': 0, 'anterior': 0, 'variacao': 0}
         
         # 2. PEDIDOS POR CLIENTE
         if startDate and endDate:
@@ -533,8 +703,7 @@ def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDa
                 FROM current_period c, previous_period p;
             """
         
-        pedidos_df = execute_query(pedidos_query, params)
-        pedidos_row = pedidos_df.iloc[0] if not pedidos_df.empty else {'atual': 0, 'anterior': 0, 'variacao': 0}
+        pedidos_row = execute_scalar_row(pedidos_query, params) or {'atual': 0, 'anterior': 0, 'variacao': 0}
         
         # 3. CONVERSÃO CATÁLOGO (% produtos vendidos)
         if startDate and endDate:
@@ -557,8 +726,8 @@ def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDa
                 WHERE ped.ped_data >= CURRENT_DATE - INTERVAL '3 months'
                   AND ped.ped_situacao IN ('P', 'F');
             """
-        conversao_df = execute_query(conversao_query, params)
-        conversao_val = float(conversao_df.iloc[0]['conversao'] or 0) if not conversao_df.empty else 0
+        conversao_row = execute_scalar_row(conversao_query, params)
+        conversao_val = float(conversao_row['conversao'] or 0) if conversao_row else 0
         
         # 4. OPORTUNIDADE CROSS-SELL (clientes só Curva C - simplificado)
         if startDate and endDate:
@@ -641,8 +810,7 @@ def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDa
                   AND p.ped_situacao IN ('P', 'F')
                   AND cd.curva = 'C';
             """
-        crosssell_df = execute_query(crosssell_query, params)
-        crosssell_row = crosssell_df.iloc[0] if not crosssell_df.empty else {'qtd_clientes': 0, 'potencial': 0}
+        crosssell_row = execute_scalar_row(crosssell_query, params) or {'qtd_clientes': 0, 'potencial': 0}
         
         result = {
             'success': True,
@@ -678,13 +846,14 @@ def get_commercial_efficiency_logic(tenant_id: str, startDate: str = None, endDa
 
 @router.get("/analytics/commercial-efficiency")
 async def get_commercial_efficiency_api(ano: int = 2025, mes: str = "Todos", startDate: str = None, endDate: str = None):
+    _check_intervalo(startDate, endDate)
     from utils.tenant_context import get_tenant_cnpj
     tenant_id = get_tenant_cnpj() or "default"
-    return get_commercial_efficiency_logic(tenant_id, startDate, endDate)
+    return await run_blocking(get_commercial_efficiency_logic, tenant_id, startDate, endDate)
 
 
 # Função interna com cache
-@lru_cache(maxsize=32)
+@tenant_cached("customer_comparison", ttl=_LOGIC_CACHE_TTL, cache_if=_is_success)
 def get_customer_comparison_logic(ano: int, tenant_id: str):
     """Lógica interna para comparativo de clientes"""
     import time
@@ -697,6 +866,9 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
         # Usa o ano do filtro para comparar com o ano anterior
         ano_atual = ano
         ano_anterior = ano - 1
+        filtro_atual, params = filtro_periodo(*periodo_ano(ano_atual), nome="atual")
+        filtro_anterior, params_anterior = filtro_periodo(*periodo_ano(ano_anterior), nome="anterior")
+        params.update(params_anterior)
         
         query = f"""
             WITH current_year AS (
@@ -706,7 +878,7 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
                     MAX(p.ped_data) as ultima_compra
                 FROM pedidos p
                 INNER JOIN clientes c ON p.ped_cliente = c.cli_codigo
-                WHERE EXTRACT(YEAR FROM p.ped_data) = {ano_atual}
+                WHERE {filtro_atual}
                   AND p.ped_situacao IN ('P', 'F')
                 GROUP BY c.cli_nomred
             ),
@@ -716,7 +888,7 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
                     COUNT(*) as pedidos
                 FROM pedidos p
                 INNER JOIN clientes c ON p.ped_cliente = c.cli_codigo
-                WHERE EXTRACT(YEAR FROM p.ped_data) = {ano_anterior}
+                WHERE {filtro_anterior}
                   AND p.ped_situacao IN ('P', 'F')
                 GROUP BY c.cli_nomred
             )
@@ -751,7 +923,7 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
             LIMIT 20;
         """
         
-        df = execute_query(query)
+        df = execute_query(query, params)
         clientes_list = df.to_dict('records') if not df.empty else []
         
         # Gera alertas contextuais
@@ -760,15 +932,6 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
         for c in clientes_list:
             if c.get('status') == 'Perdido':
                 # Calcula perda estimada
-                perda_query = """
-                    SELECT COALESCE(SUM(ped_totliq) / 12.0, 0) as perda_mensal
-                    FROM pedidos p
-                    INNER JOIN clientes cl ON p.ped_cliente = cl.cli_codigo
-                    WHERE cl.cli_nomred = %s
-                      AND EXTRACT(YEAR FROM p.ped_data) = EXTRACT(YEAR FROM CURRENT_DATE) - 1
-                      AND p.ped_situacao IN ('P', 'F')
-                """
-                # Note: execute_query doesn't support params, simplifying
                 perda_anual = float(c.get('ano_anterior', 0) or 0) * 5000  # Estimativa
                 
                 ultima = c.get('ultima_compra')
@@ -824,4 +987,4 @@ def get_customer_comparison_logic(ano: int, tenant_id: str):
 async def get_customer_comparison_api(ano: int = 2025):
     from utils.tenant_context import get_tenant_cnpj
     tenant_id = get_tenant_cnpj() or "default"
-    return get_customer_comparison_logic(ano, tenant_id)
+    return await run_blocking(get_customer_comparison_logic, ano, tenant_id)
@@ -3,7 +3,10 @@ Equipe Router - Dashboard de Colaboradores
 Endpoints para análise de performance de vendedores
 """
 from fastapi import APIRouter
-from services.database import execute_query
+from services.database import execute_query_async
+from services.periods import periodo_ano, ultimos_meses
+from services.series import fetch_serie_mensal
+from utils.blocking import run_blocking
 import pandas as pd
 import traceback
 
@@ -15,7 +18,7 @@ async def get_vendedores():
     """Retorna lista de vendedores para filtro (Apenas ativos e que cumprem meta)"""
     try:
         query = "SELECT ven_codigo, ven_nome FROM vendedores WHERE ven_cumpremetas = 'S' AND ven_status = 'A' ORDER BY ven_nome"
-        df = execute_query(query, {})
+        df = await execute_query_async(query, {})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -39,7 +42,7 @@ async def get_performance(ano: int, mes: int, metrica: str = 'valor', vendedor:
         WHERE v.ven_cumpremetas = 'S' AND v.ven_status = 'A'
         """
         query_mes = 1 if mes == 0 else mes
-        df = execute_query(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
+        df = await execute_query_async(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
         
         if not df.empty:
             # --- YoY Calculation ---
@@ -52,7 +55,7 @@ async def get_performance(ano: int, mes: int, metrica: str = 'valor', vendedor:
                 WHERE v.ven_cumpremetas = 'S' AND v.ven_status = 'A'
                 """
                 query_mes = 1 if mes == 0 else mes
-                df_prev = execute_query(query_prev, {"ano": ano - 1, "mes": query_mes, "vendedor": vendedor})
+                df_prev = await execute_query_async(query_prev, {"ano": ano - 1, "mes": query_mes, "vendedor": vendedor})
                 
                 if not df_prev.empty:
                     # Rename col for merge
@@ -96,7 +99,7 @@ async def get_clientes_risco(vendedor: int = None, dias: int = 60):
     """Retorna clientes em risco por vendedor"""
     try:
         query = "SELECT * FROM fn_vendedores_clientes_risco(:vendedor, :dias)"
-        df = execute_query(query, {"vendedor": vendedor, "dias": dias})
+        df = await execute_query_async(query, {"vendedor": vendedor, "dias": dias})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -113,7 +116,7 @@ async def get_historico_mensal(vendedor: int, meses: int = 12):
     """Retorna histórico mensal de vendas do vendedor"""
     try:
         query = "SELECT * FROM fn_vendedores_historico_mensal(:vendedor, :meses)"
-        df = execute_query(query, {"vendedor": vendedor, "meses": meses})
+        df = await execute_query_async(query, {"vendedor": vendedor, "meses": meses})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -131,7 +134,7 @@ async def get_interacoes_crm(ano: int, mes: int, vendedor: int = None):
     try:
         query = "SELECT * FROM fn_vendedores_interacoes_crm(:ano, :mes, :vendedor)"
         query_mes = 1 if mes == 0 else mes
-        df = execute_query(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
+        df = await execute_query_async(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -149,10 +152,10 @@ async def get_ia_insights(vendedor: int, ano: int, mes: int):
     try:
         # Buscar dados do vendedor
         query_perf = "SELECT * FROM fn_vendedores_performance(:ano, :mes, :vendedor)"
-        df_perf = execute_query(query_perf, {"ano": ano, "mes": mes, "vendedor": vendedor})
+        df_perf = await execute_query_async(query_perf, {"ano": ano, "mes": mes, "vendedor": vendedor})
         
         query_risco = "SELECT * FROM fn_vendedores_clientes_risco(:vendedor, 60)"
-        df_risco = execute_query(query_risco, {"vendedor": vendedor})
+        df_risco = await execute_query_async(query_risco, {"vendedor": vendedor})
         
         # Gerar insights baseados nos dados
         vendedor_data = df_perf.iloc[0].to_dict() if not df_perf.empty else {}
@@ -224,57 +227,43 @@ async def get_ia_insights(vendedor: int, ano: int, mes: int):
 async def get_evolucao(ano: int, mes: int, metrica: str = 'valor', vendedor: int = None):
     """Retorna evolução de vendas respeitando filtros de contexto"""
     try:
-        from datetime import date
-        from dateutil.relativedelta import relativedelta
-        
         month_names = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         
-        # If mes=0 (Todos), show all 12 months of the year
-        if mes == 0:
-            months = [(ano, m) for m in range(1, 13)]
-        else:
-            # Show 6 months ending at selected month
-            end_date = date(ano, mes, 1)
-            months = []
-            for i in range(5, -1, -1):
-                d = end_date - relativedelta(months=i)
-                months.append((d.year, d.month))
-        
-        # Query for each month
-        results = []
-        
-        for year, month in months:
-            vendedor_filter = f"AND p.ped_vendedor = {vendedor}" if vendedor else ""
-            
-            if metrica == 'quantidade':
-                col_sql = "SUM(i.ite_quant)"
-                join_items = "INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria"
-            elif metrica == 'unidades':
-                col_sql = "COUNT(DISTINCT i.ite_idproduto)"
-                join_items = "INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria"
-            else: # valor
-                col_sql = "SUM(p.ped_totliq)"
-                join_items = ""
-
-            query = f"""
-            SELECT COALESCE({col_sql}, 0) as total
-            FROM pedidos p
-            JOIN vendedores v ON p.ped_vendedor = v.ven_codigo
-            {join_items}
-            WHERE EXTRACT(YEAR FROM p.ped_data) = {year}
-              AND EXTRACT(MONTH FROM p.ped_data) = {month}
+        # If mes=0 (Todos), show all 12 months of the year;
+        # otherwise 6 months ending at selected month
+        inicio, fim = periodo_ano(ano) if mes == 0 else ultimos_meses(ano, mes, 6)
+        
+        if metrica == 'quantidade':
+            col_sql = "SUM(i.ite_quant)"
+            join_items = "INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria"
+        elif metrica == 'unidades':
+            col_sql = "COUNT(DISTINCT i.ite_idproduto)"
+            join_items = "INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria"
+        else: # valor
+            col_sql = "SUM(p.ped_totliq)"
+            join_items = ""
+        
+        where = """
               AND p.ped_situacao IN ('P', 'F')
               AND v.ven_cumpremetas = 'S'
               AND v.ven_status = 'A'
-              {vendedor_filter}
-            """
-            df = execute_query(query, {})
-            total = float(df.iloc[0]['total']) if not df.empty else 0
-            results.append({
-                "mes": month_names[month - 1],
-                "ano": year,
-                "valor": total
-            })
+        """
+        params = {}
+        if vendedor:
+            where += " AND p.ped_vendedor = :vendedor"
+            params["vendedor"] = vendedor
+        
+        # Uma única query agrupada por mês (antes: uma query por mês)
+        serie = await run_blocking(
+            fetch_serie_mensal,
+            col_sql,
+            f"pedidos p JOIN vendedores v ON p.ped_vendedor = v.ven_codigo {join_items}",
+            inicio, fim, where, params
+        )
+        results = [
+            {"mes": month_names[ponto["mes"].month - 1], "ano": ponto["mes"].year, "valor": ponto["valor"]}
+            for ponto in serie
+        ]
         
         return {
             "success": True, 
@@ -296,7 +285,7 @@ async def get_carteira_resumo(ano: int, mes: int, vendedor: int = None):
     try:
         query = "SELECT * FROM fn_vendedores_carteira_resumo(:ano, :mes, :vendedor)"
         query_mes = 1 if mes == 0 else mes
-        df = execute_query(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
+        df = await execute_query_async(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
         
         if not df.empty:
             # Aggregate totals across all sellers (or just one if filtered)
@@ -323,7 +312,7 @@ async def get_carteira_por_vendedor(ano: int, mes: int):
     try:
         query = "SELECT * FROM fn_vendedores_carteira_resumo(:ano, :mes, NULL)"
         query_mes = 1 if mes == 0 else mes
-        df = execute_query(query, {"ano": ano, "mes": query_mes})
+        df = await execute_query_async(query, {"ano": ano, "mes": query_mes})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -341,7 +330,7 @@ async def get_novos_clientes(ano: int, mes: int, vendedor: int = None):
     try:
         query = "SELECT * FROM fn_clientes_primeira_compra(:ano, :mes, :vendedor)"
         query_mes = 1 if mes == 0 else mes
-        df = execute_query(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
+        df = await execute_query_async(query, {"ano": ano, "mes": query_mes, "vendedor": vendedor})
         
         if not df.empty:
             data = df.to_dict(orient='records')
@@ -373,13 +362,13 @@ async def get_narrativas_ia(ano: int, mes: int, vendedor: int = None):
         JOIN vendedores v ON p.vendedor_codigo = v.ven_codigo
         WHERE v.ven_cumpremetas = 'S' AND v.ven_status = 'A'
         """
-        perf_df = execute_query(perf_query, {"ano": ano, "mes": mes, "vendedor": vendedor})
+        perf_df = await execute_query_async(perf_query, {"ano": ano, "mes": mes, "vendedor": vendedor})
         
         carteira_query = "SELECT * FROM fn_vendedores_carteira_resumo(:ano, :mes, :vendedor)"
-        carteira_df = execute_query(carteira_query, {"ano": ano, "mes": mes, "vendedor": vendedor})
+        carteira_df = await execute_query_async(carteira_query, {"ano": ano, "mes": mes, "vendedor": vendedor})
         
         risco_query = "SELECT * FROM fn_vendedores_clientes_risco(:vendedor, 60)"
-        risco_df = execute_query(risco_query, {"vendedor": vendedor})
+        risco_df = await execute_query_async(risco_query, {"vendedor": vendedor})
         
         # Build context
         context = {
@@ -416,7 +405,8 @@ async def get_narrativas_ia(ano: int, mes: int, vendedor: int = None):
         }}
         """
         
-        response = client.chat.completions.create(
+        response = await run_blocking(
+            client.chat.completions.create,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Você gera narrativas curtas e impactantes para dashboards de vendas em português brasileiro."},
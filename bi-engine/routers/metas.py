@@ -3,7 +3,8 @@ Metas Router - Dashboard de Metas
 Endpoints para análise de metas de vendas
 """
 from fastapi import APIRouter
-from services.database import execute_query
+from services.database import execute_query_async
+from utils.blocking import run_blocking
 import traceback
 
 router = APIRouter(prefix="/api/metas", tags=["Metas"])
@@ -25,7 +26,7 @@ async def get_metas_resumo(ano: int, mes: int, industria: str = None):
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_resumo_geral(:ano, :mes, :industria)"
-        df = execute_query(query, {"ano": ano, "mes": mes, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes": mes, "industria": ind})
         
         if not df.empty:
             row = df.iloc[0]
@@ -50,7 +51,7 @@ async def get_metas_por_mes(ano: int, industria: str = None):
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_por_mes(:ano, :industria)"
-        df = execute_query(query, {"ano": ano, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -79,7 +80,7 @@ async def get_metas_atingimento(ano: int, mes_ate: int = 12, industria: str = No
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_atingimento_industria(:ano, :mes_ate, :industria)"
-        df = execute_query(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -105,7 +106,7 @@ async def get_metas_variacao(ano: int, mes: int, industria: str = None):
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_variacao_vendas(:ano, :mes, :industria)"
-        df = execute_query(query, {"ano": ano, "mes": mes, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes": mes, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -132,7 +133,7 @@ async def get_metas_analise_diaria(ano: int, mes: int, industria: str = None):
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_analise_diaria(:ano, :mes, :industria)"
-        df = execute_query(query, {"ano": ano, "mes": mes, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes": mes, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -157,7 +158,7 @@ async def get_metas_analise_semanal(ano: int, mes: int, industria: str = None):
         # ind_code = get_industria_param(industria)
         # Force no filter for this card as requested by user
         query = "SELECT * FROM fn_metas_analise_semanal_pivot(:ano, :mes)"
-        df = execute_query(query, {"ano": ano, "mes": mes})
+        df = await execute_query_async(query, {"ano": ano, "mes": mes})
         
         # Filter is now handled by SQL function
         # if ind_code:
@@ -188,7 +189,7 @@ async def get_metas_matriz_acao(ano: int, mes_ate: int = 12, industria: str = No
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_matriz_acao(:ano, :mes_ate, :industria)"
-        df = execute_query(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -216,7 +217,7 @@ async def get_metas_status(ano: int, mes_ate: int = 12, industria: str = None):
     try:
         ind = get_industria_param(industria)
         query = "SELECT * FROM fn_metas_status_industrias(:ano, :mes_ate, :industria)"
-        df = execute_query(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
+        df = await execute_query_async(query, {"ano": ano, "mes_ate": mes_ate, "industria": ind})
         
         data = []
         for _, row in df.iterrows():
@@ -245,7 +246,7 @@ async def get_metas_narratives(ano: int, mes: int, industria: str = None):
     try:
         ind = get_industria_param(industria)
         analyzer = MetasAIAnalyzer()
-        result = analyzer.generate_narratives(ano, mes, ind)
+        result = await run_blocking(analyzer.generate_narratives, ano, mes, ind)
         return result
     except Exception as e:
         print(f"❌ [METAS] Erro em /narratives: {e}")
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from services.portfolio_analyzer import analyzer
+from utils.blocking import run_blocking
 
 router = APIRouter(prefix="/api/portfolio", tags=["Portfolio ABC"])
 
@@ -21,7 +22,7 @@ async def analyze_portfolio(
     - Estatísticas do período
     """
     try:
-        result = analyzer.analyze_portfolio(ano, mes, industria)
+        result = await run_blocking(analyzer.analyze_portfolio, ano, mes, industria)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -45,7 +46,8 @@ async def get_produtos_por_curva(
         raise HTTPException(status_code=400, detail="Curva inválida. Use: A, B, C ou OFF")
     
     try:
-        produtos = analyzer.get_produtos_detalhados(
+        produtos = await run_blocking(
+            analyzer.get_produtos_detalhados,
             ano=ano,
             mes=mes,
             industria_codigo=industria,
@@ -70,7 +72,7 @@ async def get_industrias():
     Retorna apenas indústrias com for_tipo2 = 'A'
     """
     try:
-        industrias = analyzer.get_industrias_disponiveis()
+        industrias = await run_blocking(analyzer.get_industrias_disponiveis)
         
         return {
             "success": True,
@@ -2,18 +2,27 @@
 API Endpoints para Importação Inteligente de Tabelas de Preço com IA
 """
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
 import pandas as pd
-import io
 import json
 from openai import OpenAI
 import os
 import httpx
-import math
-from psycopg2.extras import execute_batch
+from services.import_jobs import cancel_job, job_status, resume_job, submit_job
+from services.price_import import import_price_rows
+from services.price_layouts import detect_columns, find_layout, save_layout
+from services.price_sheet import (
+    count_sheet_rows, file_size, is_large_file, iter_sheet_chunks, list_sheets, load_sheet, read_sheet_head,
+    session_id as sheet_session_id
+)
+from utils.blocking import run_blocking
+from utils.serialization import FastJSONResponse, column_values
+from utils.tenant_context import get_tenant_cnpj
 
 router = APIRouter(prefix="/api/price-table", tags=["price-table-import"])
 
+# Linhas lidas do início da sheet para amostra/cabeçalho/preview de arquivos grandes
+HEAD_ROWS = 100
+
 # Cliente OpenAI
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=httpx.Client(timeout=60.0))
 
@@ -27,23 +36,10 @@ async def get_sheets(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Arquivo deve ser .xlsx ou .xls")
     
     try:
-        file_content = await file.read()
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        
-        sheets = []
-        for sheet_name in xl.sheet_names:
-            # Tentar obter o número total de linhas de forma eficiente
-            sheet = xl.book[sheet_name]
-            total_rows = sheet.max_row
-            total_cols = sheet.max_column
-            
-            sheets.append({
-                "name": sheet_name,
-                "rows": total_rows,
-                "cols": total_cols
-            })
+        # read_only: só as dimensões declaradas de cada aba, sem carregar as células
+        sheets = await run_blocking(list_sheets, file.file)
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "sheets": sheets
         })
@@ -55,11 +51,10 @@ async def get_sheets(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def extract_sheet_sample(file_content: bytes, sheet_name: str, max_rows: int = 25):
-    """Extrai amostra de uma sheet específica para análise pela IA"""
+def extract_sheet_sample(sheet: pd.DataFrame, max_rows: int = 25):
+    """Extrai amostra da sheet (já lida pela sessão) para análise pela IA"""
     try:
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        df = pd.read_excel(xl, sheet_name=sheet_name, header=None, nrows=max_rows)
+        df = sheet.head(max_rows)
         
         # Converter para texto legível
         sample_text = df.to_string(max_colwidth=50)
@@ -72,14 +67,11 @@ def extract_sheet_sample(file_content: bytes, sheet_name: str, max_rows: int = 2
         raise HTTPException(status_code=400, detail=f"Erro ao ler sheet: {str(e)}")
 
 
-def count_data_rows(file_content: bytes, sheet_name: str, data_start_row: int):
+def count_data_rows(sheet: pd.DataFrame, data_start_row: int):
     """Conta total de linhas de dados na sheet"""
     try:
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-        
         # Contar linhas após o data_start_row que não estão vazias
-        data_df = df.iloc[data_start_row:]
+        data_df = sheet.iloc[data_start_row:]
         # Mais leniente: pelo menos 1 coluna preenchida (será validado depois por código/preço)
         non_empty = data_df.dropna(how='all')
         
@@ -163,44 +155,37 @@ RETORNE JSON:
         }
 
 
-def extract_preview(file_content: bytes, sheet_name: str, mapping: dict, header_row: int, data_start_row: int, max_rows: int = 10):
+def extract_preview(sheet: pd.DataFrame, mapping: dict, header_row: int, data_start_row: int, max_rows: int = 10):
     """Extrai preview dos dados usando o mapeamento da IA"""
     try:
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-        
         # Pegar linhas de dados
-        data_rows = df.iloc[data_start_row:data_start_row + max_rows]
+        data_rows = sheet.iloc[data_start_row:data_start_row + max_rows]
         
-        preview = []
-        for _, row in data_rows.iterrows():
-            item = {}
-            for field, col_idx in mapping.items():
-                if col_idx is not None and isinstance(col_idx, int) and col_idx < len(row):
-                    value = row.iloc[col_idx]
-                    # Converter para tipo serializável
-                    if pd.isna(value):
-                        item[field] = None
-                    elif isinstance(value, (int, float)):
-                        item[field] = value
-                    else:
-                        item[field] = str(value)
-            
-            if item.get('codigo') or item.get('descricao'):
-                preview.append(item)
+        # Converter por coluna: números ficam números, o resto vira texto, vazio = None
+        fields = {
+            field: col_idx for field, col_idx in mapping.items()
+            if col_idx is not None and isinstance(col_idx, int) and col_idx < data_rows.shape[1]
+        }
+        values = {}
+        for field, col_idx in fields.items():
+            serie = data_rows.iloc[:, col_idx]
+            if not pd.api.types.is_numeric_dtype(serie.dtype):
+                numeros = serie.map(lambda v: isinstance(v, (int, float)))
+                serie = serie.where(numeros, serie.astype(str)).where(serie.notna())
+            values[field] = column_values(serie)
         
-        return preview
+        preview = [dict(zip(values, row)) for row in zip(*values.values())]
+        return [item for item in preview if item.get('codigo') or item.get('descricao')]
         
     except Exception as e:
         print(f"Erro ao extrair preview: {e}")
         return []
 
 
-def extract_column_headers(file_content: bytes, sheet_name: str, header_row: int):
+def extract_column_headers(sheet: pd.DataFrame, header_row: int):
     """Extrai os nomes das colunas da linha de cabeçalho"""
     try:
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
+        df = sheet
         
         if header_row < len(df):
             headers = df.iloc[header_row].tolist()
@@ -217,46 +202,81 @@ def extract_column_headers(file_content: bytes, sheet_name: str, header_row: int
 @router.post("/analyze-sheet")
 async def analyze_sheet(
     file: UploadFile = File(...),
-    sheet_name: str = Form(...)
+    sheet_name: str = Form(...),
+    industry_id: str = Form(None)  # layout conhecido só é buscado com a indústria informada
 ):
     """
     Analisa uma sheet específica usando IA para identificar a estrutura e mapear colunas.
+
+    Cabeçalho já importado antes (services/price_layouts.py) reaproveita o
+    mapeamento salvo sem chamar a IA; se a IA falhar, o detector local
+    por palavras-chave assume. `mapping_source`: "layout", "ai" ou "heuristic".
     """
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Arquivo deve ser .xlsx ou .xls")
     
     try:
-        file_content = await file.read()
-        
-        # Extrair amostra da sheet selecionada
-        sample_info = extract_sheet_sample(file_content, sheet_name)
-        
-        # Analisar com IA
-        ai_analysis = analyze_with_ai(sample_info["sample_text"], sample_info["total_cols"])
+        # Lê a sheet uma vez; amostra, cabeçalhos, preview, contagem e a importação usam a mesma leitura.
+        # Arquivo grande: fica no arquivo temporário do upload, só o início da sheet é carregado
+        # e a contagem é feita em streaming.
+        large = is_large_file(file_size(file.file))
+        file_content = file.file if large else await file.read()
+        try:
+            if large:
+                session = await run_blocking(sheet_session_id, file_content)
+                sheet = await run_blocking(read_sheet_head, file_content, sheet_name, HEAD_ROWS)
+            else:
+                session, sheet = await run_blocking(load_sheet, sheet_name, file_content)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Erro ao ler sheet: {str(e)}")
+        
+        industria = int(industry_id) if industry_id else None
+        ai_analysis = await run_blocking(find_layout, sheet, sheet_name, industria)
+        if ai_analysis is not None:
+            mapping_source = "layout"
+        else:
+            # Extrair amostra da sheet selecionada
+            sample_info = extract_sheet_sample(sheet)
+            
+            # Analisar com IA
+            ai_analysis = await run_blocking(analyze_with_ai, sample_info["sample_text"], sample_info["total_cols"])
+            mapping_source = "ai"
+            if "error" in ai_analysis:
+                ai_analysis.update(detect_columns(sheet))
+                mapping_source = "heuristic"
+        print(f"📦 [PRICE IMPORT] {sheet_name}: mapeamento via {mapping_source}", flush=True)
         
         # Extrair cabeçalhos reais
         header_row = ai_analysis.get("header_row", 0)
         data_start_row = ai_analysis.get("data_start_row", header_row + 1)
         
-        detected_columns = extract_column_headers(file_content, sheet_name, header_row)
+        if large and data_start_row + 10 > HEAD_ROWS:
+            sheet = await run_blocking(read_sheet_head, file_content, sheet_name, data_start_row + 10)
+        
+        detected_columns = extract_column_headers(sheet, header_row)
         
         # Substituir detected_columns do AI pelos reais
         ai_analysis["detected_columns"] = detected_columns
         
         # Extrair preview dos dados
         mapping = ai_analysis.get("mapping", {})
-        preview = extract_preview(file_content, sheet_name, mapping, header_row, data_start_row)
+        preview = extract_preview(sheet, mapping, header_row, data_start_row)
         
         # Contar total de linhas
-        total_rows = count_data_rows(file_content, sheet_name, data_start_row)
+        if large:
+            total_rows = await run_blocking(count_sheet_rows, file_content, sheet_name, data_start_row)
+        else:
+            total_rows = count_data_rows(sheet, data_start_row)
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "data": {
+                "session_id": session,
                 "sheet_name": sheet_name,
                 "header_row": header_row,
                 "data_start_row": data_start_row,
                 "mapping": mapping,
+                "mapping_source": mapping_source,
                 "detected_columns": detected_columns,
                 "preview": preview,
                 "total_rows": total_rows,
@@ -265,6 +285,8 @@ async def analyze_sheet(
             }
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro na análise: {e}")
         import traceback
@@ -272,9 +294,21 @@ async def analyze_sheet(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _target_table(import_mode: str, table_name: str, existing_table: str):
+    return table_name if import_mode == 'new' else existing_table
+
+
+async def _remember_layout(sheet, file_content, sheet_name: str, header_row: int, data_start_row: int,
+                           mapping: dict, industria: int):
+    """Guarda o mapeamento aceito para o próximo upload com o mesmo cabeçalho pular a IA"""
+    if sheet is None:
+        sheet = await run_blocking(read_sheet_head, file_content, sheet_name, header_row + 1)
+    await run_blocking(save_layout, sheet, sheet_name, header_row, data_start_row, mapping, industria)
+
+
 @router.post("/import")
 async def import_price_table(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),  # opcional quando session_id ainda está em cache
     sheet_name: str = Form(...),
     mapping: str = Form(...),
     header_row: int = Form(0),
@@ -282,323 +316,75 @@ async def import_price_table(
     import_mode: str = Form("new"),  # 'new' or 'update'
     table_name: str = Form(None),  # Para modo 'new'
     existing_table: str = Form(None),  # Para modo 'update'
-    industry_id: str = Form(...)
+    industry_id: str = Form(...),
+    session_id: str = Form(None)  # devolvido pelo /analyze-sheet
 ):
     """
-    Importa os dados da planilha para o banco de dados usando as functions PostgreSQL.
+    Importa os dados da planilha para o banco de dados.
+
+    As linhas vão por COPY para uma staging e o merge em cad_prod/cad_tabelaspre
+    é set-based (services/price_import.py), preservando os valores do banco
+    quando a célula da planilha está vazia. A sheet vem da sessão do
+    /analyze-sheet (services/price_sheet.py) quando ainda está em cache.
     """
-    from services.database import get_current_engine
-    from datetime import datetime
-    
-    def get_db_connection():
-        return get_current_engine().raw_connection()
+    if file is None and not session_id:
+        raise HTTPException(status_code=400, detail="Envie o arquivo ou o session_id da análise")
     
     try:
         mapping_dict = json.loads(mapping)
-        file_content = await file.read()
-        
-        xl = pd.ExcelFile(io.BytesIO(file_content), engine='openpyxl')
-        df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-        
-        # Pegar apenas linhas de dados
-        data_df = df.iloc[data_start_row:]
-        # Filtro inicial leniente: remove apenas linhas totalmente vazias
-        non_empty = data_df.dropna(how='all')
-        
-        target_table = table_name if import_mode == 'new' else existing_table
+        large = file is not None and is_large_file(file_size(file.file))
+        file_content = None
+        if file is not None:
+            # Arquivo grande fica no arquivo temporário do upload (não vira bytes em memória)
+            file_content = file.file if large else await file.read()
+        
+        sheet = None
+        if large:
+            # Lotes de PRICE_IMPORT_CHUNK_ROWS linhas direto para o COPY (memória limitada ao lote)
+            non_empty = iter_sheet_chunks(file_content, sheet_name, start_row=data_start_row)
+            total_rows = "streaming"
+        else:
+            _, sheet = await run_blocking(load_sheet, sheet_name, file_content, session_id)
+            # Pegar apenas linhas de dados
+            data_df = sheet.iloc[data_start_row:]
+            # Filtro inicial leniente: remove apenas linhas totalmente vazias
+            non_empty = data_df.dropna(how='all')
+            total_rows = len(non_empty)
+        
+        target_table = _target_table(import_mode, table_name, existing_table)
         
         print(f"=== INICIANDO IMPORTAÇÃO ===")
         print(f"Modo: {import_mode}")
         print(f"Tabela: {target_table}")
         print(f"Indústria: {industry_id}")
-        print(f"Total de linhas: {len(non_empty)}")
+        print(f"Total de linhas: {total_rows}")
         
-        # Conectar ao banco
-        conn = get_db_connection()
-        cur = conn.cursor()
+        result = await run_blocking(import_price_rows, non_empty, mapping_dict, int(industry_id), target_table)
+        imported_count = result["inserted"] + result["updated"]
         
-        imported_count = 0
-        updated_count = 0
-        errors = []
-        prices_to_batch = [] # Lista para batch de preços
+        print(f"=== IMPORTAÇÃO CONCLUÍDA ===")
+        print(f"Total importados: {imported_count} ({result['inserted']} novos, {result['updated']} atualizados)")
+        print(f"Ignorados: {result['skipped']} | Erros: {len(result['errors'])}")
         
-        try:
-            for idx, row in non_empty.iterrows():
-                try:
-                    # Extrair valores do mapeamento
-                    def get_value(field):
-                        col_idx = mapping_dict.get(field)
-                        if col_idx is not None and col_idx < len(row):
-                            val = row.iloc[col_idx]
-                            return val if pd.notna(val) else None
-                        return None
-                    
-                    codigo = get_value('codigo')
-                    descricao = get_value('descricao')
-                    preco = get_value('preco')
-                    preco_promocao = get_value('preco_promocao')
-                    preco_especial = get_value('preco_especial')
-                    ipi = get_value('ipi')
-                    st = get_value('st')
-                    aplicacao = get_value('aplicacao')
-                    referencia_original = get_value('referencia_original')
-                    conversao = get_value('conversao')
-                    
-                    # Validação mínima
-                    if not codigo or not preco:
-                        continue
-                    
-                    # Limpar código (remover espaços)
-                    codigo = str(codigo).strip()
-                    
-                    # Converter preço para float
-                    try:
-                        preco_float = float(str(preco).replace(',', '.').replace('R$', '').strip())
-                    except:
-                        preco_float = 0.0
-                    
-                    # Converter outros preços
-                    def parse_price(val):
-                        if val is None:
-                            return None
-                        try:
-                            return float(str(val).replace(',', '.').replace('R$', '').strip())
-                        except:
-                            return None
-                    
-                    preco_promo_float = parse_price(preco_promocao)
-                    preco_esp_float = parse_price(preco_especial)
-                    
-                    # Converter percentuais
-                    def parse_percent(val):
-                        if val is None:
-                            return None
-                        try:
-                            return float(str(val).replace(',', '.').replace('%', '').strip())
-                        except:
-                            return None
-                    
-                    ipi_float = parse_percent(ipi)
-                    st_float = parse_percent(st)
-                    
-
-
-                    # --- LÓGICA DE PRESERVAÇÃO INTEGRAL (SMART MERGE V2) ---
-                    # REGRA DE OURO: Importação parcial NUNCA deve apagar dados existentes.
-                    # Se o Excel traz valor -> Atualiza.
-                    # Se o Excel NÃO traz (ou é inválido) -> Mantém o que está no banco.
-
-                    # 1. Busca dados atuais do Produto
-                    # Normaliza o código para garantir match mesmo com formatação diferente
-                    import re
-                    def normalize_code(val):
-                        # Remove tudo que não é dígito e remove zeros à esquerda
-                        clean = re.sub(r'\D', '', str(val)).strip()
-                        return clean.lstrip('0')
-
-                    normalized_codigo = normalize_code(codigo)
-                    cur.execute(
-                        """SELECT pro_id, pro_nome, pro_peso, pro_embalagem, pro_grupo, pro_setor, 
-                                  pro_linha, pro_ncm, pro_origem, pro_aplicacao, pro_codbarras, pro_codprod 
-                           FROM cad_prod 
-                           WHERE pro_industria = %s 
-                           AND LTRIM(REPLACE(TRIM(pro_codprod), '.', ''), '0') = %s""",
-                        (int(industry_id), normalized_codigo)
-                    )
-                    existing_prod = cur.fetchone()
-                    
-                    # Se encontrou, garantimos que vamos usar o CÓDIGO EXATO que já está no banco
-                    # para evitar que o PostgreSQL crie um duplicado por causa de pontos/zeros
-                    target_codprod = existing_prod[11] if existing_prod else codigo
-
-                    # Função Helper para decidir valor final (Imita a lógica iif da procedure)
-                    def resolve_val(new_val, old_db_idx, existing_row, default=None, is_numeric=False):
-                        # Identifica se o valor do Excel é verdadeiramente vazio
-                        is_empty = False
-                        if new_val is None: is_empty = True
-                        elif str(new_val).strip() == "": is_empty = True
-                        elif str(new_val).lower() == "nan": is_empty = True
-                        else:
-                            try:
-                                if isinstance(new_val, (float, int)) and math.isnan(new_val): is_empty = True
-                            except: pass
-                        
-                        if not is_empty:
-                             return new_val
-                        
-                        # Se estiver vazio na planilha, resgata o valor do Banco de Dados
-                        if existing_row and old_db_idx < len(existing_row):
-                            val_db = existing_row[old_db_idx]
-                            if val_db is not None:
-                                return float(val_db) if is_numeric else val_db
-                        return default
-
-                    # Extraindo valores brutos do Excel (podem ser None)
-                    excel_nome = get_value('descricao')
-                    excel_peso = get_value('peso')
-                    excel_emb = get_value('embalagem')
-                    excel_grupo = get_value('grupo')
-                    excel_setor = get_value('setor')
-                    excel_linha = get_value('linha')
-                    excel_ncm = get_value('ncm')
-                    excel_origem = get_value('origem')
-                    excel_aplicacao = get_value('aplicacao')
-                    excel_codbarras = get_value('codbarras')
-
-                    # Resolvendo valores finais do Produto usando o Helper Blindado
-                    final_nome = resolve_val(excel_nome, 1, existing_prod, default=codigo)
-                    final_peso = resolve_val(excel_peso, 2, existing_prod, is_numeric=True)
-                    final_emb = resolve_val(excel_emb, 3, existing_prod, is_numeric=True)
-                    final_grupo = resolve_val(excel_grupo, 4, existing_prod, is_numeric=True)
-                    final_setor = resolve_val(excel_setor, 5, existing_prod)
-                    final_linha = resolve_val(excel_linha, 6, existing_prod)
-                    final_ncm = resolve_val(excel_ncm, 7, existing_prod)
-                    final_origem = resolve_val(excel_origem, 8, existing_prod)
-                    final_aplicacao = resolve_val(excel_aplicacao, 9, existing_prod)
-                    final_codbarras = resolve_val(excel_codbarras, 10, existing_prod)
-
-                    # Truncar textos longos para evitar erro
-                    if final_nome: final_nome = str(final_nome)[:200]
-                    if final_aplicacao: final_aplicacao = str(final_aplicacao)[:500]
-
-
-                    # 1. UPSERT produto em cad_prod via fn_upsert_produto
-                    cur.execute(
-                        """SELECT fn_upsert_produto(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) as pro_id""",
-                        (
-                            int(industry_id),    # p_industria
-                            target_codprod,      # p_codprod (USAMOS O CÓDIGO QUE ESTÁ NO BANCO SE EXISTIR)
-                            final_nome,          # p_nome
-                            final_peso,          # p_peso
-                            final_emb,           # p_embalagem
-                            final_grupo,         # p_grupo
-                            final_setor,         # p_setor
-                            final_linha,         # p_linha
-                            final_ncm,           # p_ncm
-                            final_origem,        # p_origem
-                            final_aplicacao,     # p_aplicacao
-                            final_codbarras      # p_codbarras
-                        )
-                    )
-                    
-                    result = cur.fetchone()
-                    pro_id = result[0] if result else (existing_prod[0] if existing_prod else None)
-                    
-                    if not pro_id:
-                        errors.append(f"Linha {idx}: Não foi possível criar/identificar produto {codigo}")
-                        continue
-                    
-                    # 2. Busca dados atuais de PREÇOS (se existir)
-                    cur.execute(
-                        """SELECT itab_precopromo, itab_precoespecial, itab_ipi, itab_st, itab_precobruto,
-                                  itab_grupodesconto, itab_descontoadd, itab_datavencimento
-                           FROM cad_tabelaspre 
-                           WHERE itab_idprod = %s AND itab_idindustria = %s AND itab_tabela = %s""",
-                        (pro_id, int(industry_id), target_table)
-                    )
-                    existing_price = cur.fetchone() # [0..7]
-
-                    # Valores do Excel (podem ser None se não mapeados)
-                    # Nota: preco_float, preco_promo_float, etc já foram parseados lá em cima, mas podem ser 0.0 se falhou o parse
-                    # Precisamos diferenciar "0.0 válido" de "não informado" -> Melhor usar o get_value cru para saber se veio da planilha
-                    
-                    raw_preco = get_value('preco')
-                    raw_promo = get_value('preco_promocao')
-                    raw_especial = get_value('preco_especial')
-                    raw_ipi = get_value('ipi')
-                    raw_st = get_value('st')
-
-                    # Helper para preço e percentual
-                    def resolve_num(raw_val, parsed_val, old_db_val):
-                        # Se raw_val existe (foi mapeado e tem conteúdo), usa o parsed_val (mesmo que seja 0)
-                        # Tratar NaN (pandas) como ausente
-                        is_nan = False
-                        try:
-                            if isinstance(raw_val, float) and math.isnan(raw_val):
-                                is_nan = True
-                        except:
-                            pass
-
-                        if raw_val is not None and str(raw_val).strip() != "" and not is_nan and str(raw_val).lower() != "nan":
-                             return parsed_val
-                        # Se não veio na planilha (ou é NaN), preserva o banco
-                        if old_db_val is not None and str(old_db_val).strip() != "":
-                            try:
-                                return float(old_db_val)
-                            except:
-                                return 0.0
-                        return 0.0
-
-                    final_bruto = resolve_num(raw_preco, preco_float, existing_price[4] if existing_price else None)
-                    final_promo = resolve_num(raw_promo, preco_promo_float, existing_price[0] if existing_price else None)
-                    final_especial = resolve_num(raw_especial, preco_esp_float, existing_price[1] if existing_price else None)
-                    final_ipi = resolve_num(raw_ipi, ipi_float, existing_price[2] if existing_price else None)
-                    final_st = resolve_num(raw_st, st_float, existing_price[3] if existing_price else None)
-                    
-                    # Resolve campos opcionais preservando do banco se vierem vazios
-                    final_grupodesconto = resolve_num(get_value('grupodesconto'), None, existing_price[5] if existing_price else None)
-                    final_descontoadd = resolve_num(get_value('descontoadd'), None, existing_price[6] if existing_price else None)
-                    final_datavencimento = resolve_num(get_value('datavencimento'), None, existing_price[7] if existing_price else None)
-                    # Coletar para batch de preços
-                    prices_to_batch.append((
-                        pro_id,               # p_idprod
-                        int(industry_id),     # p_industria
-                        target_table,         # p_tabela
-                        final_bruto,          # p_precobruto (preservado)
-                        final_promo,          # p_precopromo
-                        final_especial,       # p_precoespecial
-                        final_ipi,            # p_ipi
-                        final_st,             # p_st
-                        final_grupodesconto,  # p_grupodesconto (preservado)
-                        final_descontoadd,    # p_descontoadd (preservado)
-                        datetime.now().strftime('%Y-%m-%d'),  # p_datatabela
-                        final_datavencimento   # p_datavencimento (preservado)
-                    ))
-                    
-                    imported_count += 1
-                    
-                    # Executa batch a cada 500 registros para velocidade e segurança
-                    if len(prices_to_batch) >= 500:
-                        execute_batch(cur,
-                            """SELECT fn_upsert_preco(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                            prices_to_batch)
-                        conn.commit()
-                        print(f"  -> Batch de {len(prices_to_batch)} importados (Total: {imported_count})")
-                        prices_to_batch.clear()
-                        
-                except Exception as row_error:
-                    errors.append(f"Linha {idx}: {str(row_error)}")
-                    if len(errors) > 50:
-                        break  # Para de erros excessivos
-            
-            # Batch final para o que restou
-            if prices_to_batch:
-                execute_batch(cur,
-                    """SELECT fn_upsert_preco(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    prices_to_batch)
-                conn.commit()
-                print(f"  -> Último batch de {len(prices_to_batch)} importados.")
-            
-            print(f"=== IMPORTAÇÃO CONCLUÍDA ===")
-            print(f"Total importados: {imported_count}")
-            print(f"Erros: {len(errors)}")
-            
-        except Exception as db_error:
-            conn.rollback()
-            raise db_error
-        finally:
-            cur.close()
-            conn.close()
+        await _remember_layout(sheet, file_content, sheet_name, header_row, data_start_row, mapping_dict,
+                               int(industry_id))
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "message": f"Importação concluída com sucesso!",
             "total_imported": imported_count,
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "skipped": result["skipped"],
+            "prices_inserted": result["prices_inserted"],
+            "prices_updated": result["prices_updated"],
             "import_mode": import_mode,
             "table_name": target_table,
-            "errors": errors[:10]  # Máximo 10 erros
+            "errors": result["errors"][:10]  # Máximo 10 erros
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro na importação: {e}")
         import traceback
@@ -606,13 +392,77 @@ async def import_price_table(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/jobs", status_code=202)
+async def submit_import_job(
+    file: UploadFile = File(...),
+    sheet_name: str = Form(...),
+    mapping: str = Form(...),
+    header_row: int = Form(0),
+    data_start_row: int = Form(1),
+    import_mode: str = Form("new"),  # 'new' or 'update'
+    table_name: str = Form(None),  # Para modo 'new'
+    existing_table: str = Form(None),  # Para modo 'update'
+    industry_id: str = Form(...)
+):
+    """
+    Mesma importação do /import, mas em segundo plano (services/import_jobs.py).
+    Devolve o job_id na hora; acompanhe por GET /jobs/{job_id}.
+    """
+    try:
+        mapping_dict = json.loads(mapping)
+        file_content = await file.read()
+        target_table = _target_table(import_mode, table_name, existing_table)
+        job = await run_blocking(submit_job, file_content, sheet_name, mapping_dict, data_start_row,
+                                 int(industry_id), target_table, import_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await _remember_layout(None, file_content, sheet_name, header_row, data_start_row, mapping_dict,
+                           int(industry_id))
+    print(f"📦 [PRICE JOB {job['job_id'][:8]}] enfileirado: {sheet_name} -> {target_table} (indústria {industry_id})")
+    return FastJSONResponse(status_code=202, content={"success": True, "data": job})
+
+
+@router.get("/jobs/{job_id}")
+async def get_import_job(job_id: str):
+    """Progresso do job: linhas feitas, taxa (linhas/s), ETA e contagens"""
+    job = await run_blocking(job_status, job_id, get_tenant_cnpj())
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return FastJSONResponse(content={"success": True, "data": job})
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_import_job(job_id: str):
+    """Cancela o job; os lotes já commitados permanecem"""
+    try:
+        job = await run_blocking(cancel_job, job_id, get_tenant_cnpj())
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return FastJSONResponse(content={"success": True, "data": job})
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_import_job(job_id: str):
+    """Retoma um job interrompido (reinício do servidor) ou com falha a partir do último lote commitado"""
+    try:
+        job = await run_blocking(resume_job, job_id, get_tenant_cnpj())
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return FastJSONResponse(content={"success": True, "data": job})
+
+
 # Manter endpoint antigo para compatibilidade
 @router.post("/analyze")
 async def analyze_price_table(file: UploadFile = File(...)):
     """
     Endpoint legado - redireciona para o novo fluxo.
     """
-    return JSONResponse(content={
+    return FastJSONResponse(content={
         "success": False,
         "message": "Use o novo endpoint /api/price-table/get-sheets seguido de /api/price-table/analyze-sheet"
     })
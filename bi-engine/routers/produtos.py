@@ -2,11 +2,22 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
 from services.database import get_current_engine
+from utils.blocking import run_blocking
 from datetime import datetime
 
 def get_db_connection():
     return get_current_engine().raw_connection()
 
+def _fetch_all(sql: str, params: tuple):
+    """Executa a função do banco e devolve todas as linhas (roda no pool de threads)"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        conn.close()
+
 router = APIRouter(prefix="/api/produtos", tags=["produtos"])
 
 @router.get("/ranking")
@@ -21,22 +32,17 @@ async def get_produtos_ranking(
     """
     Retorna o ranking de produtos com curva ABC baseada em quantidade.
     """
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        
         # Prioriza mes_inicio/fim, senão usa mes, senão default ano todo
         start = mes_inicio if mes_inicio else (mes if mes else 1)
         end = mes_fim if mes_fim else (mes if mes else 12)
         
-        cur.execute("""
+        rows = await run_blocking(_fetch_all, """
             SELECT * FROM fn_produtos_ranking(
                 %s, %s, %s, %s, %s
             )
         """, (ano, start, end, industria, cliente))
         
-        rows = cur.fetchall()
-        
         # Convert rows to dict list
         results = []
         for row in rows:
@@ -57,8 +63,6 @@ async def get_produtos_ranking(
     except Exception as e:
         print(f"Erro ao buscar ranking de produtos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.get("/{produto_id}/clientes")
 async def get_produtos_clientes(
@@ -68,14 +72,9 @@ async def get_produtos_clientes(
     mes_inicio: Optional[int] = Query(1, description="Mês inicial"),
     mes_fim: Optional[int] = Query(12, description="Mês final")
 ):
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        
-        cur.execute("SELECT * FROM fn_produtos_clientes(%s, %s, %s, %s, %s)", 
+        rows = await run_blocking(_fetch_all, "SELECT * FROM fn_produtos_clientes(%s, %s, %s, %s, %s)", 
                    (produto_id, compraram, ano, mes_inicio, mes_fim))
-        
-        rows = cur.fetchall()
         return [{
             "cliente_codigo": row[0],
             "cliente_nome": row[1],
@@ -86,8 +85,6 @@ async def get_produtos_clientes(
     except Exception as e:
         print(f"Erro ao buscar clientes do produto: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.get("/familia-ranking")
 async def get_familia_ranking(
@@ -97,17 +94,12 @@ async def get_familia_ranking(
     mes_fim: Optional[int] = None,
     industria: Optional[int] = None
 ):
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        
         start = mes_inicio if mes_inicio else (mes if mes else 1)
         end = mes_fim if mes_fim else (mes if mes else 12)
         
-        cur.execute("SELECT * FROM fn_produtos_familias(%s, %s, %s, %s, NULL)", 
+        rows = await run_blocking(_fetch_all, "SELECT * FROM fn_produtos_familias(%s, %s, %s, %s, NULL)", 
                    (ano, start, end, industria))
-        
-        rows = cur.fetchall()
         return [{
             "codigo": row[0],
             "nome": row[1],
@@ -117,19 +109,14 @@ async def get_familia_ranking(
         } for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.get("/portfolio-vs-vendas")
 async def get_portfolio_vs_vendas(
     ano: int,
     industria: Optional[int] = None
 ):
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM fn_produtos_portfolio_vendas(%s, %s)", (ano, industria))
-        rows = cur.fetchall()
+        rows = await run_blocking(_fetch_all, "SELECT * FROM fn_produtos_portfolio_vendas(%s, %s)", (ano, industria))
         
         return [{
             "mes": row[0],
@@ -140,19 +127,14 @@ async def get_portfolio_vs_vendas(
         } for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.get("/{produto_id}/desempenho-mensal")
 async def get_produto_desempenho(
     produto_id: int,
     ano: int
 ):
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM fn_produtos_desempenho_mensal(%s, %s)", (produto_id, ano))
-        rows = cur.fetchall()
+        rows = await run_blocking(_fetch_all, "SELECT * FROM fn_produtos_desempenho_mensal(%s, %s)", (produto_id, ano))
         
         return [{
             "mes": row[0],
@@ -163,5 +145,3 @@ async def get_produto_desempenho(
         } for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
@@ -1,5 +1,18 @@
+import numpy as np
 import pandas as pd
 from services.database import execute_query
+from services.periods import periodo_ano
+from services.vendas_cube import fontes_vendas
+from utils.serialization import records
+
+
+def _metric_expr(metric: str, condicao: str = None) -> str:
+    """Agregação da métrica sobre a fonte de vendas (alias v), opcionalmente condicionada"""
+    metric = metric.lower()
+    col = {'valor': 'v.valor', 'unidades': 'v.produto'}.get(metric, 'v.quantidade')
+    if condicao:
+        col = f"CASE WHEN {condicao} THEN {col} END"
+    return f"COUNT(DISTINCT {col})" if metric == 'unidades' else f"SUM({col})"
 
 def analyze_pareto(ano: int, metric: str = 'valor', limit: int = 20):
     """
@@ -8,32 +21,23 @@ def analyze_pareto(ano: int, metric: str = 'valor', limit: int = 20):
     """
     print(f"--- ANALYTICS: Processing Pareto {ano} ({metric}) ---", flush=True)
     
-    agg_func = "SUM"
-    if metric.lower() == 'valor':
-        col_metric = 'i.ite_totliquido'
-    elif metric.lower() == 'quantidade':
-        col_metric = 'i.ite_quant'
-    elif metric.lower() == 'unidades':
-        agg_func = "COUNT(DISTINCT"
-        col_metric = "i.ite_idproduto)"
-    else:
-        col_metric = 'i.ite_quant'
+    inicio, fim = periodo_ano(ano)
+    itens_src, _, params = fontes_vendas(inicio, fim)
+    metric_expr = _metric_expr(metric)
 
     query = f"""
         SELECT 
             c.cli_nomred as nome,
-            {agg_func} {col_metric} as total
-        FROM pedidos p
-        JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-        JOIN clientes c ON p.ped_cliente = c.cli_codigo
-        WHERE p.ped_data >= make_date(:ano, 1, 1) AND p.ped_data <= make_date(:ano, 12, 31)
-          AND p.ped_situacao IN ('P', 'F')
+            {metric_expr} as total
+        FROM ({itens_src}) v
+        JOIN clientes c ON v.cliente = c.cli_codigo
+        WHERE v.situacao IN ('P', 'F')
         GROUP BY 1
         ORDER BY 2 DESC
     """
     
     try:
-        df = execute_query(query, {"ano": ano})
+        df = execute_query(query, params)
         
         if df.empty:
             return []
@@ -50,17 +54,9 @@ def analyze_pareto(ano: int, metric: str = 'valor', limit: int = 20):
         
         # Take Top N
         top_n = df.head(limit).copy()
+        top_n['percent_acc'] = top_n['percent_acc'].round(1)
         
-        # Prepare result
-        result = []
-        for _, row in top_n.iterrows():
-            result.append({
-                "name": row['nome'],
-                "value": row['total'],
-                "percent_acc": round(row['percent_acc'], 1)
-            })
-            
-        return result
+        return records(top_n, columns=["nome", "total", "percent_acc"], rename={"nome": "name", "total": "value"})
         
     except Exception as e:
         print(f"FAULT: Pareto analysis failed: {str(e)}", flush=True)
@@ -71,52 +67,28 @@ def analyze_industry_growth(ano: int, metric: str = 'valor', limit: int = 15):
     Calcula crescimento das indústrias em relação ao ano anterior.
     Retorna: nome, atual, anterior, dif_valor, dif_perc
     """
-    agg_func = "SUM"
-    if metric.lower() == 'valor':
-        col_metric = 'i.ite_totliquido'
-    elif metric.lower() == 'quantidade':
-        col_metric = 'i.ite_quant'
-    elif metric.lower() == 'unidades':
-        agg_func = "COUNT(DISTINCT"
-        col_metric = "i.ite_idproduto)"
-    else:
-        col_metric = 'i.ite_quant'
+    # Ano anterior + atual numa única leitura, separados por CASE
+    inicio_atual, fim_atual = periodo_ano(ano)
+    itens_src, _, params = fontes_vendas(periodo_ano(ano - 1)[0], fim_atual)
+    params.update({"inicio_atual": inicio_atual, "limit": limit})
+    atual_expr = _metric_expr(metric, "v.dia >= :inicio_atual")
+    anterior_expr = _metric_expr(metric, "v.dia < :inicio_atual")
 
     query = f"""
-        WITH vendas_atual AS (
-            SELECT 
-                f.for_nomered as nome,
-                {agg_func} {col_metric} as atual
-            FROM pedidos p
-            JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-            JOIN fornecedores f ON p.ped_industria = f.for_codigo
-            WHERE p.ped_data >= make_date(:ano, 1, 1) AND p.ped_data <= make_date(:ano, 12, 31)
-              AND p.ped_situacao IN ('P', 'F')
-            GROUP BY 1
-        ),
-        vendas_anterior AS (
-            SELECT 
-                f.for_nomered as nome,
-                {agg_func} {col_metric} as anterior
-            FROM pedidos p
-            JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-            JOIN fornecedores f ON p.ped_industria = f.for_codigo
-            WHERE p.ped_data >= make_date(:ano - 1, 1, 1) AND p.ped_data <= make_date(:ano - 1, 12, 31)
-              AND p.ped_situacao IN ('P', 'F')
-            GROUP BY 1
-        )
         SELECT 
-            coalesce(v1.nome, v2.nome) as nome,
-            coalesce(v1.atual, 0) as atual,
-            coalesce(v2.anterior, 0) as anterior
-        FROM vendas_atual v1
-        FULL OUTER JOIN vendas_anterior v2 ON v1.nome = v2.nome
+            f.for_nomered as nome,
+            coalesce({atual_expr}, 0) as atual,
+            coalesce({anterior_expr}, 0) as anterior
+        FROM ({itens_src}) v
+        JOIN fornecedores f ON v.industria = f.for_codigo
+        WHERE v.situacao IN ('P', 'F')
+        GROUP BY 1
         ORDER BY atual DESC
         LIMIT :limit
     """
     
     try:
-        df = execute_query(query, {"ano": ano, "limit": limit})
+        df = execute_query(query, params)
         
         if df.empty:
             return []
@@ -131,9 +103,11 @@ def analyze_industry_growth(ano: int, metric: str = 'valor', limit: int = 15):
         
         df['dif_valor'] = df['atual'] - df['anterior']
         # Avoid division by zero
-        df['dif_perc'] = df.apply(lambda row: ((row['atual'] - row['anterior']) / row['anterior'] * 100) if row['anterior'] > 0 else 100, axis=1)
+        df['dif_perc'] = np.where(
+            df['anterior'] > 0, df['dif_valor'] / df['anterior'].where(df['anterior'] > 0, 1) * 100, 100.0
+        )
         
-        return df.to_dict(orient='records')
+        return records(df)
         
     except Exception as e:
         print(f"FAULT: Analysis failed: {str(e)}", flush=True)
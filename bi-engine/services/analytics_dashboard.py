@@ -1,29 +1,18 @@
 from services.database import execute_query
+from services.kpi_engine import compute_kpis
+from services.periods import periodo_anterior, resolve_periodo
 import pandas as pd
 from datetime import datetime, timedelta
 from functools import lru_cache
-import time
-from utils.tenant_context import get_tenant_cnpj
+from utils.cache import bi_cache
+from utils.sections import run_sections
 
-# Simple cache for AI and data
+# Cache for AI and data (utils.cache: LRU + TTL, tenant-aware)
 CACHE_TTL = 300 # 5 minutes
-_cache = {}
 
 def get_cached_result(key, func, *args, **kwargs):
-    now = time.time()
-    
-    # Injetar tenant_id na chave para evitar vazamento entre empresas
-    tenant_id = get_tenant_cnpj() or "default"
-    full_key = f"{tenant_id}_{key}"
-    
-    if full_key in _cache:
-        timestamp, result = _cache[full_key]
-        if now - timestamp < CACHE_TTL:
-            return result
-    
-    result = func(*args, **kwargs)
-    _cache[full_key] = (now, result)
-    return result
+    # O namespace do tenant é aplicado pelo bi_cache (evita vazamento entre empresas)
+    return bi_cache.get_or_compute("analytics", key, lambda: func(*args, **kwargs), ttl=CACHE_TTL)
 
 def get_critical_alerts(ano: int, mes: str, industry_id: int = None, startDate: str = None, endDate: str = None):
     """
@@ -151,52 +140,23 @@ def get_kpis_metrics(ano: int, mes: str = None, industry_id: int = None):
         meta_df = execute_query(meta_query, meta_params)
         meta_val = float(meta_df.iloc[0]['meta_total']) if not meta_df.empty and meta_df.iloc[0]['meta_total'] is not None else 0
 
-        def fetch_period(target_ano, target_mes):
-            where = f"ano = :target_ano"
-            params = {"target_ano": target_ano}
-            if target_mes:
-                where += f" AND mes = :target_mes"
-                params["target_mes"] = target_mes
-            
-            if industry_id and industry_id != 'Todos':
-                where += " AND industry_id = :ind_id"
-                params["ind_id"] = industry_id
-            
-            query = f"""
-                SELECT 
-                    SUM(valor_total) as valor_total,
-                    SUM(qtd_pedidos) as qtd_pedidos,
-                    SUM(clientes_ativos) as clientes_ativos,
-                    CASE WHEN SUM(qtd_pedidos) > 0 
-                         THEN SUM(valor_total) / SUM(qtd_pedidos) 
-                         ELSE 0 END as ticket_medio
-                FROM vw_performance_mensal
-                WHERE {where}
-            """
-            df = execute_query(query, params)
-            if df.empty or df.iloc[0]['valor_total'] is None:
-                return {"valor_total": 0, "qtd_pedidos": 0, "ticket_medio": 0, "clientes_ativos": 0}
-            row = df.iloc[0]
+        # Atual e anterior (mês: MoM, ano: YoY) numa única leitura
+        kpis = compute_kpis(
+            {"atual": resolve_periodo(ano, mes_num), "anterior": periodo_anterior(ano, mes_num)},
+            ["valor_pedidos", "qtd_pedidos", "clientes_pedidos", "ticket_pedidos"],
+            industria=industry_id if industry_id and industry_id != 'Todos' else None
+        )
+        
+        def as_metrics(valores):
             return {
-                "valor_total": float(row['valor_total'] or 0),
-                "qtd_pedidos": int(row['qtd_pedidos'] or 0),
-                "clientes_ativos": int(row['clientes_ativos'] or 0),
-                "ticket_medio": float(row['ticket_medio'] or 0)
+                "valor_total": valores["valor_pedidos"],
+                "qtd_pedidos": int(valores["qtd_pedidos"]),
+                "clientes_ativos": int(valores["clientes_pedidos"]),
+                "ticket_medio": valores["ticket_pedidos"]
             }
-
-        # Período Atual
-        current = fetch_period(ano, mes_num)
-
-        # Período Anterior (Para comparação)
-        if mes_num:
-            if mes_num == 1:
-                prev_ano, prev_mes = ano - 1, 12
-            else:
-                prev_ano, prev_mes = ano, mes_num - 1
-        else:
-            prev_ano, prev_mes = ano - 1, None
         
-        previous = fetch_period(prev_ano, prev_mes)
+        current = as_metrics(kpis["atual"])
+        previous = as_metrics(kpis["anterior"])
 
         # Calcular Variações
         def calc_var(curr, prev):
@@ -498,56 +458,28 @@ def get_full_analytics_tab(ano: int, mes: str = "Todos", industry_id: int = None
     """
     try:
         from services.insights import generate_critical_alerts_ai
-        from concurrent.futures import ThreadPoolExecutor
         
         # 1. Fetch data in parallel (or sequential but efficiently)
         # We use a cache key based on params
         cache_key = f"full_tab_{ano}_{mes}_{industry_id}_{startDate}_{endDate}"
         
         def compute_all():
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                # Dispara as queries em paralelo
-                future_alerts = executor.submit(get_critical_alerts, ano, mes, industry_id, startDate, endDate)
-                future_abc = executor.submit(get_portfolio_abc, ano, mes, industry_id, startDate, endDate)
-                future_variations = executor.submit(get_top_clients_variation, ano, mes, industry_id, startDate, endDate)
-                
-                # AI Alerts (the heaviest part, we use a separate cache internally)
-                # ai_cache_key = f"ai_alerts_{ano}_{mes}_{industry_id}"
-                # future_ai = executor.submit(get_cached_result, ai_cache_key, generate_critical_alerts_ai, ano, mes, industry_id)
-                
-                # Coleta os resultados com segurança individual
-                results = {}
-                
-                try: results["alerts"] = future_alerts.result()
-                except Exception as e: 
-                    print(f"Error in future_alerts: {e}")
-                    results["alerts"] = {}
-
-                # try: results["kpis"] = future_kpis.result()
-                # except Exception as e:
-                #     print(f"Error in future_kpis: {e}")
-                #     results["kpis"] = {"valor_total": 0, "qtd_pedidos": 0, "ticket_medio": 0, "clientes_ativos": 0}
-                results["kpis"] = {} # KPI Fetch disabled by user request
-
-                try: results["portfolio_abc"] = future_abc.result()
-                except Exception as e:
-                    print(f"Error in future_abc: {e}")
-                    results["portfolio_abc"] = []
-
-                try: results["client_variations"] = future_variations.result()
-                except Exception as e:
-                    print(f"Error in future_variations: {e}")
-                    results["client_variations"] = []
-
-                # try: results["advanced_insights"] = future_ai.result()
-                # except Exception as e:
-                #     print(f"Error in future_ai: {e}")
-                #     results["advanced_insights"] = []
-                results["advanced_insights"] = [] # AI is fetched separately now
-
-                return results
+            # Queries em paralelo (com o contexto do tenant); falha individual vira vazio
+            results, timings = run_sections({
+                "alerts": (lambda: get_critical_alerts(ano, mes, industry_id, startDate, endDate), {}),
+                "portfolio_abc": (lambda: get_portfolio_abc(ano, mes, industry_id, startDate, endDate), []),
+                "client_variations": (lambda: get_top_clients_variation(ano, mes, industry_id, startDate, endDate), []),
+            }, label="analytics_full_tab")
+            results["kpis"] = {} # KPI Fetch disabled by user request
+            results["advanced_insights"] = [] # AI is fetched separately now
+            results["sections"] = timings
+            return results
 
-        return get_cached_result(cache_key, compute_all)
+        # Resultado parcial não vai para o cache
+        return bi_cache.get_or_compute(
+            "analytics", cache_key, compute_all, ttl=CACHE_TTL,
+            cache_if=lambda r: all(t["status"] == "ok" for t in r["sections"].values())
+        )
         
     except Exception as e:
         print(f"Error in get_full_analytics_tab: {e}")
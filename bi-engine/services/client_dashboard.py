@@ -3,21 +3,18 @@ Client Dashboard Service
 Serviço para análise de desempenho por clientes.
 V2 - Performance optimized: No TRIM/EXTRACT on indexed columns, status 'E' included.
 """
-from services.database import execute_query
+from services.database import execute_query, execute_rows, stream_rows
+from services.periods import filtro_periodo_sql, periodo_anterior, periodo_mes, resolve_periodo
+from utils.sections import run_sections
+from utils.serialization import column_values, records
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
 
 def _build_date_filter(ano: int, mes: int = None, startDate: str = None, endDate: str = None, alias: str = "p"):
     """Build date filter using range comparison (index-friendly)."""
-    if startDate and endDate:
-        return f"{alias}.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-    
-    if mes:
-        # First day of month to last day of month
-        return f"{alias}.ped_data >= make_date({ano}, {mes}, 1) AND {alias}.ped_data < (make_date({ano}, {mes}, 1) + INTERVAL '1 month')"
-    
-    return f"{alias}.ped_data >= make_date({ano}, 1, 1) AND {alias}.ped_data <= make_date({ano}, 12, 31)"
+    return filtro_periodo_sql(*resolve_periodo(ano, mes, startDate, endDate), coluna=f"{alias}.ped_data")
 
 
 def _build_industry_filter(industry_id: int = None, alias: str = "p"):
@@ -44,15 +41,26 @@ def get_client_details(ano: int, mes: str, industry_id: int = None, metrica: str
             except:
                 pass
 
+        # Seções independentes em paralelo; a que falhar/estourar o timeout sai vazia
+        data, timings = run_sections({
+            "groups": (lambda: get_client_groups(ano, month_int, industry_id, metrica, startDate, endDate), []),
+            "purchase_cycle": (lambda: get_purchase_cycle(ano, month_int, industry_id), []),
+            "top_clients": (lambda: get_top_clients_impact(ano, month_int, industry_id, metrica, startDate, endDate), []),
+            "active_inactive": (lambda: get_active_vs_inactive(ano, industry_id, uf), {
+                "ano": ano, "total_carteira": 0, "total_atendidos": 0, "sem_compra_total": 0,
+                "monthly": [], "ufs_disponiveis": [], "uf_selecionado": uf
+            }),
+            "no_purchase": (lambda: get_clients_no_purchase(ano, month_int, industry_id, uf, startDate, endDate), []),
+            "churn_risk": (lambda: get_churn_risk_clients(ano, month_int, industry_id), []),
+            "store_industry_matrix": (lambda: get_store_industry_matrix(ano, month_int, metrica, startDate, endDate),
+                                      {"industries": [], "rows": [], "totals": {}}),
+        }, label="client_details")
+
         return {
             "success": True,
-            "groups": get_client_groups(ano, month_int, industry_id, metrica, startDate, endDate),
-            "purchase_cycle": get_purchase_cycle(ano, month_int, industry_id),
-            "top_clients": get_top_clients_impact(ano, month_int, industry_id, metrica, startDate, endDate),
-            "active_inactive": get_active_vs_inactive(ano, industry_id, uf),
-            "no_purchase": get_clients_no_purchase(ano, month_int, industry_id, uf, startDate, endDate),
-            "churn_risk": get_churn_risk_clients(ano, month_int, industry_id),
-            "store_industry_matrix": get_store_industry_matrix(ano, month_int, metrica, startDate, endDate)
+            **data,
+            "partial": any(t["status"] != "ok" for t in timings.values()),
+            "sections": timings
         }
     except Exception as e:
         print(f"ERROR: get_client_details failed: {e}", flush=True)
@@ -91,14 +99,8 @@ def get_client_groups(ano: int, mes: int = None, industry_id: int = None, metric
     if df.empty:
         return []
     
-    return [
-        {
-            "grupo": row['grupo'],
-            "valor": float(row['valor']) if row['valor'] else 0,
-            "quantidade": int(row['quantidade']) if row['quantidade'] else 0
-        }
-        for _, row in df.iterrows()
-    ]
+    return records(df, columns=["grupo", "valor", "quantidade"],
+                   types={"valor": "float", "quantidade": "int"}, fill={"valor": 0, "quantidade": 0})
 
 
 def get_purchase_cycle(ano: int, mes: int = None, industry_id: int = None):
@@ -142,15 +144,9 @@ def get_purchase_cycle(ano: int, mes: int = None, industry_id: int = None):
     if df.empty:
         return []
     
-    return [
-        {
-            "cliente": row['nome'],
-            "pedidos": int(row['pedidos']),
-            "ciclo": int(row['ciclo']) if row['ciclo'] else 0,
-            "dias_sem_compra": int(row['dias_sem_compra']) if row['dias_sem_compra'] else 0
-        }
-        for _, row in df.iterrows()
-    ]
+    return records(df, columns=["nome", "pedidos", "ciclo", "dias_sem_compra"],
+                   types={"pedidos": "int", "ciclo": "int", "dias_sem_compra": "int"},
+                   fill={"pedidos": 0, "ciclo": 0, "dias_sem_compra": 0}, rename={"nome": "cliente"})
 
 
 def get_top_clients_impact(ano: int, mes: int = None, industry_id: int = None, metrica: str = 'valor', startDate: str = None, endDate: str = None):
@@ -161,16 +157,8 @@ def get_top_clients_impact(ano: int, mes: int = None, industry_id: int = None, m
     date_filter = _build_date_filter(ano, mes, startDate, endDate)
     industry_filter = _build_industry_filter(industry_id)
     
-    # Build previous period filter
-    if startDate and endDate:
-        prev_filter = f"p.ped_data BETWEEN ('{startDate}'::date - INTERVAL '1 year') AND ('{endDate}'::date - INTERVAL '1 year')"
-    else:
-        if mes:
-            prev_mes = mes - 1 if mes > 1 else 12
-            prev_ano = ano if mes > 1 else ano - 1
-            prev_filter = _build_date_filter(prev_ano, prev_mes)
-        else:
-            prev_filter = _build_date_filter(ano - 1)
+    # Build previous period filter (range: YoY, mês: MoM, ano: YoY)
+    prev_filter = filtro_periodo_sql(*periodo_anterior(ano, mes, startDate, endDate))
     
     value_column = "SUM(p.ped_totliq)" if metrica == 'valor' else "COALESCE(SUM(i.total_qtd), 0)"
     
@@ -223,27 +211,17 @@ def get_top_clients_impact(ano: int, mes: int = None, industry_id: int = None, m
     if df.empty:
         return []
     
-    result = []
-    for idx, row in df.iterrows():
-        valor = float(row['valor']) if row['valor'] else 0
-        valor_prev = float(row['valor_prev']) if row['valor_prev'] else 0
-        
-        if valor_prev > 0:
-            delta_mom = ((valor - valor_prev) / valor_prev) * 100
-        elif valor > 0:
-            delta_mom = 100.0
-        else:
-            delta_mom = 0.0
-        
-        result.append({
-            "rank": idx + 1,
-            "cliente": row['nome'],
-            "valor": valor,
-            "delta_mom": round(delta_mom, 2),
-            "ultima_compra": row['ultima_compra'].strftime('%d/%m/%Y') if row['ultima_compra'] else None
-        })
-    
-    return result
+    valor = pd.to_numeric(df['valor'], errors='coerce').fillna(0.0).astype(float)
+    valor_prev = pd.to_numeric(df['valor_prev'], errors='coerce').fillna(0.0).astype(float)
+    df['rank'] = range(1, len(df) + 1)
+    df['valor'] = valor
+    df['delta_mom'] = np.where(
+        valor_prev > 0, (valor - valor_prev) / valor_prev.where(valor_prev > 0, 1) * 100,
+        np.where(valor > 0, 100.0, 0.0)
+    ).round(2)
+    
+    return records(df, columns=["rank", "nome", "valor", "delta_mom", "ultima_compra"],
+                   types={"ultima_compra": "date_br"}, rename={"nome": "cliente"})
 
 
 def get_active_vs_inactive(ano: int, industry_id: int = None, uf: str = None):
@@ -288,7 +266,7 @@ def get_active_vs_inactive(ano: int, industry_id: int = None, uf: str = None):
               'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
     
     monthly_data = []
-    data_map = {int(row['mes']): int(row['atendidos']) for _, row in df.iterrows()} if not df.empty else {}
+    data_map = dict(zip(column_values(df['mes'], "int"), column_values(df['atendidos'], "int"))) if not df.empty else {}
     
     for i in range(1, 13):
         atendidos = data_map.get(i, 0)
@@ -322,7 +300,7 @@ def get_active_vs_inactive(ano: int, industry_id: int = None, uf: str = None):
         ORDER BY 1
     """
     df_ufs = execute_query(ufs_query)
-    ufs_disponiveis = [row['uf'] for _, row in df_ufs.iterrows()] if not df_ufs.empty else []
+    ufs_disponiveis = column_values(df_ufs['uf']) if not df_ufs.empty else []
     
     return {
         "ano": ano,
@@ -389,15 +367,9 @@ def get_clients_no_purchase(ano: int, mes: int = None, industry_id: int = None,
     if df.empty:
         return []
     
-    return [
-        {
-            "id": row['id'],
-            "nome": row['nome'],
-            "ultima_compra": row['ult_compra'].strftime('%d/%m/%Y') if row['ult_compra'] else None,
-            "dias_sem_compra": int(row['dias_sem_compra']) if row['dias_sem_compra'] else None
-        }
-        for _, row in df.iterrows()
-    ]
+    return records(df, columns=["id", "nome", "ult_compra", "dias_sem_compra"],
+                   types={"ult_compra": "date_br", "dias_sem_compra": "int"},
+                   rename={"ult_compra": "ultima_compra"})
 
 
 def get_churn_risk_clients(ano: int, mes: int = None, industry_id: int = None):
@@ -454,16 +426,9 @@ def get_churn_risk_clients(ano: int, mes: int = None, industry_id: int = None):
     if df.empty:
         return []
     
-    return [
-        {
-            "cliente": row['cliente'],
-            "dias_sem_compra": int(row['dias_sem_compra']) if row['dias_sem_compra'] else 0,
-            "frequencia": int(row['frequencia']) if row['frequencia'] else 0,
-            "ticket": float(row['ticket']) if row['ticket'] else 0,
-            "score": row['score']
-        }
-        for _, row in df.iterrows()
-    ]
+    return records(df, columns=["cliente", "dias_sem_compra", "frequencia", "ticket", "score"],
+                   types={"dias_sem_compra": "int", "frequencia": "int", "ticket": "float"},
+                   fill={"dias_sem_compra": 0, "frequencia": 0, "ticket": 0})
 
 
 def get_store_industry_matrix(ano: int, mes: int = None, metrica: str = 'valor', startDate: str = None, endDate: str = None):
@@ -493,9 +458,8 @@ def get_store_industry_matrix(ano: int, mes: int = None, metrica: str = 'valor',
     if df_industries.empty:
         return {"industries": [], "rows": [], "totals": {}}
     
-    industries = [{"id": row['id'], "nome": row['nome']} for _, row in df_industries.iterrows()]
-    industry_ids = [ind['id'] for ind in industries]
-    industry_names = [ind['nome'] for ind in industries]
+    industry_ids = column_values(df_industries['id'])
+    industry_names = column_values(df_industries['nome'])
     
     items_join = "JOIN itens_ped i ON i.ite_pedido = p.ped_pedido AND i.ite_industria = p.ped_industria" if needs_items_join else ""
     
@@ -519,43 +483,39 @@ def get_store_industry_matrix(ano: int, mes: int = None, metrica: str = 'valor',
     if df.empty:
         return {"industries": industry_names, "rows": [], "totals": {ind: 0 for ind in industry_names}}
     
-    id_to_name = {ind['id']: ind['nome'] for ind in industries}
-    grupos = df['grupo'].unique()
-    
-    rows = []
+    return _pivot_store_matrix(df, industry_ids, industry_names)
+
+
+def _pivot_store_matrix(df: pd.DataFrame, industry_ids: list, industry_names: list, top: int = 20):
+    """
+    Monta a matriz grupo x indústria a partir de (grupo, ped_industria, valor).
+
+    Pivot vetorizado: os totais por indústria consideram todos os grupos, mas só
+    os `top` grupos de maior total viram dicts no payload. Empates mantêm a
+    ordem de chegada dos grupos (ORDER BY grupo da query).
+    """
+    valores = pd.to_numeric(df['valor'], errors='coerce').fillna(0.0).astype(float)
+    matrix = (
+        valores.groupby([df['grupo'], df['ped_industria']], sort=False).sum()
+        .unstack(fill_value=0.0)
+        .reindex(index=pd.unique(df['grupo']), columns=industry_ids, fill_value=0.0)
+    )
+
+    row_totals = matrix.sum(axis=1)
+    column_sums = matrix.sum(axis=0)
     column_totals = {name: 0.0 for name in industry_names}
-    grand_total = 0.0
-    
-    for grupo in grupos:
-        grupo_data = df[df['grupo'] == grupo]
-        values = {}
-        row_total = 0.0
-        
-        for ind_id in industry_ids:
-            ind_name = id_to_name[ind_id]
-            match = grupo_data[grupo_data['ped_industria'] == ind_id]
-            if not match.empty:
-                val = float(match.iloc[0]['valor'])
-            else:
-                val = 0.0
-            
-            values[ind_name] = val
-            row_total += val
-            column_totals[ind_name] += val
-        
-        grand_total += row_total
-        
+    for ind_id, name in zip(industry_ids, industry_names):
+        column_totals[name] += float(column_sums[ind_id])
+    column_totals['total'] = float(row_totals.sum())
+
+    rows = []
+    for grupo in row_totals.sort_values(ascending=False, kind='stable').index[:top]:
         rows.append({
             "grupo": grupo,
-            "values": values,
-            "total": row_total
+            "values": dict(zip(industry_names, matrix.loc[grupo].tolist())),
+            "total": float(row_totals[grupo])
         })
-    
-    rows.sort(key=lambda x: x['total'], reverse=True)
-    rows = rows[:20]
-    
-    column_totals['total'] = grand_total
-    
+
     return {
         "industries": industry_names,
         "rows": rows,
@@ -563,40 +523,46 @@ def get_store_industry_matrix(ano: int, mes: int = None, metrica: str = 'valor',
     }
 
 
-def get_client_monthly_evolution(ano: int, industry_id: int = None, metrica: str = 'valor', vendedor_id = None):
+def evolution_columns(ano: int):
+    """Rótulos das colunas da evolução mensal (mm/aaaa)"""
+    return [f"{str(m).zfill(2)}/{ano}" for m in range(1, 13)]
+
+
+def _evolution_query(ano: int, industry_id: int = None, metrica: str = 'valor', vendedor_id = None):
     """
-    Retorna matriz de evolução mensal por cliente.
+    SQL da evolução mensal já pivotada no banco: uma linha por cliente
+    (cliente, m01..m12, total), só clientes com total > 0. Sem ORDER BY/LIMIT:
+    quem chama escolhe lista completa, página (keyset) ou streaming.
     """
-    print(f"DEBUG Evolution: ano={ano}, industry_id={industry_id}, metrica={metrica}, vendedor_id={vendedor_id} (type={type(vendedor_id)})", flush=True)
+    industry_filter = _build_industry_filter(industry_id)
     
-    try:
-        industry_filter = _build_industry_filter(industry_id)
-        
-        vendedor_filter = ""
-        if vendedor_id and str(vendedor_id) not in ['Todos', 'None', '']:
-            try:
-                ven_id = int(vendedor_id)
-                vendedor_filter = f"AND p.ped_vendedor = {ven_id}"
-                print(f"DEBUG: Filtering by vendedor = {ven_id}", flush=True)
-            except (ValueError, TypeError):
-                print(f"DEBUG: Could not parse vendedor_id: {vendedor_id}", flush=True)
-            
-        date_filter = _build_date_filter(ano)
+    vendedor_filter = ""
+    if vendedor_id and str(vendedor_id) not in ['Todos', 'None', '']:
+        try:
+            ven_id = int(vendedor_id)
+            vendedor_filter = f"AND p.ped_vendedor = {ven_id}"
+        except (ValueError, TypeError):
+            print(f"DEBUG: Could not parse vendedor_id: {vendedor_id}", flush=True)
         
-        if metrica == 'valor':
-            value_column = "SUM(p.ped_totliq)"
-            join_clause = ""
-        else:
-            value_column = "SUM(i.ite_quant)"
-            join_clause = "JOIN itens_ped i ON i.ite_pedido = p.ped_pedido AND i.ite_industria = p.ped_industria"
-            
-        query = f"""
+    date_filter = _build_date_filter(ano)
+    
+    if metrica == 'valor':
+        value_column = "p.ped_totliq"
+        join_clause = ""
+    else:
+        value_column = "i.ite_quant"
+        join_clause = "JOIN itens_ped i ON i.ite_pedido = p.ped_pedido AND i.ite_industria = p.ped_industria"
+    
+    meses = ",\n".join(
+        f"COALESCE(SUM({value_column}) FILTER (WHERE {filtro_periodo_sql(*periodo_mes(ano, m), coluna='p.ped_data')}), 0) AS m{m:02d}"
+        for m in range(1, 13)
+    )
+    return f"""
+        SELECT * FROM (
             SELECT 
-                c.cli_nomred,
-                c.cli_cnpj,
-                EXTRACT(MONTH FROM p.ped_data) as mes,
-                EXTRACT(YEAR FROM p.ped_data) as ano_ped,
-                {value_column} as valor
+                TRIM(c.cli_nomred) || ' (' || TRIM(c.cli_cnpj) || ')' as cliente,
+                {meses},
+                COALESCE(SUM({value_column}), 0) as total
             FROM pedidos p
             JOIN clientes c ON p.ped_cliente = c.cli_codigo
             {join_clause}
@@ -604,55 +570,83 @@ def get_client_monthly_evolution(ano: int, industry_id: int = None, metrica: str
               AND {date_filter}
               {industry_filter}
               {vendedor_filter}
-            GROUP BY c.cli_nomred, c.cli_cnpj, EXTRACT(YEAR FROM p.ped_data), EXTRACT(MONTH FROM p.ped_data)
-            ORDER BY c.cli_nomred, ano_ped, mes
-        """
-        
-        print(f"DEBUG Query: {query[:200]}...", flush=True)
-        df = execute_query(query)
-        print(f"DEBUG Result: {len(df)} rows", flush=True)
-        
-        columns = [f"{str(m).zfill(2)}/{ano}" for m in range(1, 13)]
-        
-        if df.empty:
-            print("DEBUG: DataFrame empty, returning empty result", flush=True)
-            return {"columns": columns, "rows": [], "year": ano}
-            
-        df['cliente_label'] = df['cli_nomred'].str.strip() + " (" + df['cli_cnpj'].str.strip() + ")"
-        df['col_label'] = df['mes'].apply(lambda x: f"{str(int(x)).zfill(2)}/{ano}")
-        
-        matrix = df.pivot_table(
-            index='cliente_label', 
-            columns='col_label', 
-            values='valor', 
-            aggfunc='sum'
-        ).fillna(0)
-        
-        for col in columns:
-            if col not in matrix.columns:
-                matrix[col] = 0.0
-        
-        matrix = matrix[columns]
-        
-        rows = []
-        for label, row_values in matrix.iterrows():
-            values = row_values.to_dict()
-            total = sum(values.values())
-            
-            if total > 0:
-                rows.append({
-                    "cliente": label,
-                    "values": values,
-                    "total": total
-                })
-        
-        rows.sort(key=lambda x: x['total'], reverse=True)
+            GROUP BY 1
+        ) t
+        WHERE cliente IS NOT NULL AND total > 0
+    """
+
+
+def _evolution_row(row: dict, columns: list, flat: bool = False):
+    """Linha pivotada -> {"cliente", "values": {mm/aaaa: valor}, "total"} (flat: meses no nível do registro)"""
+    values = {col: float(row[f"m{m:02d}"] or 0) for m, col in enumerate(columns, 1)}
+    if flat:
+        return {"cliente": row['cliente'], **values, "total": float(row['total'] or 0)}
+    return {"cliente": row['cliente'], "values": values, "total": float(row['total'] or 0)}
+
+
+# Ordem das tabelas: maior total primeiro, empate pelo nome (chave do keyset)
+_EVOLUTION_ORDER = "ORDER BY total DESC, cliente ASC"
+
+
+def get_client_monthly_evolution(ano: int, industry_id: int = None, metrica: str = 'valor', vendedor_id = None):
+    """
+    Retorna matriz de evolução mensal por cliente.
+    """
+    print(f"DEBUG Evolution: ano={ano}, industry_id={industry_id}, metrica={metrica}, vendedor_id={vendedor_id}", flush=True)
+    
+    try:
+        columns = evolution_columns(ano)
+        rows = execute_rows(f"{_evolution_query(ano, industry_id, metrica, vendedor_id)} {_EVOLUTION_ORDER}")
+        print(f"DEBUG Result: {len(rows)} rows", flush=True)
         
         return {
             "columns": columns,
-            "rows": rows,
+            "rows": [_evolution_row(row, columns) for row in rows],
             "year": ano
         }
     except Exception as e:
         print(f"ERROR: Evolution Matrix failed: {e}", flush=True)
         return {"success": False, "error": str(e)}
+
+
+def get_client_monthly_evolution_page(ano: int, industry_id: int = None, metrica: str = 'valor', vendedor_id = None,
+                                      limit: int = 100, cursor: list = None):
+    """
+    Uma página da evolução mensal (paginação keyset por total/cliente).
+    `cursor` = [total, cliente] da última linha da página anterior (decode_cursor).
+    """
+    columns = evolution_columns(ano)
+    params = {"limit": limit + 1}
+    keyset = ""
+    if cursor:
+        keyset = "AND (total < CAST(:cur_total AS numeric) OR (total = CAST(:cur_total AS numeric) AND cliente > :cur_cliente))"
+        params.update({"cur_total": cursor[0], "cur_cliente": cursor[1]})
+    
+    query = f"""
+        SELECT * FROM ({_evolution_query(ano, industry_id, metrica, vendedor_id)}) e
+        WHERE TRUE {keyset}
+        {_EVOLUTION_ORDER}
+        LIMIT :limit
+    """
+    rows = execute_rows(query, params)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "columns": columns,
+        "rows": [_evolution_row(row, columns) for row in rows],
+        "year": ano,
+        "next_cursor": [str(rows[-1]['total']), rows[-1]['cliente']] if has_more else None
+    }
+
+
+def stream_client_monthly_evolution(ano: int, industry_id: int = None, metrica: str = 'valor', vendedor_id = None,
+                                    flat: bool = False):
+    """Lotes da evolução mensal via cursor no servidor (memória constante)"""
+    columns = evolution_columns(ano)
+    batches = stream_rows(f"{_evolution_query(ano, industry_id, metrica, vendedor_id)} {_EVOLUTION_ORDER}")
+    try:
+        for batch in batches:
+            yield [_evolution_row(row, columns, flat) for row in batch]
+    finally:
+        batches.close()
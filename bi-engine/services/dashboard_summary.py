@@ -3,8 +3,8 @@ Service: Dashboard Summary KPIs
 Retorna métricas agregadas (Faturamento, Qtd Pedidos, Clientes, Ticket Médio)
 com comparativo mês anterior.
 """
-import pandas as pd
-from services.database import execute_query
+from services.periods import periodo_anterior, resolve_periodo
+from services.kpi_engine import compute_kpis, variacao_percentual
 
 
 def fetch_dashboard_summary(ano: int, mes: str = 'Todos', industria: int = None, startDate: str = None, endDate: str = None):
@@ -20,195 +20,35 @@ def fetch_dashboard_summary(ano: int, mes: str = 'Todos', industria: int = None,
     """
     print(f"--- BI: Fetching Dashboard Summary ({ano}/{mes}) range={startDate}:{endDate} industria={industria} ---", flush=True)
     
-    # Build filters
-    industria_filter = ""
-    if industria:
-        industria_filter = f"AND p.ped_industria = {industria}"
-    
-    if startDate and endDate:
-        # Range comparison: Range vs Same range in Previous Year
-        query = f"""
-            WITH metricas_atual AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE p.ped_data BETWEEN :startDate AND :endDate
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            ),
-            metricas_anterior AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE p.ped_data BETWEEN (:startDate::date - INTERVAL '1 year') AND (:endDate::date - INTERVAL '1 year')
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            )
-            SELECT 
-                ma.total_vendido as total_vendido_current,
-                ma.qtd_pedidos as qtd_pedidos_current,
-                ma.clientes as clientes_atendidos_current,
-                ma.quantidade_vendida as quantidade_vendida_current,
-                CASE WHEN ma.qtd_pedidos > 0 
-                     THEN ma.total_vendido / ma.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_current,
-                mp.total_vendido as total_vendido_prev,
-                mp.qtd_pedidos as qtd_pedidos_prev,
-                mp.clientes as clientes_atendidos_prev,
-                mp.quantidade_vendida as quantidade_vendida_prev,
-                CASE WHEN mp.qtd_pedidos > 0 
-                     THEN mp.total_vendido / mp.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_prev
-            FROM metricas_atual ma
-            CROSS JOIN metricas_anterior mp
-        """
-        params = {"startDate": startDate, "endDate": endDate}
-    elif mes and mes != 'Todos':
-        mes_int = int(mes)
-        # Current period = specific month
-        # Previous period = previous month (or December of previous year if January)
-        if mes_int == 1:
-            prev_ano = ano - 1
-            prev_mes = 12
-        else:
-            prev_ano = ano
-            prev_mes = mes_int - 1
-        
-        query = f"""
-            WITH metricas_atual AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE EXTRACT(YEAR FROM p.ped_data) = :ano
-                  AND EXTRACT(MONTH FROM p.ped_data) = :mes
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            ),
-            metricas_anterior AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE EXTRACT(YEAR FROM p.ped_data) = :prev_ano
-                  AND EXTRACT(MONTH FROM p.ped_data) = :prev_mes
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            )
-            SELECT 
-                ma.total_vendido as total_vendido_current,
-                ma.qtd_pedidos as qtd_pedidos_current,
-                ma.clientes as clientes_atendidos_current,
-                ma.quantidade_vendida as quantidade_vendida_current,
-                CASE WHEN ma.qtd_pedidos > 0 
-                     THEN ma.total_vendido / ma.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_current,
-                mp.total_vendido as total_vendido_prev,
-                mp.qtd_pedidos as qtd_pedidos_prev,
-                mp.clientes as clientes_atendidos_prev,
-                mp.quantidade_vendida as quantidade_vendida_prev,
-                CASE WHEN mp.qtd_pedidos > 0 
-                     THEN mp.total_vendido / mp.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_prev
-            FROM metricas_atual ma
-            CROSS JOIN metricas_anterior mp
-        """
-        params = {"ano": ano, "mes": mes_int, "prev_ano": prev_ano, "prev_mes": prev_mes}
-    else:
-        # Todos = Year comparison (current year vs previous year)
-        query = f"""
-            WITH metricas_atual AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE EXTRACT(YEAR FROM p.ped_data) = :ano
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            ),
-            metricas_anterior AS (
-                SELECT 
-                    SUM(i.ite_totliquido) as total_vendido,
-                    COUNT(DISTINCT p.ped_pedido) as qtd_pedidos,
-                    COUNT(DISTINCT p.ped_cliente) as clientes,
-                    SUM(i.ite_quant) as quantidade_vendida
-                FROM pedidos p
-                JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-                WHERE EXTRACT(YEAR FROM p.ped_data) = :ano - 1
-                  AND p.ped_situacao IN ('P', 'F')
-                  {industria_filter}
-            )
-            SELECT 
-                ma.total_vendido as total_vendido_current,
-                ma.qtd_pedidos as qtd_pedidos_current,
-                ma.clientes as clientes_atendidos_current,
-                ma.quantidade_vendida as quantidade_vendida_current,
-                CASE WHEN ma.qtd_pedidos > 0 
-                     THEN ma.total_vendido / ma.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_current,
-                mp.total_vendido as total_vendido_prev,
-                mp.qtd_pedidos as qtd_pedidos_prev,
-                mp.clientes as clientes_atendidos_prev,
-                mp.quantidade_vendida as quantidade_vendida_prev,
-                CASE WHEN mp.qtd_pedidos > 0 
-                     THEN mp.total_vendido / mp.qtd_pedidos 
-                     ELSE 0 
-                END as ticket_medio_prev
-            FROM metricas_atual ma
-            CROSS JOIN metricas_anterior mp
-        """
-        params = {"ano": ano}
+    # Períodos (half-open): range -> mesmo range no ano anterior;
+    # mês -> mês anterior; ano -> ano anterior
+    inicio, fim = resolve_periodo(ano, mes, startDate, endDate)
+    prev_inicio, prev_fim = periodo_anterior(ano, mes, startDate, endDate)
     
     try:
-        df = execute_query(query, params)
+        # Atual e anterior numa única leitura (agregação condicional)
+        kpis = compute_kpis(
+            {"atual": (inicio, fim), "anterior": (prev_inicio, prev_fim)},
+            ["total_vendido", "qtd_pedidos", "clientes", "quantidade", "ticket"],
+            industria=industria
+        )
+        atual, anterior = kpis["atual"], kpis["anterior"]
         
-        if df.empty:
-            # Safe defaults if query fails or returns no rows
-            default_row = {
-                "total_vendido_current": 0.0, "qtd_pedidos_current": 0,
-                "clientes_atendidos_current": 0, "quantidade_vendida_current": 0.0,
-                "ticket_medio_current": 0.0, "total_vendido_prev": 0.0,
-                "qtd_pedidos_prev": 0, "clientes_atendidos_prev": 0,
-                "quantidade_vendida_prev": 0.0, "ticket_medio_prev": 0.0
-            }
-            row = default_row
-        else:
-            row = df.iloc[0]
+        row = {
+            "total_vendido_current": atual['total_vendido'],
+            "qtd_pedidos_current": atual['qtd_pedidos'],
+            "clientes_atendidos_current": atual['clientes'],
+            "quantidade_vendida_current": atual['quantidade'],
+            "ticket_medio_current": atual['ticket'],
+            "total_vendido_prev": anterior['total_vendido'],
+            "qtd_pedidos_prev": anterior['qtd_pedidos'],
+            "clientes_atendidos_prev": anterior['clientes'],
+            "quantidade_vendida_prev": anterior['quantidade'],
+            "ticket_medio_prev": anterior['ticket']
+        }
         
-        # Calculate percent changes safely
         def calc_percent_change(current, prev):
-            try:
-                current = float(current or 0)
-                prev = float(prev or 0)
-                if prev > 0:
-                    return round(((current - prev) / prev) * 100, 1)
-                elif current > 0:
-                    return 100.0
-                return 0.0
-            except:
-                return 0.0
+            return round(variacao_percentual(current, prev), 1)
         
         curr_vendido = float(row.get('total_vendido_current', 0) or 0)
         curr_pedidos = int(row.get('qtd_pedidos_current', 0) or 0)
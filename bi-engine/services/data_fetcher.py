@@ -1,105 +1,76 @@
 """
 Data Fetcher Service - Refatorado
-Cache simples em memória com TTL para evitar problemas de lru_cache com DataFrames.
+Cache em memória (utils.cache) com TTL, por tenant, para evitar problemas de lru_cache com DataFrames.
 """
-import time
 import pandas as pd
-from services.database import execute_query
+from services.database import execute_query, execute_scalar_row
+from services.periods import filtro_periodo, periodo_ano
+from services.vendas_cube import fetch_vendas_agregadas
+from utils.cache import bi_cache
 from utils.tenant_context import get_tenant_cnpj
 
-# Simple in-memory cache with TTL (5 minutes)
-_cache = {}
 _CACHE_TTL = 300  # 5 minutos
+_REGIONS = ("faturamento", "metas", "metas_row", "metas_progresso", "filters")
 
-def _get_cache_key(prefix: str, tenant_id: str, *args) -> str:
-    """Gera chave única para o cache"""
-    return f"{prefix}_{tenant_id}_{'-'.join(str(a) for a in args)}"
-
-def _get_from_cache(key: str):
-    """Retorna dados do cache se não expirado"""
-    if key in _cache:
-        data, timestamp = _cache[key]
-        if time.time() - timestamp < _CACHE_TTL:
-            return data
-        else:
-            del _cache[key]
-    return None
-
-def _set_cache(key: str, data):
-    """Armazena dados no cache com timestamp"""
-    _cache[key] = (data.copy() if isinstance(data, pd.DataFrame) else data, time.time())
+def _has_rows(df) -> bool:
+    """Só cachear se tiver dados"""
+    return df is not None and not df.empty
 
 # --- Fetch Functions ---
 
 def _fetch_faturamento_anual(ano: int, tenant_id: str) -> pd.DataFrame:
     """Busca faturamento anual com cache"""
-    cache_key = _get_cache_key("faturamento", tenant_id, ano)
-    cached = _get_from_cache(cache_key)
-    if cached is not None:
-        return cached.copy()
-    
-    print(f"--- DB HIT: Fetching Faturamento for {ano} [Tenant: {tenant_id}] ---", flush=True)
-    query = """
-        SELECT 
-            EXTRACT(MONTH FROM p.ped_data) as n_mes,
-            SUM(i.ite_totliquido) as v_faturamento,
-            SUM(i.ite_quant) as q_quantidade,
-            COUNT(DISTINCT i.ite_idproduto) as u_unidades
-        FROM pedidos p
-        INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-        WHERE EXTRACT(YEAR FROM p.ped_data) = :ano
-          AND p.ped_situacao IN ('P', 'F')
-        GROUP BY 1
-        ORDER BY 1
-    """
-    df = execute_query(query, {"ano": ano})
-    
-    # Só cachear se tiver dados
-    if not df.empty:
-        _set_cache(cache_key, df)
+    def load():
+        print(f"--- DB HIT: Fetching Faturamento for {ano} [Tenant: {tenant_id}] ---", flush=True)
+        rows = fetch_vendas_agregadas(*periodo_ano(ano), group_by=("mes",))
+        return pd.DataFrame(
+            [(r["mes"].month, r["valor"], r["quantidade"], r["produtos"]) for r in rows],
+            columns=["n_mes", "v_faturamento", "q_quantidade", "u_unidades"]
+        )
     
-    return df
+    df = bi_cache.get_or_compute("faturamento", (ano,), load, ttl=_CACHE_TTL, tenant_id=tenant_id, cache_if=_has_rows)
+    return df.copy()
+
+_METAS_ANUAIS_QUERY = """
+    SELECT 
+        SUM(met_jan) as met_jan, SUM(met_fev) as met_fev, SUM(met_mar) as met_mar,
+        SUM(met_abr) as met_abr, SUM(met_mai) as met_mai, SUM(met_jun) as met_jun,
+        SUM(met_jul) as met_jul, SUM(met_ago) as met_ago, SUM(met_set) as met_set,
+        SUM(met_out) as met_out, SUM(met_nov) as met_nov, SUM(met_dez) as met_dez
+    FROM ind_metas
+    WHERE met_ano = :ano
+"""
 
 def _fetch_metas_anuais(ano: int, tenant_id: str) -> pd.DataFrame:
     """Busca metas anuais com cache"""
-    cache_key = _get_cache_key("metas", tenant_id, ano)
-    cached = _get_from_cache(cache_key)
-    if cached is not None:
-        return cached.copy()
-    
-    print(f"--- DB HIT: Fetching Metas for {ano} [Tenant: {tenant_id}] ---", flush=True)
-    query = """
-        SELECT 
-            SUM(met_jan) as met_jan, SUM(met_fev) as met_fev, SUM(met_mar) as met_mar,
-            SUM(met_abr) as met_abr, SUM(met_mai) as met_mai, SUM(met_jun) as met_jun,
-            SUM(met_jul) as met_jul, SUM(met_ago) as met_ago, SUM(met_set) as met_set,
-            SUM(met_out) as met_out, SUM(met_nov) as met_nov, SUM(met_dez) as met_dez
-        FROM ind_metas
-        WHERE met_ano = :ano
-    """
-    df = execute_query(query, {"ano": ano})
+    def load():
+        print(f"--- DB HIT: Fetching Metas for {ano} [Tenant: {tenant_id}] ---", flush=True)
+        return execute_query(_METAS_ANUAIS_QUERY, {"ano": ano})
     
-    if not df.empty:
-        _set_cache(cache_key, df)
+    df = bi_cache.get_or_compute("metas", (ano,), load, ttl=_CACHE_TTL, tenant_id=tenant_id, cache_if=_has_rows)
+    return df.copy()
+
+def _fetch_metas_anuais_row(ano: int, tenant_id: str):
+    """Metas anuais como dict (1 linha, sem DataFrame) com cache"""
+    def load():
+        print(f"--- DB HIT: Fetching Metas Row for {ano} [Tenant: {tenant_id}] ---", flush=True)
+        return execute_scalar_row(_METAS_ANUAIS_QUERY, {"ano": ano})
     
-    return df
+    row = bi_cache.get_or_compute("metas_row", (ano,), load, ttl=_CACHE_TTL, tenant_id=tenant_id, cache_if=bool)
+    return dict(row) if row else row
 
 def _fetch_metas_progresso(ano: int, tenant_id: str) -> pd.DataFrame:
     """Busca progresso de metas por indústria com cache"""
-    cache_key = _get_cache_key("metas_progresso", tenant_id, ano)
-    cached = _get_from_cache(cache_key)
-    if cached is not None:
-        return cached.copy()
-    
-    print(f"--- DB HIT: Fetching Metas Progress for {ano} [Tenant: {tenant_id}] ---", flush=True)
-    query = """
+    filtro, params = filtro_periodo(*periodo_ano(ano))
+    params["ano"] = ano
+    query = f"""
         WITH vendas_ano AS (
             SELECT 
                 p.ped_industria as industria_id,
                 SUM(i.ite_totliquido) as total_vendido
             FROM pedidos p
             INNER JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-            WHERE EXTRACT(YEAR FROM p.ped_data) = :ano
+            WHERE {filtro}
               AND p.ped_situacao IN ('P', 'F')
             GROUP BY 1
         ),
@@ -123,42 +94,36 @@ def _fetch_metas_progresso(ano: int, tenant_id: str) -> pd.DataFrame:
         WHERE m.total_meta > 0
         ORDER BY f.for_nomered
     """
-    df = execute_query(query, {"ano": ano})
-    
-    if not df.empty:
-        _set_cache(cache_key, df)
+    def load():
+        print(f"--- DB HIT: Fetching Metas Progress for {ano} [Tenant: {tenant_id}] ---", flush=True)
+        return execute_query(query, params)
     
-    return df
+    df = bi_cache.get_or_compute("metas_progresso", (ano,), load, ttl=_CACHE_TTL, tenant_id=tenant_id, cache_if=_has_rows)
+    return df.copy()
 
 def _fetch_available_filters(tenant_id: str) -> dict:
     """Busca filtros disponíveis com cache"""
-    cache_key = _get_cache_key("filters", tenant_id)
-    cached = _get_from_cache(cache_key)
-    if cached is not None:
-        return cached
-    
-    print(f"--- DB HIT: Fetching Filter Options [Tenant: {tenant_id}] ---", flush=True)
-    
-    q_ind = "SELECT for_codigo, for_nomered FROM fornecedores ORDER BY for_nomered"
-    df_ind = execute_query(q_ind)
-    
-    q_cli = "SELECT cli_codigo, cli_nomred FROM clientes ORDER BY cli_nomred"
-    df_cli = execute_query(q_cli)
-    
-    q_vend = "SELECT ven_codigo, ven_nome FROM vendedores WHERE ven_nome IS NOT NULL ORDER BY ven_nome"
-    df_vend = execute_query(q_vend)
-    
-    result = {
-        "industries": df_ind.to_dict('records') if not df_ind.empty else [],
-        "clients": df_cli.to_dict('records') if not df_cli.empty else [],
-        "vendedores": df_vend.to_dict('records') if not df_vend.empty else []
-    }
+    def load():
+        print(f"--- DB HIT: Fetching Filter Options [Tenant: {tenant_id}] ---", flush=True)
+        
+        q_ind = "SELECT for_codigo, for_nomered FROM fornecedores ORDER BY for_nomered"
+        df_ind = execute_query(q_ind)
+        
+        q_cli = "SELECT cli_codigo, cli_nomred FROM clientes ORDER BY cli_nomred"
+        df_cli = execute_query(q_cli)
+        
+        q_vend = "SELECT ven_codigo, ven_nome FROM vendedores WHERE ven_nome IS NOT NULL ORDER BY ven_nome"
+        df_vend = execute_query(q_vend)
+        
+        return {
+            "industries": df_ind.to_dict('records') if not df_ind.empty else [],
+            "clients": df_cli.to_dict('records') if not df_cli.empty else [],
+            "vendedores": df_vend.to_dict('records') if not df_vend.empty else []
+        }
     
     # Só cachear se tiver dados
-    if result["industries"]:
-        _set_cache(cache_key, result)
-    
-    return result
+    return bi_cache.get_or_compute("filters", (), load, ttl=_CACHE_TTL, tenant_id=tenant_id,
+                                   cache_if=lambda result: bool(result["industries"]))
 
 # --- Public Functions ---
 
@@ -170,6 +135,10 @@ def fetch_metas_anuais(ano: int) -> pd.DataFrame:
     tenant_id = get_tenant_cnpj() or "default"
     return _fetch_metas_anuais(ano, tenant_id)
 
+def fetch_metas_anuais_row(ano: int):
+    tenant_id = get_tenant_cnpj() or "default"
+    return _fetch_metas_anuais_row(ano, tenant_id)
+
 def fetch_metas_progresso(ano: int) -> pd.DataFrame:
     tenant_id = get_tenant_cnpj() or "default"
     return _fetch_metas_progresso(ano, tenant_id)
@@ -178,9 +147,8 @@ def fetch_available_filters():
     tenant_id = get_tenant_cnpj() or "default"
     return _fetch_available_filters(tenant_id)
 
-def clear_cache():
-    """Limpa todo o cache em memória"""
-    global _cache
-    print("--- CACHE CLEARED ---", flush=True)
-    _cache = {}
-
+def clear_cache(tenant_id: str = None):
+    """Limpa o cache do data_fetcher (do tenant informado, ou de todos)"""
+    print(f"--- CACHE CLEARED [Tenant: {tenant_id or 'all'}] ---", flush=True)
+    for region in _REGIONS:
+        bi_cache.clear(tenant_id=tenant_id, region=region)
@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine, text, event
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import pandas as pd
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_STREAM_BATCH_SIZE
 from utils.tenant_context import get_tenant_engine
+from utils.blocking import run_blocking
+from utils.db_session import install_session_setup
+from utils.sections import cancellable, section_cancelled
 
 # SQLAlchemy Engine (Fallback para local) - com encoding UTF-8
 engine_local = create_engine(
@@ -12,35 +15,34 @@ engine_local = create_engine(
     max_overflow=5
 )
 
-# Garantir encoding UTF-8 em cada nova conexão
-@event.listens_for(engine_local, "connect")
-def set_client_encoding(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("SET client_encoding TO 'UTF8'")
-    cursor.close()
+# Encoding UTF-8, application_name e statement_timeout uma vez por conexão física
+install_session_setup(engine_local)
 
 def get_current_engine():
     return get_tenant_engine() or engine_local
 
-def execute_query(query: str, params: dict = None):
-    
+def _run_query(query: str, params: dict, consume, empty):
+    """
+    Executa a query com retry (3 tentativas) e entrega o Result para `consume`.
+    Em caso de falha definitiva devolve `empty()`.
+    """
     # Limit to 3 attempts
     for attempt in range(1, 4):
         try:
             engine = get_current_engine()
-            # Explicitly set client_encoding during connection to avoid UnicodeDecodeErrors
-            # with non-UTF8 system error messages from libpq
+            # client_encoding já vem do setup de sessão do pool (utils/db_session.py)
             with engine.connect().execution_options(
                 isolation_level="AUTOCOMMIT"
             ) as conn:
-                conn.execute(text("SET client_encoding TO 'UTF8'"))
-                result = conn.execute(text(query), params or {})
-                if result.returns_rows:
-                    rows = result.fetchall()
-                    cols = list(result.keys())
-                    return pd.DataFrame(rows, columns=cols)
-                return pd.DataFrame()
+                # Dentro de run_sections: a query pode ser cancelada no servidor pelo timeout da seção
+                with cancellable(conn.connection.dbapi_connection):
+                    result = conn.execute(text(query), params or {})
+                    if result.returns_rows:
+                        return consume(result)
+                    return empty()
         except Exception as e:
+            if section_cancelled():
+                return empty()
             if attempt == 1:
                 try:
                     # Defensive against UnicodeDecodeError in the error message itself
@@ -53,5 +55,79 @@ def execute_query(query: str, params: dict = None):
                 import time
                 time.sleep(0.5 * attempt)
             else:
-                return pd.DataFrame()
-    return pd.DataFrame()
+                return empty()
+    return empty()
+
+
+def _to_dataframe(result):
+    rows = result.fetchall()
+    cols = list(result.keys())
+    return pd.DataFrame(rows, columns=cols)
+
+
+def execute_query(query: str, params: dict = None):
+    return _run_query(query, params, _to_dataframe, pd.DataFrame)
+
+
+# --- Fast path sem DataFrame -------------------------------------------------
+# Para queries pequenas (KPIs de 1 linha, listas curtas) montar um DataFrame
+# custa mais que a própria query. Estas variantes devolvem estruturas nativas.
+
+def _to_dicts(result):
+    return [dict(row) for row in result.mappings()]
+
+def _to_tuples(result):
+    return [tuple(row) for row in result]
+
+def _first_dict(result):
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
+def _to_columns(result):
+    cols = list(result.keys())
+    rows = result.fetchall()
+    if not rows:
+        return {col: [] for col in cols}
+    return {col: list(values) for col, values in zip(cols, zip(*rows))}
+
+
+def execute_rows(query: str, params: dict = None, as_dict: bool = True):
+    """Retorna as linhas como lista de dicts (ou de tuplas com as_dict=False)"""
+    return _run_query(query, params, _to_dicts if as_dict else _to_tuples, list)
+
+
+def execute_scalar_row(query: str, params: dict = None):
+    """Retorna a primeira linha como dict, ou None se não houver linhas"""
+    return _run_query(query, params, _first_dict, lambda: None)
+
+
+def execute_columns(query: str, params: dict = None):
+    """Retorna {coluna: [valores]} (formato colunar, sem DataFrame)"""
+    return _run_query(query, params, _to_columns, dict)
+
+
+def stream_rows(query: str, params: dict = None, batch_size: int = DB_STREAM_BATCH_SIZE):
+    """
+    Itera o resultado em lotes (listas de dicts) via cursor nomeado no servidor.
+
+    O psycopg2 abre um cursor server-side (stream_results) e busca `batch_size`
+    linhas por vez com fetchmany, então a memória do worker não cresce com o
+    tamanho do resultado. O engine do tenant é resolvido agora; a conexão fica
+    presa ao iterador até ele terminar ou ser fechado. Sem retry: uma falha
+    no meio do stream propaga para quem consome.
+    """
+    engine = get_current_engine()
+
+    def batches():
+        # Cursor nomeado exige transação: sem AUTOCOMMIT aqui (rollback ao devolver ao pool)
+        with engine.connect().execution_options(stream_results=True, max_row_buffer=batch_size) as conn:
+            result = conn.execute(text(query), params or {})
+            for partition in result.mappings().partitions(batch_size):
+                yield [dict(row) for row in partition]
+
+    return batches()
+
+
+async def execute_query_async(query: str, params: dict = None):
+    """Versão awaitable de execute_query: roda no pool de threads do BI."""
+    return await run_blocking(execute_query, query, params)
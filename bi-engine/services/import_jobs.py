@@ -0,0 +1,453 @@
+"""
+Jobs de importação de tabela de preço em segundo plano.
+
+POST /api/price-table/jobs grava o arquivo em disco e devolve um job_id na
+hora; a importação roda numa fila local (thread-pool do processo), em lotes
+de PRICE_IMPORT_CHUNK_ROWS linhas, cada lote numa transação própria. O estado
+do job (PRICE_JOBS_DIR/<id>/state.json) registra a próxima linha da planilha e
+as contagens. O avanço de cada lote é gravado antes do commit como "pending",
+com o txid da transação; se o processo morrer entre o commit e a gravação do
+estado, a retomada consulta txid_status() e só então decide se o lote entrou
+(avança) ou não (relê o lote), sem aplicar o mesmo lote duas vezes.
+
+- progresso: GET /jobs/{id} -> linhas feitas, taxa (linhas/s) e ETA;
+- cancelamento: arquivo-marca "cancel" na pasta do job, checado entre lotes
+  e apagado quando o job termina ou é retomado;
+- retomada: POST /jobs/{id}/resume continua da última linha commitada.
+  As credenciais do banco não vão para o disco: a retomada usa o tenant da
+  requisição de resume (mesmo CNPJ do job). Job exige CNPJ: sem ele não há
+  como separar os jobs de cada tenant.
+
+Vários workers/containers/hosts podem compartilhar PRICE_JOBS_DIR:
+- toda mudança de status (queued -> running, resume, cancelamento de job
+  parado) acontece com o arquivo state.lock criado com O_EXCL, então dois
+  resumes simultâneos não colocam o job duas vezes na fila;
+- cada execução grava no estado um token "owner"; só a execução dona grava
+  progresso, e uma execução que perdeu a posse para no próximo lote;
+- vida do job = heartbeat: o processo dono toca PRICE_JOBS_DIR/<id>/heartbeat
+  a cada PRICE_JOBS_STALE/6 s enquanto o job está na fila ou rodando. Job
+  "queued"/"running" sem heartbeat há mais de PRICE_JOBS_STALE s aparece como
+  "interrupted" (nada de pid, que não vale entre hosts).
+"""
+import contextvars
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import PRICE_IMPORT_CHUNK_ROWS, PRICE_JOBS_DIR, PRICE_JOBS_STALE, PRICE_JOBS_WORKERS
+from services.database import get_current_engine
+from services.price_import import build_staging_rows, load_code_map, merge_staging_rows
+from services.price_sheet import iter_sheet_chunks, list_sheets
+from utils.tenant_context import get_tenant_cnpj, hold_tenant_engine
+
+_executor = ThreadPoolExecutor(max_workers=PRICE_JOBS_WORKERS, thread_name_prefix="bi-price-job")
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_ACTIVE = ("queued", "running")
+_COUNTS = ("inserted", "updated", "skipped", "prices_inserted", "prices_updated")
+_HEARTBEAT_INTERVAL = max(1.0, PRICE_JOBS_STALE / 6)
+# Lock de transição de status: espera máxima e idade a partir da qual é considerado abandonado
+_LOCK_WAIT = 5.0
+_LOCK_STALE = 30.0
+
+
+class JobBusy(ValueError):
+    """Outro worker está mudando o status do job agora"""
+
+
+# --- estado em disco ---------------------------------------------------------
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(PRICE_JOBS_DIR, job_id)
+
+
+def _upload_path(job_id: str) -> str:
+    return os.path.join(_job_dir(job_id), "upload.xlsx")
+
+
+def _save(state: dict):
+    state["updated_at"] = time.time()
+    path = os.path.join(_job_dir(state["id"]), "state.json")
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _load(job_id: str):
+    if not _JOB_ID.match(job_id or ""):
+        return None
+    try:
+        with open(os.path.join(_job_dir(job_id), "state.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _job_lock(job_id: str):
+    """Exclusão mútua entre processos/hosts para mudar o status (arquivo criado com O_EXCL)"""
+    path = os.path.join(_job_dir(job_id), "state.lock")
+    deadline = time.monotonic() + _LOCK_WAIT
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > _LOCK_STALE:
+                    os.remove(path)  # dono do lock morreu no meio da transição
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise JobBusy("Job ocupado; tente novamente")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _cancel_requested(job_id: str) -> bool:
+    return os.path.exists(os.path.join(_job_dir(job_id), "cancel"))
+
+
+def _clear_cancel(job_id: str):
+    try:
+        os.remove(os.path.join(_job_dir(job_id), "cancel"))
+    except OSError:
+        pass
+
+
+# --- heartbeat -------------------------------------------------------------------
+
+_beating = set()
+_beating_lock = threading.Lock()
+_beat_thread = None
+
+
+def _touch_heartbeat(job_id: str):
+    path = os.path.join(_job_dir(job_id), "heartbeat")
+    try:
+        with open(path, "a"):
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _beat_loop():
+    while True:
+        with _beating_lock:
+            job_ids = list(_beating)
+        for job_id in job_ids:
+            _touch_heartbeat(job_id)
+        time.sleep(_HEARTBEAT_INTERVAL)
+
+
+def _start_heartbeat(job_id: str):
+    global _beat_thread
+    _touch_heartbeat(job_id)
+    with _beating_lock:
+        _beating.add(job_id)
+        if _beat_thread is None:
+            _beat_thread = threading.Thread(target=_beat_loop, name="bi-price-job-heartbeat", daemon=True)
+            _beat_thread.start()
+
+
+def _stop_heartbeat(job_id: str):
+    with _beating_lock:
+        _beating.discard(job_id)
+
+
+def _heartbeat_fresh(job_id: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(os.path.join(_job_dir(job_id), "heartbeat")) <= PRICE_JOBS_STALE
+    except OSError:
+        return False
+
+
+# --- execução ------------------------------------------------------------------
+
+def _owns(job_id: str, token: str) -> bool:
+    state = _load(job_id)
+    return state is not None and state.get("owner") == token
+
+
+def _apply_progress(state: dict, progress: dict):
+    """Soma ao estado o avanço de um lote commitado"""
+    for key in _COUNTS:
+        state["counts"][key] += progress["counts"][key]
+    state["errors"].extend(progress["errors"][:50 - len(state["errors"])])
+    state["next_row"] = progress["next_row"]
+    state["rows_done"] += progress["rows"]
+    state["run_rows"] += progress["rows"]
+
+
+def _save_owned(job_id: str, token: str, state: dict) -> bool:
+    """Grava o estado se esta execução ainda é a dona do job"""
+    with _job_lock(job_id):
+        if not _owns(job_id, token):
+            return False
+        _save(state)
+        return True
+
+
+def _settle_pending(cur, state: dict):
+    """Lote gravado como pending por uma execução que morreu: aplica só se a transação dele foi commitada"""
+    pending = state.pop("pending", None)
+    if not pending:
+        return
+    cur.execute("SELECT txid_status(%s)", (pending["xid"],))
+    status = cur.fetchone()[0]
+    if status == "in progress":
+        # A execução antiga ainda está commitando: retomar agora aplicaria o lote duas vezes
+        state["pending"] = pending
+        raise RuntimeError("Lote anterior ainda em andamento no banco; retome novamente em instantes")
+    committed = status == "committed"
+    if committed:
+        _apply_progress(state, pending)
+    print(f"📦 [PRICE JOB {state['id'][:8]}] lote pendente até a linha {pending['next_row']}: "
+          f"{'commitado' if committed else 'descartado'}", flush=True)
+
+
+def _run(job_id: str, token: str):
+    with _job_lock(job_id):
+        state = _load(job_id)
+        if state is None or state["status"] != "queued" or state.get("owner") != token:
+            return
+        state.update(status="running", started_at=time.time(), run_rows=0, error=None)
+        _save(state)
+
+    conn = None
+    try:
+        conn = get_current_engine().raw_connection()
+        cur = conn.cursor()
+        _settle_pending(cur, state)
+        code_map = load_code_map(cur, state["industria"])
+        cur.close()
+        conn.rollback()
+        if not _save_owned(job_id, token, state):
+            return
+        print(f"📦 [PRICE JOB {job_id[:8]}] início na linha {state['next_row']} ({state['tabela']})", flush=True)
+
+        chunks = iter_sheet_chunks(_upload_path(job_id), state["sheet_name"], start_row=state["next_row"],
+                                   chunk_size=PRICE_IMPORT_CHUNK_ROWS)
+        for chunk in chunks:
+            if _cancel_requested(job_id):
+                state["status"] = "cancelled"
+                break
+            if not _owns(job_id, token):
+                # Outro worker retomou o job (este foi dado como morto): não mescla o lote
+                print(f"⚠️ [PRICE JOB {job_id[:8]}] posse perdida, parando", flush=True)
+                chunks.close()
+                return
+            rows, skipped, errors = build_staging_rows(chunk, state["mapping"])
+            counts = merge_staging_rows(conn, [rows], state["industria"], state["tabela"], commit=False,
+                                        code_map=code_map)
+            counts["skipped"] += skipped
+            cur = conn.cursor()
+            cur.execute("SELECT txid_current()")
+            xid = cur.fetchone()[0]
+            cur.close()
+
+            # Avanço gravado antes do commit (com o txid) e confirmado depois:
+            # queda no meio é resolvida na retomada por _settle_pending
+            progress = {"xid": xid, "next_row": int(chunk.index[-1]) + 1, "rows": len(chunk),
+                        "counts": counts, "errors": errors}
+            state["pending"] = progress
+            if not _save_owned(job_id, token, state):
+                conn.rollback()
+                chunks.close()
+                return
+            conn.commit()
+            del state["pending"]
+            _apply_progress(state, progress)
+            if not _save_owned(job_id, token, state):
+                chunks.close()
+                return
+        else:
+            state["status"] = "done"
+        chunks.close()
+    except Exception as e:
+        state["status"] = "failed"
+        state["error"] = str(e)
+        print(f"❌ [PRICE JOB {job_id[:8]}] {e}", flush=True)
+    finally:
+        if conn is not None:
+            conn.close()
+
+    with _job_lock(job_id):
+        if not _owns(job_id, token):
+            return
+        _clear_cancel(job_id)
+        state["finished_at"] = time.time()
+        _save(state)
+    if state["status"] in ("done", "cancelled"):
+        try:
+            os.remove(_upload_path(job_id))
+        except OSError:
+            pass
+    print(f"📦 [PRICE JOB {job_id[:8]}] {state['status']}: {state['rows_done']} linhas | {state['counts']}",
+          flush=True)
+
+
+def _run_owned(job_id: str, token: str):
+    try:
+        _run(job_id, token)
+    finally:
+        _stop_heartbeat(job_id)
+
+
+def _enqueue(job_id: str, token: str):
+    """Coloca na fila a execução `token` (já gravada como owner no estado, com o lock)"""
+    _start_heartbeat(job_id)
+    ctx = contextvars.copy_context()
+    # O job roda depois da requisição: segura o engine do tenant até terminar
+    release = hold_tenant_engine()
+    _executor.submit(ctx.run, _run_owned, job_id, token).add_done_callback(lambda _: release())
+
+
+# --- API -------------------------------------------------------------------------
+
+def submit_job(file_content: bytes, sheet_name: str, mapping: dict, data_start_row: int,
+               industria: int, tabela: str, import_mode: str = "new") -> dict:
+    """Grava o arquivo e o estado inicial e coloca o job na fila"""
+    tenant = get_tenant_cnpj()
+    if not tenant:
+        raise ValueError("Jobs de importação exigem o CNPJ do tenant (x-tenant-cnpj)")
+    job_id = uuid.uuid4().hex
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    with open(_upload_path(job_id), "wb") as f:
+        f.write(file_content)
+
+    # Total estimado pela dimensão declarada da aba (sem ler as células)
+    dims = next((s for s in list_sheets(_upload_path(job_id)) if s["name"] == sheet_name), None)
+    if dims is None:
+        shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+        raise ValueError(f"Sheet '{sheet_name}' não encontrada")
+    total = max(dims["rows"] - data_start_row, 0) if dims["rows"] else None
+
+    token = uuid.uuid4().hex
+    state = {
+        "id": job_id,
+        "tenant": tenant,
+        "status": "queued",
+        "sheet_name": sheet_name,
+        "mapping": mapping,
+        "industria": industria,
+        "tabela": tabela,
+        "import_mode": import_mode,
+        "next_row": data_start_row,
+        "rows_done": 0,
+        "run_rows": 0,
+        "total_rows": total,
+        "counts": {key: 0 for key in _COUNTS},
+        "errors": [],
+        "error": None,
+        "owner": token,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    _save(state)
+    _enqueue(job_id, token)
+    return job_status(job_id, tenant)
+
+
+def _status_of(job_id: str, state: dict) -> str:
+    status = state["status"]
+    if status in _ACTIVE and not _heartbeat_fresh(job_id):
+        return "interrupted"
+    return status
+
+
+def job_status(job_id: str, tenant: str):
+    """
+    Estado do job com taxa e ETA, ou None se não existir (ou for de outro tenant).
+    """
+    state = _load(job_id)
+    if state is None or not tenant or state.get("tenant") != tenant:
+        return None
+
+    status = _status_of(job_id, state)
+
+    rate = eta = None
+    if state.get("started_at") and state.get("run_rows"):
+        end = state.get("finished_at") if status not in _ACTIVE else state["updated_at"]
+        elapsed = max((end or time.time()) - state["started_at"], 1e-6)
+        rate = round(state["run_rows"] / elapsed, 1)
+        if status == "running" and state.get("total_rows"):
+            eta = round(max(state["total_rows"] - state["rows_done"], 0) / rate, 1) if rate else None
+
+    return {
+        "job_id": state["id"],
+        "status": status,
+        "cancel_requested": _cancel_requested(job_id) and status in _ACTIVE,
+        "rows_done": state["rows_done"],
+        "total_rows": state["total_rows"],
+        "rate_rows_s": rate,
+        "eta_s": eta,
+        "next_row": state["next_row"],
+        "table_name": state["tabela"],
+        "import_mode": state["import_mode"],
+        **state["counts"],
+        "total_imported": state["counts"]["inserted"] + state["counts"]["updated"],
+        "errors": state["errors"][:10],
+        "error": state["error"],
+        "created_at": state["created_at"],
+        "started_at": state["started_at"],
+        "finished_at": state["finished_at"],
+    }
+
+
+def cancel_job(job_id: str, tenant: str):
+    """Pede o cancelamento; o job para antes do próximo lote"""
+    status = job_status(job_id, tenant)
+    if status is None:
+        return None
+    if status["status"] in _ACTIVE:
+        open(os.path.join(_job_dir(job_id), "cancel"), "w").close()
+    elif status["status"] in ("interrupted", "failed"):
+        with _job_lock(job_id):
+            state = _load(job_id)
+            if _status_of(job_id, state) not in ("interrupted", "failed"):
+                return job_status(job_id, tenant)
+            # Sem dono: uma execução antiga que volte à vida perde a posse
+            state.update(status="cancelled", owner=None, finished_at=time.time())
+            _save(state)
+            _clear_cancel(job_id)
+        try:
+            os.remove(_upload_path(job_id))
+        except OSError:
+            pass
+    return job_status(job_id, tenant)
+
+
+def resume_job(job_id: str, tenant: str):
+    """Recoloca na fila um job interrompido/com falha, a partir da última linha commitada"""
+    status = job_status(job_id, tenant)
+    if status is None or status["status"] not in ("interrupted", "failed"):
+        return status
+    with _job_lock(job_id):
+        # Revalida com o lock: outro resume pode ter acabado de recolocar o job na fila
+        state = _load(job_id)
+        if _status_of(job_id, state) not in ("interrupted", "failed"):
+            return job_status(job_id, tenant)
+        if not os.path.exists(_upload_path(job_id)):
+            raise ValueError("Arquivo do job não está mais disponível; envie a planilha novamente")
+        token = uuid.uuid4().hex
+        state.update(status="queued", owner=token, finished_at=None, error=None)
+        _clear_cancel(job_id)  # cancelamento pedido para a execução anterior não vale para esta
+        _save(state)
+        _start_heartbeat(job_id)  # antes de soltar o lock: o próximo resume já vê o job vivo
+    _enqueue(job_id, token)
+    return job_status(job_id, tenant)
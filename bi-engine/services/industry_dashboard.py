@@ -1,6 +1,9 @@
-from services.database import execute_query
+from services.database import execute_query, execute_scalar_row
+from services.kpi_engine import compute_kpis, variacao_percentual
+from services.periods import filtro_periodo, periodo_ano, periodo_anterior, resolve_periodo, shift_years
 import pandas as pd
-from datetime import datetime, timedelta
+from utils.sections import run_sections
+from utils.serialization import column_values, records
 
 def get_industry_details(ano: int, mes: str, industry_id: int, metrica: str = 'valor', startDate: str = None, endDate: str = None):
     """
@@ -18,38 +21,24 @@ def get_industry_details(ano: int, mes: str, industry_id: int, metrica: str = 'v
             except:
                 pass
 
-        # 2. Funnel KPIs (Sales, Qty, Units, Orders, Portfolio)
-        funnel = get_funnel_kpi(ano, month_int, industry_id, startDate, endDate)
-        
-        # 3. Funnel Sparkline (Daily Sales for selected period)
-        sparkline = get_funnel_sparkline(ano, month_int, industry_id, startDate, endDate)
-        
-        # 4. Client Analysis (Lollipop & Churn)
-        # Churn analysis usually needs a full reference year, but we can make it more flexible later.
-        # For now, we'll keep it by year but can pass start/end for filtering current active clients.
-        client_metrics = get_client_analysis(ano, industry_id, startDate, endDate)
-        
-        # 5. Main Chart (Monthly Sales with YoY Flag) - NOW WITH METRIC SUPPORT
-        monthly_sales = get_monthly_sales_chart(ano, industry_id, metrica, startDate, endDate)
-        
-        # 6. Recent Orders Table
-        orders_table = get_recent_orders(ano, month_int, industry_id, startDate, endDate)
-
-        # 7. Metadata (Name, Share, etc.)
-        metadata = get_industry_metadata(ano, month_int, industry_id, startDate, endDate)
-
-        # 8. Narrative / Performance Insights
-        narrative = get_industry_narrative(ano, industry_id, startDate, endDate)
+        # 2. Seções independentes em paralelo (funil, sparkline, clientes, gráfico
+        #    mensal, pedidos, metadados, narrativa); falha/timeout vira valor vazio
+        data, timings = run_sections({
+            "funnel": (lambda: get_funnel_kpi(ano, month_int, industry_id, startDate, endDate), {}),
+            "sparkline": (lambda: get_funnel_sparkline(ano, month_int, industry_id, startDate, endDate), []),
+            "clients": (lambda: get_client_analysis(ano, industry_id, startDate, endDate), {"lollipop": [], "matrix": []}),
+            "monthly_sales": (lambda: get_monthly_sales_chart(ano, industry_id, metrica, startDate, endDate), []),
+            "orders": (lambda: get_recent_orders(ano, month_int, industry_id, startDate, endDate), []),
+            "metadata": (lambda: get_industry_metadata(ano, month_int, industry_id, startDate, endDate),
+                         {"nome": "Indústria", "percentual": 0.0, "imagem_url": None}),
+            "narrative": (lambda: get_industry_narrative(ano, industry_id, startDate, endDate), None),
+        }, label="industry_details")
 
         return {
             "success": True,
-            "funnel": funnel,
-            "sparkline": sparkline,
-            "clients": client_metrics,
-            "monthly_sales": monthly_sales,
-            "orders": orders_table,
-            "metadata": metadata,
-            "narrative": narrative
+            **data,
+            "partial": any(t["status"] != "ok" for t in timings.values()),
+            "sections": timings
         }
 
     except Exception as e:
@@ -60,12 +49,7 @@ def get_industry_details(ano: int, mes: str, industry_id: int, metrica: str = 'v
 def get_industry_metadata(ano: int, mes: int, ind_id: int, startDate: str = None, endDate: str = None):
     """Fetch Industry Name, Logo and Calculate Market Share"""
     
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-    else:
-        date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
-        if mes:
-            date_filter += f" AND EXTRACT(MONTH FROM p.ped_data) = {mes}"
+    date_filter, params = filtro_periodo(*resolve_periodo(ano, mes, startDate, endDate))
         
     # 1. Get Industry Info + Sales
     query_ind = f"""
@@ -80,7 +64,7 @@ def get_industry_metadata(ano: int, mes: int, ind_id: int, startDate: str = None
         WHERE f.for_codigo = :ind
         GROUP BY f.for_nomered, f.for_homepage
     """
-    df_ind = execute_query(query_ind, {"ind": ind_id})
+    df_ind = execute_query(query_ind, {"ind": ind_id, **params})
     
     if df_ind.empty:
         return {"nome": "Indústria", "percentual": 0.0, "imagem_url": None}
@@ -95,7 +79,7 @@ def get_industry_metadata(ano: int, mes: int, ind_id: int, startDate: str = None
         WHERE p.ped_situacao IN ('P', 'F')
           AND {date_filter}
     """
-    df_total = execute_query(query_total)
+    df_total = execute_query(query_total, params)
     grand_total = float(df_total.iloc[0]['grand_total']) if not df_total.empty and df_total.iloc[0]['grand_total'] else 0.0
     
     percentual = (ind_sales / grand_total * 100.0) if grand_total > 0 else 0.0
@@ -189,130 +173,44 @@ def get_industry_narrative(ano, ind_id, startDate=None, endDate=None):
 def get_funnel_kpi(ano: int, mes: int, ind_id: int, startDate: str = None, endDate: str = None):
     """Calculate 5 Cards: Sales, Qty, Units (Distinct SKUs), Orders, Portfolio (% mix)"""
     
-    # Base Filter
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-        # YoY logic for range
-        prev_date_filter = f"p.ped_data BETWEEN ('{startDate}'::date - INTERVAL '1 year') AND ('{endDate}'::date - INTERVAL '1 year')"
-    else:
-        date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
-        if mes:
-            date_filter += f" AND EXTRACT(MONTH FROM p.ped_data) = {mes}"
-        
-        # Previous Period Filter (MoM or YoY)
-        if mes:
-            # MoM logic
-            curr_date = datetime(ano, mes, 1)
-            prev_date = curr_date - timedelta(days=1)
-            prev_mes = prev_date.month
-            prev_ano = prev_date.year
-            prev_date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {prev_ano} AND EXTRACT(MONTH FROM p.ped_data) = {prev_mes}"
-        else:
-            # YoY logic
-            prev_date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano - 1}"
-
-    # Combined KPI Query (Optimized to reduce scans)
-    query = f"""
-        WITH period_data AS (
-            SELECT 
-                SUM(CASE WHEN {date_filter} THEN p.ped_totliq ELSE 0 END) as total_vendas,
-                COUNT(DISTINCT CASE WHEN {date_filter} THEN p.ped_pedido ELSE NULL END) as total_pedidos,
-                SUM(CASE WHEN {prev_date_filter} THEN p.ped_totliq ELSE 0 END) as prev_vendas,
-                COUNT(DISTINCT CASE WHEN {prev_date_filter} THEN p.ped_pedido ELSE NULL END) as prev_pedidos
-            FROM pedidos p
-            WHERE p.ped_industria = :ind_id 
-              AND p.ped_situacao IN ('P', 'F')
-              AND ({date_filter} OR {prev_date_filter})
-        ),
-        item_data AS (
-            SELECT 
-                SUM(CASE WHEN {date_filter} THEN i.ite_quant ELSE 0 END) as total_qtd,
-                COUNT(DISTINCT CASE WHEN {date_filter} THEN i.ite_idproduto ELSE NULL END) as total_skus_vendidos,
-                SUM(CASE WHEN {prev_date_filter} THEN i.ite_quant ELSE 0 END) as prev_qtd,
-                COUNT(DISTINCT CASE WHEN {prev_date_filter} THEN i.ite_idproduto ELSE NULL END) as prev_skus_vendidos
-            FROM pedidos p
-            JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-            WHERE p.ped_industria = :ind_id 
-              AND p.ped_situacao IN ('P', 'F')
-              AND ({date_filter} OR {prev_date_filter})
-        ),
-        portfolio_total AS (
-            SELECT COUNT(*) as total_portfolio
-            FROM cad_prod
-            WHERE pro_industria = :ind_id
-        )
-        SELECT 
-            pd.total_vendas, pd.total_pedidos, pd.prev_vendas, pd.prev_pedidos,
-            it.total_qtd, it.total_skus_vendidos, it.prev_qtd, it.prev_skus_vendidos,
-            port.total_portfolio
-        FROM period_data pd, item_data it, portfolio_total port
-    """
+    # Atual + anterior (range: YoY, mês: MoM, ano: YoY) numa única leitura
+    kpis = compute_kpis(
+        {
+            "atual": resolve_periodo(ano, mes, startDate, endDate),
+            "anterior": periodo_anterior(ano, mes, startDate, endDate),
+        },
+        ["valor_pedidos", "quantidade", "skus", "qtd_pedidos"],
+        industria=ind_id
+    )
+    atual, anterior = kpis["atual"], kpis["anterior"]
     
-    df = execute_query(query, {"ind_id": ind_id})
-    res = {}
+    port = execute_scalar_row("SELECT COUNT(*) as total_portfolio FROM cad_prod WHERE pro_industria = :ind_id", {"ind_id": ind_id})
+    total_port = float((port or {}).get('total_portfolio') or 0)
     
-    if not df.empty:
-        row = df.iloc[0]
-        
-        # Helper for % growth
-        def calc_growth(curr, prev):
-            if prev == 0: return 100.0 if curr > 0 else 0.0
-            return ((curr - prev) / prev) * 100.0
-
-        vendas = float(row['total_vendas'] or 0)
-        vendas_prev = float(row['prev_vendas'] or 0)
-        
-        res['vendas'] = {
-            "value": vendas,
-            "prev": vendas_prev,
-            "delta": calc_growth(vendas, vendas_prev)
-        }
-        
-        qtd = float(row['total_qtd'] or 0)
-        qtd_prev = float(row['prev_qtd'] or 0)
-        res['quantidades'] = {
-            "value": qtd,
-            "prev": qtd_prev,
-            "delta": calc_growth(qtd, qtd_prev)
-        }
-        
-        itens = float(row['total_skus_vendidos'] or 0)
-        itens_prev = float(row['prev_skus_vendidos'] or 0)
-        res['unidades'] = {
-            "value": itens,
-            "prev": itens_prev,
-            "delta": calc_growth(itens, itens_prev)
-        }
-        
-        pedidos = float(row['total_pedidos'] or 0)
-        pedidos_prev = float(row['prev_pedidos'] or 0)
-        res['pedidos'] = {
-            "value": pedidos,
-            "prev": pedidos_prev,
-            "delta": calc_growth(pedidos, pedidos_prev)
-        }
-        
-        # Portfolio
-        total_port = float(row['total_portfolio'] or 0)
-        sold_port = float(row['total_skus_vendidos'] or 0)
-        coverage = (sold_port / total_port * 100.0) if total_port > 0 else 0.0
-        
-        res['portfolio'] = {
-            "sold": sold_port,
-            "total": total_port,
-            "coverage_pct": coverage
+    res = {}
+    for chave, medida in (("vendas", "valor_pedidos"), ("quantidades", "quantidade"),
+                          ("unidades", "skus"), ("pedidos", "qtd_pedidos")):
+        res[chave] = {
+            "value": atual[medida],
+            "prev": anterior[medida],
+            "delta": variacao_percentual(atual[medida], anterior[medida])
         }
+    
+    # Portfolio
+    sold_port = atual['skus']
+    coverage = (sold_port / total_port * 100.0) if total_port > 0 else 0.0
+    
+    res['portfolio'] = {
+        "sold": sold_port,
+        "total": total_port,
+        "coverage_pct": coverage
+    }
         
     return res
 
 def get_funnel_sparkline(ano, mes, ind_id, startDate=None, endDate=None):
     """Daily sales for sparkline chart"""
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-    else:
-        date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
-        if mes:
-            date_filter += f" AND EXTRACT(MONTH FROM p.ped_data) = {mes}"
+    date_filter, params = filtro_periodo(*resolve_periodo(ano, mes, startDate, endDate))
         
     query = f"""
         SELECT 
@@ -325,18 +223,14 @@ def get_funnel_sparkline(ano, mes, ind_id, startDate=None, endDate=None):
         GROUP BY 1
         ORDER BY 1
     """
-    df = execute_query(query, {"ind_id": ind_id})
-    if df.empty: return []
-    return df.to_dict('records')
+    df = execute_query(query, {"ind_id": ind_id, **params})
+    return records(df)
 
 def get_client_analysis(ano, ind_id, startDate=None, endDate=None):
     """Lollipop Chart Data (Clients per Month) + Churn Matrix Table"""
     
     # Base Filter
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-    else:
-        date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
+    date_filter, params = filtro_periodo(*resolve_periodo(ano, None, startDate, endDate))
 
     # 1. Lollipop Data (Active Clients by Month)
     query_monthly = f"""
@@ -350,12 +244,12 @@ def get_client_analysis(ano, ind_id, startDate=None, endDate=None):
         GROUP BY 1
         ORDER BY 1
     """
-    df_lol = execute_query(query_monthly, {"ind_id": ind_id, "ano": ano})
+    df_lol = execute_query(query_monthly, {"ind_id": ind_id, **params})
     lollipop = []
     total_distinct_clients_year = 0
     if not df_lol.empty:
         # Fill missing months with 0
-        data_map = {int(r['mes']): int(r['qtd_clientes']) for _, r in df_lol.iterrows()}
+        data_map = dict(zip(column_values(df_lol['mes'], "int"), column_values(df_lol['qtd_clientes'], "int")))
         for m in range(1, 13):
             lollipop.append({"mes": m, "clientes": data_map.get(m, 0)})
             
@@ -366,25 +260,15 @@ def get_client_analysis(ano, ind_id, startDate=None, endDate=None):
     # Lost: Bought Last Year, NOT This Year
     
     # For speed, let's do annual churn logic
-    query_churn = """
-        WITH buyers_2023 AS (select distinct ped_cliente from pedidos where ped_industria=:ind and EXTRACT(YEAR from ped_data) = :ano-2),
-             buyers_2024 AS (select distinct ped_cliente from pedidos where ped_industria=:ind and EXTRACT(YEAR from ped_data) = :ano-1),
-             buyers_2025 AS (select distinct ped_cliente from pedidos where ped_industria=:ind and EXTRACT(YEAR from ped_data) = :ano)
-        SELECT
-            (SELECT COUNT(*) FROM buyers_2025 WHERE ped_cliente NOT IN (SELECT ped_cliente FROM buyers_2024)) as novos_ou_reativados, -- Simplification
-            (SELECT COUNT(*) FROM buyers_2025 WHERE ped_cliente IN (SELECT ped_cliente FROM buyers_2024)) as mantidos,
-            (SELECT COUNT(*) FROM buyers_2024 WHERE ped_cliente NOT IN (SELECT ped_cliente FROM buyers_2025)) as perdidos
-    """
-    # Note: "Reativados" is harder in single query without full history.
-    # Let's split "novos_ou_reativados":
-    # Novos: Not in 2024 AND Not in 2023.
-    # Reactivated: Not in 2024 BUT IN 2023.
+    # Novos: Not in ano-1 AND Not in ano-2.
+    # Reactivated: Not in ano-1 BUT IN ano-2.
+    hist_filter, hist_params = filtro_periodo(periodo_ano(ano - 2)[0], periodo_ano(ano)[1], coluna="ped_data", nome="hist")
     
-    query_churn_refined = """
+    query_churn_refined = f"""
         WITH history AS (
              SELECT ped_cliente, EXTRACT(YEAR FROM ped_data) as ano
              FROM pedidos 
-             WHERE ped_industria = :ind AND EXTRACT(YEAR FROM ped_data) >= :ano-2
+             WHERE ped_industria = :ind AND {hist_filter}
              GROUP BY 1, 2
         ),
         client_presence AS (
@@ -404,7 +288,7 @@ def get_client_analysis(ano, ind_id, startDate=None, endDate=None):
         FROM client_presence
     """
     
-    df_churn = execute_query(query_churn_refined, {"ind": ind_id, "ano": ano})
+    df_churn = execute_query(query_churn_refined, {"ind": ind_id, "ano": ano, **hist_params})
     matrix = {"novos": 0, "mantidos": 0, "reativados": 0, "perdidos": 0}
     
     if not df_churn.empty:
@@ -438,9 +322,13 @@ def get_monthly_sales_chart(ano, ind_id, metrica='valor', startDate=None, endDat
     # Date Filtering Logic
     if startDate and endDate:
         # Current range and Previous Year range
-        date_cond = f"(p.ped_data BETWEEN '{startDate}' AND '{endDate}' OR p.ped_data BETWEEN ('{startDate}'::date - INTERVAL '1 year') AND ('{endDate}'::date - INTERVAL '1 year'))"
+        inicio, fim = resolve_periodo(ano, None, startDate, endDate)
+        curr_cond, params = filtro_periodo(inicio, fim, nome="atual")
+        prev_cond, prev_params = filtro_periodo(shift_years(inicio, -1), shift_years(fim, -1), nome="anterior")
+        params.update(prev_params)
+        date_cond = f"(({curr_cond}) OR ({prev_cond}))"
     else:
-        date_cond = f"EXTRACT(YEAR FROM p.ped_data) IN ({ano}, {ano}-1)"
+        date_cond, params = filtro_periodo(periodo_ano(ano - 1)[0], periodo_ano(ano)[1])
 
     # Select the appropriate aggregation based on metric
     if metrica == 'quantidade':
@@ -488,16 +376,13 @@ def get_monthly_sales_chart(ano, ind_id, metrica='valor', startDate=None, endDat
             ORDER BY 1, 2
         """
     
-    df = execute_query(query, {"ind": ind_id, "ano": ano})
+    df = execute_query(query, {"ind": ind_id, "ano": ano, **params})
     
     # Organize by Month
     sales_map = {} # {1: {curr: 100, prev: 90}, ...}
     
-    for _, row in df.iterrows():
-        m = int(row['mes'])
-        y = int(row['ano'])
-        val = float(row['total'])
-        
+    for m, y, val in zip(column_values(df['mes'], "int"), column_values(df['ano'], "int"),
+                         column_values(df['total'], "float", 0.0)):
         if m not in sales_map: sales_map[m] = {"curr": 0.0, "prev": 0.0}
         
         if y == ano:
@@ -532,12 +417,7 @@ def get_monthly_sales_chart(ano, ind_id, metrica='valor', startDate=None, endDat
 
 def get_recent_orders(ano, mes, ind_id, startDate=None, endDate=None):
     """List last 20 orders"""
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN '{startDate}' AND '{endDate}'"
-    else:
-        date_filter = f"EXTRACT(YEAR FROM p.ped_data) = {ano}"
-        if mes:
-            date_filter += f" AND EXTRACT(MONTH FROM p.ped_data) = {mes}"
+    date_filter, params = filtro_periodo(*resolve_periodo(ano, mes, startDate, endDate))
         
     query = f"""
         SELECT 
@@ -554,16 +434,13 @@ def get_recent_orders(ano, mes, ind_id, startDate=None, endDate=None):
         ORDER BY p.ped_data DESC
         LIMIT 20
     """
-    df = execute_query(query, {"ind": ind_id})
+    df = execute_query(query, {"ind": ind_id, **params})
     if df.empty: return []
     
-    res = []
-    for _, row in df.iterrows():
-        res.append({
-            "pedido": row['ped_pedido'],
-            "data": row['ped_data'].strftime('%d/%m/%Y'),
-            "cliente": row['cli_nomred'],
-            "valor": float(row['ped_totliq']),
-            "quantidade": int(row['qtd_itens']) # Using item count as Qtd proxy for table
-        })
-    return res
+    # qtd_itens: contagem de itens como proxy de quantidade na tabela
+    return records(
+        df, columns=["ped_pedido", "ped_data", "cli_nomred", "ped_totliq", "qtd_itens"],
+        types={"ped_data": "date_br", "ped_totliq": "float", "qtd_itens": "int"},
+        rename={"ped_pedido": "pedido", "ped_data": "data", "cli_nomred": "cliente",
+                "ped_totliq": "valor", "qtd_itens": "quantidade"}
+    )
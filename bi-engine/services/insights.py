@@ -11,32 +11,18 @@ from openai import OpenAI
 import os
 import httpx
 from collections import defaultdict
+from utils.cache import bi_cache
+from utils.sections import run_sections
 
 
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=httpx.Client(timeout=8.0))
 
 
 # ==========================================
-# CACHE SIMPLES COM TTL (5 minutos)
+# CACHE COM TTL (5 minutos) - utils.cache, isolado por tenant
 # ==========================================
-_insights_cache = {}
 _cache_ttl = 300  # 5 minutos
 
-def get_cached_insights(cache_key):
-    """Retorna insights do cache se ainda válidos"""
-    import time
-    if cache_key in _insights_cache:
-        data, timestamp = _insights_cache[cache_key]
-        if time.time() - timestamp < _cache_ttl:
-            print(f"[INSIGHTS] Cache HIT para {cache_key}", flush=True)
-            return data
-    return None
-
-def set_cached_insights(cache_key, data):
-    """Salva insights no cache"""
-    import time
-    _insights_cache[cache_key] = (data, time.time())
-
 
 class AdvancedAnalyzer:
     """Análises avançadas - padrões ocultos"""
@@ -506,17 +492,25 @@ class SmartInsightGenerator:
 
 
 def get_advanced_insights(ano: int = None, industry_id: int = None, startDate: str = None, endDate: str = None):
-    """Função principal para obter insights avançados - OTIMIZADA com cache e paralelo"""
-    import time
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    # ==========================================
-    # OTIMIZAÇÃO 0: Verifica CACHE primeiro
-    # ==========================================
+    """
+    Função principal para obter insights avançados - OTIMIZADA com cache e paralelo.
+
+    Cache de 5 min por tenant; chamadas simultâneas com os mesmos parâmetros
+    (vários widgets/usuários abrindo o dashboard) aguardam um único cálculo
+    (single-flight do bi_cache): uma rodada de queries e uma chamada à OpenAI.
+    Só vai para o cache se todas as seções responderam ("ok"), como no
+    full_tab: um payload com seções em timeout/erro não fica 5 min servido.
+    """
     cache_key = f"insights_{ano}_{industry_id}_{startDate}_{endDate}"
-    cached = get_cached_insights(cache_key)
-    if cached:
-        return cached
+    return bi_cache.get_or_compute(
+        "insights", cache_key, lambda: _compute_advanced_insights(ano, industry_id, startDate, endDate),
+        ttl=_cache_ttl,
+        cache_if=lambda r: r.get('success') and all(t["status"] == "ok" for t in r['data']['sections'].values())
+    )
+
+
+def _compute_advanced_insights(ano: int = None, industry_id: int = None, startDate: str = None, endDate: str = None):
+    import time
     
     start_time = time.time()
     print(f"[INSIGHTS] Iniciando get_advanced_insights (ano={ano}, ind={industry_id}, range={startDate}:{endDate})", flush=True)
@@ -529,31 +523,16 @@ def get_advanced_insights(ano: int = None, industry_id: int = None, startDate: s
         # ==========================================
         data_context = {}
         
-        def run_query(name, func):
-            try:
-                query_start = time.time()
-                result = func()
-                print(f"[INSIGHTS] {name}: {time.time() - query_start:.2f}s", flush=True)
-                return name, result
-            except Exception as e:
-                print(f"[INSIGHTS] Error {name}: {e}", flush=True)
-                return name, []
-        
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {
-                executor.submit(run_query, 'anomalies', lambda: analyzer.detect_anomalies(startDate, endDate)): 'anomalies',
-                executor.submit(run_query, 'correlations', lambda: analyzer.find_product_correlations(startDate, endDate)): 'correlations',
-                executor.submit(run_query, 'opportunities', lambda: analyzer.detect_lost_opportunities(startDate, endDate)): 'opportunities',
-                executor.submit(run_query, 'churn', lambda: analyzer.predict_churn_with_context(startDate, endDate)): 'churn',
-                executor.submit(run_query, 'seasonality', analyzer.detect_seasonal_patterns): 'seasonality',
-            }
-            
-            for future in as_completed(futures, timeout=10):  # Timeout de 10s para todas as queries
-                try:
-                    name, result = future.result()
-                    data_context[name] = result
-                except Exception as e:
-                    print(f"[INSIGHTS] Future error: {e}", flush=True)
+        # Contexto do tenant copiado para cada thread; timeout de 10s por query
+        data_context, timings = run_sections({
+            'anomalies': (lambda: analyzer.detect_anomalies(startDate, endDate), []),
+            'correlations': (lambda: analyzer.find_product_correlations(startDate, endDate), []),
+            'opportunities': (lambda: analyzer.detect_lost_opportunities(startDate, endDate), []),
+            'churn': (lambda: analyzer.predict_churn_with_context(startDate, endDate), []),
+            'seasonality': (analyzer.detect_seasonal_patterns, []),
+        }, max_concurrency=5, timeout=10, label="INSIGHTS")
+        for name, timing in timings.items():
+            print(f"[INSIGHTS] {name}: {timing['ms'] / 1000:.2f}s ({timing['status']})", flush=True)
         
         # Garante que todos os campos existam
         for key in ['anomalies', 'correlations', 'opportunities', 'churn', 'seasonality']:
@@ -583,6 +562,7 @@ def get_advanced_insights(ano: int = None, industry_id: int = None, startDate: s
             'data': {
                 'insights': insights_result.get('insights', []),
                 'raw_data': data_context,
+                'sections': timings,
                 'generated_at': datetime.now().isoformat(),
                 'performance': {
                     'query_time_s': round(query_time, 2),
@@ -592,11 +572,6 @@ def get_advanced_insights(ano: int = None, industry_id: int = None, startDate: s
             }
         }
         
-        # ==========================================
-        # SALVA NO CACHE para próximas chamadas
-        # ==========================================
-        set_cached_insights(cache_key, result)
-        
         return result
         
     except Exception as e:
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any
 from datetime import datetime
 from services.database_native import db
+from services.periods import filtro_periodo_sql, periodo_ano
 
 class InsightsAnalyzer:
     """
@@ -124,7 +125,7 @@ class InsightsAnalyzer:
                 SELECT DISTINCT i.ite_produto
                 FROM itens_ped i
                 JOIN pedidos p ON (i.ite_pedido ~ '^[0-9]+$' AND CAST(i.ite_pedido AS INTEGER) = p.ped_numero)
-                WHERE EXTRACT(YEAR FROM p.ped_data) = {ano}
+                WHERE {filtro_periodo_sql(*periodo_ano(ano))}
             ),
             EstoqueParado AS (
                 SELECT COUNT(*) as qtd_off
@@ -185,13 +186,13 @@ class InsightsAnalyzer:
             WITH AnoAtual AS (
                 SELECT ped_cliente, SUM(ped_totliq) as total_atual
                 FROM pedidos 
-                WHERE EXTRACT(YEAR FROM ped_data) = {ano}
+                WHERE {filtro_periodo_sql(*periodo_ano(ano), coluna='ped_data')}
                 GROUP BY ped_cliente
             ),
             AnoAnterior AS (
                 SELECT ped_cliente, SUM(ped_totliq) as total_anterior
                 FROM pedidos 
-                WHERE EXTRACT(YEAR FROM ped_data) = {ano - 1}
+                WHERE {filtro_periodo_sql(*periodo_ano(ano - 1), coluna='ped_data')}
                 GROUP BY ped_cliente
             )
             SELECT 
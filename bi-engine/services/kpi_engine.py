@@ -0,0 +1,113 @@
+"""
+Service: KPI Engine
+KPIs de vários períodos (atual, anterior, ...) numa única leitura das fontes
+de vendas (services/vendas_cube), com agregação condicional
+`AGG(...) FILTER (WHERE dia no período)`.
+
+As medidas são declarativas: cada uma diz de qual fonte vem (grão de item ou
+de pedido) e qual agregação usa; razões (ticket) são calculadas no Python a
+partir das medidas base. Uma chamada = uma query = um round trip.
+"""
+
+from services.database import execute_scalar_row
+from services.vendas_cube import SITUACOES_VENDA, fontes_vendas
+
+# Medidas base: fonte ("itens" | "pedidos") + agregação sobre as colunas da fonte
+MEDIDAS = {
+    "total_vendido": {"fonte": "itens", "sql": "SUM(valor)"},
+    "quantidade": {"fonte": "itens", "sql": "SUM(quantidade)"},
+    "itens": {"fonte": "itens", "sql": "SUM(itens)"},
+    "clientes": {"fonte": "itens", "sql": "COUNT(DISTINCT cliente)"},
+    "skus": {"fonte": "itens", "sql": "COUNT(DISTINCT produto)"},
+    "qtd_pedidos": {"fonte": "pedidos", "sql": "SUM(pedidos)"},
+    "valor_pedidos": {"fonte": "pedidos", "sql": "SUM(valor_pedidos)"},
+    "clientes_pedidos": {"fonte": "pedidos", "sql": "COUNT(DISTINCT cliente)"},
+}
+
+# Medidas derivadas: numerador / denominador (0 quando o denominador é 0)
+DERIVADAS = {
+    "ticket": ("total_vendido", "qtd_pedidos"),
+    "ticket_pedidos": ("valor_pedidos", "qtd_pedidos"),
+}
+
+
+def _dependencias(medidas):
+    """Medidas base necessárias (derivadas expandem para numerador/denominador)"""
+    base = []
+    for nome in medidas:
+        if nome in DERIVADAS:
+            candidatas = DERIVADAS[nome]
+        elif nome in MEDIDAS:
+            candidatas = (nome,)
+        else:
+            raise ValueError(f"Medida inválida: {nome}")
+        base.extend(m for m in candidatas if m not in base)
+    return base
+
+
+def _select_fonte(fonte_sql: str, medidas, periodos: dict, where: str) -> str:
+    colunas = []
+    for periodo in periodos:
+        filtro = f"dia >= :{periodo}_inicio AND dia < :{periodo}_fim"
+        for nome in medidas:
+            colunas.append(f"COALESCE({MEDIDAS[nome]['sql']} FILTER (WHERE {filtro}), 0) AS {nome}__{periodo}")
+    periodos_or = " OR ".join(f"(dia >= :{p}_inicio AND dia < :{p}_fim)" for p in periodos)
+    return f"""
+        SELECT {', '.join(colunas)}
+        FROM ({fonte_sql}) f
+        WHERE {where} AND ({periodos_or})
+    """
+
+
+def compute_kpis(periodos: dict, medidas, industria: int = None, cliente: int = None,
+                 vendedor: int = None, situacoes=SITUACOES_VENDA):
+    """
+    KPIs por período numa única query.
+
+    Args:
+        periodos: {"atual": (inicio, fim), "anterior": (inicio, fim), ...} half-open
+        medidas: nomes de MEDIDAS / DERIVADAS
+
+    Retorna {periodo: {medida: valor}} (zeros se a query falhar).
+    """
+    base = _dependencias(medidas)
+    inicio = min(p[0] for p in periodos.values())
+    fim = max(p[1] for p in periodos.values())
+    itens_src, pedidos_src, params = fontes_vendas(inicio, fim)
+
+    for nome, (p_inicio, p_fim) in periodos.items():
+        params[f"{nome}_inicio"] = p_inicio
+        params[f"{nome}_fim"] = p_fim
+
+    filtros = ["situacao IN (" + ", ".join(f"'{s}'" for s in situacoes) + ")"]
+    for coluna, valor in (("industria", industria), ("cliente", cliente), ("vendedor", vendedor)):
+        if valor:
+            filtros.append(f"{coluna} = :{coluna}")
+            params[coluna] = valor
+    where = " AND ".join(filtros)
+
+    partes = []
+    for fonte, fonte_sql in (("itens", itens_src), ("pedidos", pedidos_src)):
+        medidas_fonte = [m for m in base if MEDIDAS[m]["fonte"] == fonte]
+        if medidas_fonte:
+            partes.append(_select_fonte(fonte_sql, medidas_fonte, periodos, where))
+
+    query = partes[0] if len(partes) == 1 else f"SELECT * FROM ({partes[0]}) i CROSS JOIN ({partes[1]}) p"
+    row = execute_scalar_row(query, params) or {}
+
+    resultado = {}
+    for periodo in periodos:
+        valores = {m: float(row.get(f"{m}__{periodo}") or 0) for m in base}
+        for nome, (num, den) in DERIVADAS.items():
+            if nome in medidas:
+                valores[nome] = valores[num] / valores[den] if valores[den] > 0 else 0.0
+        resultado[periodo] = {m: valores[m] for m in medidas}
+    return resultado
+
+
+def variacao_percentual(atual, anterior) -> float:
+    """Variação % com as convenções dos dashboards (sem base: 100 se houve valor, senão 0)"""
+    atual, anterior = float(atual or 0), float(anterior or 0)
+    if anterior > 0:
+        return (atual - anterior) / anterior * 100
+    return 100.0 if atual > 0 else 0.0
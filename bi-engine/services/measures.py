@@ -1,5 +1,6 @@
 import pandas as pd
 from typing import Dict, List, Any
+from utils.serialization import column_values
 
 # --- DAX-like Measures ---
 
@@ -33,10 +34,11 @@ def measure_comparativo_mensal(df_fat: pd.DataFrame, df_metas: pd.DataFrame) ->
     # Converter Faturamento para Dicionário {Mês: Valor}
     fat_dict = {}
     if not df_fat.empty:
-        fat_dict = {int(row['n_mes']): float(row['v_faturamento']) for _, row in df_fat.iterrows()}
+        fat_dict = dict(zip(column_values(df_fat['n_mes'], "int"), column_values(df_fat['v_faturamento'], "float", 0.0)))
     
-    # Preparar Dados de Metas (uma única linha com colunas met_jan..met_dez)
-    metas_row = df_metas.iloc[0] if not df_metas.empty else {}
+    # Preparar Dados de Metas (uma única linha com colunas met_jan..met_dez; ausentes/nulos = 0)
+    metas_row = pd.Series(dtype=float) if df_metas.empty else df_metas.iloc[0]
+    metas_vals = pd.to_numeric(metas_row.reindex(MONTH_COLS), errors='coerce').fillna(0.0).astype(float).tolist()
     
     result = []
     labels = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
@@ -45,11 +47,7 @@ def measure_comparativo_mensal(df_fat: pd.DataFrame, df_metas: pd.DataFrame) ->
         label = labels[i-1]
         
         # Valor Meta (colunas met_jan, met_fev, ...)
-        meta_key = MONTH_COLS[i-1]
-        val_meta = 0.0
-        if meta_key in metas_row:
-            val = metas_row[meta_key]
-            val_meta = float(val) if val is not None and pd.notna(val) else 0.0
+        val_meta = metas_vals[i-1]
         
         # Valor Faturamento
         val_fat = fat_dict.get(i, 0.0)
@@ -76,7 +74,7 @@ def measure_evolucao_mensal(df_fat: pd.DataFrame, metrica: str = 'valor') -> Lis
         
     # Converter para dicionário {Mês: Valor} dependendo da métrica
     col_name = 'v_faturamento' if metrica == 'valor' else 'q_quantidade'
-    data_dict = {int(row['n_mes']): float(row[col_name]) for _, row in df_fat.iterrows()}
+    data_dict = dict(zip(column_values(df_fat['n_mes'], "int"), column_values(df_fat[col_name], "float", 0.0)))
     
     result = []
     labels = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
@@ -0,0 +1,126 @@
+"""
+Service: Períodos
+Filtros de data sargáveis para os services de BI.
+
+Todo período é half-open [inicio, fim) e vira `coluna >= :inicio AND coluna < :fim`,
+que usa o índice simples de ped_data (EXTRACT(YEAR/MONTH FROM ped_data) = X
+obriga seq scan ou índice de expressão). Ver check_period_indexes.py.
+"""
+from datetime import date, timedelta
+
+
+def shift_years(d: date, years: int) -> date:
+    """Mesma data N anos antes/depois (29/02 vira 28/02)"""
+    try:
+        return d.replace(year=d.year + years)
+    except ValueError:
+        return d.replace(year=d.year + years, day=28)
+
+
+def periodo_ano(ano: int):
+    """[01/01/ano, 01/01/ano+1)"""
+    return date(ano, 1, 1), date(ano + 1, 1, 1)
+
+
+def periodo_mes(ano: int, mes: int):
+    """[01/mes/ano, 01/mes+1/ano)"""
+    inicio = date(ano, mes, 1)
+    return inicio, date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+
+
+def meses_do_periodo(inicio: date, fim: date):
+    """Primeiro dia de cada mês que intersecta [inicio, fim), em ordem"""
+    mes = inicio.replace(day=1)
+    meses = []
+    while mes < fim:
+        meses.append(mes)
+        mes = date(mes.year + 1, 1, 1) if mes.month == 12 else date(mes.year, mes.month + 1, 1)
+    return meses
+
+
+def ultimos_meses(ano: int, mes: int, quantidade: int):
+    """[inicio, fim) dos `quantidade` meses terminando em mes/ano (inclusive)"""
+    _, fim = periodo_mes(ano, mes)
+    indice = ano * 12 + (mes - 1) - (quantidade - 1)
+    return date(indice // 12, indice % 12 + 1, 1), fim
+
+
+def parse_data(valor) -> date:
+    """'YYYY-MM-DD' (ignora hora no fim, ex. '2025-01-31T00:00:00') -> date; ValueError se malformada"""
+    return date.fromisoformat(str(valor)[:10])
+
+
+def periodo_intervalo(startDate: str, endDate: str):
+    """Datas 'YYYY-MM-DD' inclusivas (como chegam da API) -> [start, end + 1 dia)"""
+    return parse_data(startDate), parse_data(endDate) + timedelta(days=1)
+
+
+def _mes_int(mes):
+    """'Todos' / None / '' -> None; '03' / 3 -> 3"""
+    if mes in (None, '', 'Todos', 'todos'):
+        return None
+    try:
+        return int(mes)
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_periodo(ano: int, mes='Todos', startDate: str = None, endDate: str = None):
+    """(inicio, fim) half-open a partir dos filtros usados nos dashboards (range > mês > ano)"""
+    if startDate and endDate:
+        return periodo_intervalo(startDate, endDate)
+    mes_int = _mes_int(mes)
+    if mes_int:
+        return periodo_mes(ano, mes_int)
+    return periodo_ano(ano)
+
+
+def periodo_anterior(ano: int, mes='Todos', startDate: str = None, endDate: str = None):
+    """
+    Período de comparação do resolve_periodo:
+    range -> mesmo range no ano anterior; mês -> mês anterior; ano -> ano anterior.
+    """
+    inicio, fim = resolve_periodo(ano, mes, startDate, endDate)
+    if startDate and endDate:
+        return shift_years(inicio, -1), shift_years(fim, -1)
+    if _mes_int(mes):
+        return (inicio - timedelta(days=1)).replace(day=1), inicio
+    return periodo_ano(ano - 1)
+
+
+def filtro_periodo(inicio: date, fim: date, coluna: str = "p.ped_data", nome: str = "periodo"):
+    """
+    (sql, params) para `coluna` em [inicio, fim).
+
+    `nome` prefixa os binds (:<nome>_inicio / :<nome>_fim), permitindo
+    vários períodos na mesma query (ex.: atual e anterior).
+    """
+    sql = f"{coluna} >= :{nome}_inicio AND {coluna} < :{nome}_fim"
+    return sql, {f"{nome}_inicio": inicio, f"{nome}_fim": fim}
+
+
+def filtro_periodo_sql(inicio: date, fim: date, coluna: str = "p.ped_data"):
+    """
+    Mesmo filtro com as datas como literais, para queries montadas sem bind
+    params (client_dashboard, database_native). Seguro: inicio/fim são `date`.
+    """
+    return f"{coluna} >= DATE '{inicio.isoformat()}' AND {coluna} < DATE '{fim.isoformat()}'"
+
+
+def filtro_meses(ano: int, meses, coluna: str = "p.ped_data", nome: str = "periodo"):
+    """
+    (sql, params) para uma lista de meses do ano (não necessariamente contíguos).
+
+    Meses vazios/inválidos = ano inteiro. Cada mês vira um range; o planner
+    combina os ranges num BitmapOr sobre o mesmo índice.
+    """
+    meses_int = sorted({m for m in (_mes_int(m) for m in (meses or [])) if m and 1 <= m <= 12})
+    if not meses_int:
+        return filtro_periodo(*periodo_ano(ano), coluna=coluna, nome=nome)
+
+    partes, params = [], {}
+    for m in meses_int:
+        sql, p = filtro_periodo(*periodo_mes(ano, m), coluna=coluna, nome=f"{nome}_m{m}")
+        partes.append(f"({sql})")
+        params.update(p)
+    return "(" + " OR ".join(partes) + ")", params
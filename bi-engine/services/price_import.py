@@ -0,0 +1,506 @@
+"""
+Importação de tabela de preço em lote (set-based).
+
+Em vez de 3 round-trips por linha da planilha (SELECT em cad_prod,
+fn_upsert_produto, SELECT em cad_tabelaspre) as linhas já interpretadas vão
+por COPY para uma tabela temporária de staging e o merge em cad_prod e
+cad_tabelaspre é feito com poucos UPDATE/INSERT ... SELECT, numa transação só.
+
+Mantém a regra da importação parcial (SMART MERGE): célula vazia na planilha
+nunca apaga o valor do banco. A staging guarda NULL para "não informado" e o
+merge faz COALESCE(planilha, banco) — as mesmas regras de fn_upsert_produto
+(texto vazio / número 0 preservam o banco) e fn_upsert_preco.
+
+Casamento de códigos: normalize_code é o espelho exato de fn_normalizar_codigo
+(a mesma função que o trigger do cad_prod grava em pro_codigonormalizado). Os
+produtos da indústria são carregados uma vez por importação num dict
+{código normalizado: (pro_id, pro_codprod)} e cada linha já vai para a staging
+com o pro_id resolvido — O(linhas), sem expressão sobre pro_codprod por linha.
+"""
+import csv
+import datetime
+import io
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.database import get_current_engine
+
+# Ordem das colunas das tuplas de build_staging_rows
+ROW_COLUMNS = [
+    "linha", "codigo", "nome", "peso", "embalagem", "grupo", "setor", "linha_prod",
+    "ncm", "origem", "aplicacao", "codbarras", "precobruto", "precopromo",
+    "precoespecial", "ipi", "st", "grupodesconto", "descontoadd", "datavencimento", "codigo_norm",
+]
+# No COPY cada tupla ganha o pro_id já resolvido
+STAGING_COLUMNS = ROW_COLUMNS + ["pro_id"]
+
+_NOT_CODE_CHARS = re.compile(r"[^A-Z0-9]")
+
+_STAGING_DDL = """
+    CREATE TEMP TABLE stg_tabela_preco (
+        linha integer, codigo text, nome text, peso double precision,
+        embalagem integer, grupo integer, setor text, linha_prod text,
+        ncm text, origem text, aplicacao text, codbarras text,
+        precobruto double precision, precopromo double precision,
+        precoespecial double precision, ipi double precision, st double precision,
+        grupodesconto integer, descontoadd double precision, datavencimento date,
+        codigo_norm text, pro_id integer
+    ) ON COMMIT DROP
+"""
+
+# Código repetido na planilha: vale a última linha
+_DEDUP_SQL = """
+    DELETE FROM stg_tabela_preco s
+    USING (
+        SELECT codigo_norm, MAX(linha) AS ultima
+        FROM stg_tabela_preco
+        GROUP BY codigo_norm
+        HAVING COUNT(*) > 1
+    ) d
+    WHERE s.codigo_norm = d.codigo_norm AND s.linha < d.ultima
+"""
+
+_CODE_MAP_SQL = """
+    SELECT pro_id, pro_codprod, pro_codigonormalizado
+    FROM cad_prod
+    WHERE pro_industria = %(industria)s
+    ORDER BY pro_codigonormalizado IS NULL, pro_id
+"""
+
+# Produto criado por outra importação entre a carga do mapa e o INSERT (usa uk_prod_industria_normalizado)
+_MATCH_NORM_SQL = """
+    UPDATE stg_tabela_preco s SET pro_id = p.pro_id
+    FROM cad_prod p
+    WHERE s.pro_id IS NULL
+      AND p.pro_industria = %(industria)s
+      AND p.pro_codigonormalizado = s.codigo_norm
+"""
+
+_UPDATE_PROD_SQL = """
+    UPDATE cad_prod p SET
+        pro_nome = COALESCE(LEFT(s.nome, 100), p.pro_nome),
+        pro_peso = COALESCE(NULLIF(s.peso, 0), p.pro_peso),
+        pro_embalagem = COALESCE(NULLIF(s.embalagem, 0), p.pro_embalagem),
+        pro_grupo = COALESCE(NULLIF(s.grupo, 0), p.pro_grupo),
+        pro_setor = COALESCE(LEFT(s.setor, 30), p.pro_setor),
+        pro_linha = COALESCE(LEFT(s.linha_prod, 50), p.pro_linha),
+        pro_ncm = COALESCE(LEFT(s.ncm, 10), p.pro_ncm),
+        pro_origem = COALESCE(LEFT(s.origem, 1), p.pro_origem),
+        pro_aplicacao = COALESCE(LEFT(s.aplicacao, 300), p.pro_aplicacao),
+        pro_codbarras = COALESCE(LEFT(s.codbarras, 13), p.pro_codbarras)
+    FROM stg_tabela_preco s
+    WHERE p.pro_id = s.pro_id
+"""
+
+_INSERT_PROD_SQL = """
+    WITH novos AS (
+        INSERT INTO cad_prod (
+            pro_industria, pro_codprod, pro_codigonormalizado, pro_codigooriginal,
+            pro_nome, pro_peso, pro_embalagem, pro_grupo, pro_setor,
+            pro_linha, pro_ncm, pro_origem, pro_aplicacao, pro_codbarras, pro_status
+        )
+        SELECT %(industria)s, s.codigo, s.codigo_norm, s.codigo,
+               LEFT(COALESCE(s.nome, s.codigo), 100), COALESCE(s.peso, 0), COALESCE(s.embalagem, 1),
+               s.grupo, LEFT(s.setor, 30), LEFT(s.linha_prod, 50), LEFT(s.ncm, 10),
+               LEFT(s.origem, 1), LEFT(s.aplicacao, 300), LEFT(s.codbarras, 13), true
+        FROM stg_tabela_preco s
+        WHERE s.pro_id IS NULL
+        ON CONFLICT DO NOTHING
+        RETURNING pro_id, pro_codigonormalizado
+    )
+    UPDATE stg_tabela_preco s SET pro_id = n.pro_id
+    FROM novos n
+    WHERE s.pro_id IS NULL AND s.codigo_norm = n.pro_codigonormalizado
+"""
+
+_UPDATE_PRECO_SQL = """
+    UPDATE cad_tabelaspre t SET
+        itab_precobruto = COALESCE(NULLIF(s.precobruto, 0), t.itab_precobruto),
+        itab_precopromo = COALESCE(s.precopromo, t.itab_precopromo, 0),
+        itab_precoespecial = COALESCE(s.precoespecial, t.itab_precoespecial, 0),
+        itab_ipi = COALESCE(s.ipi, t.itab_ipi, 0),
+        itab_st = COALESCE(s.st, t.itab_st, 0),
+        itab_grupodesconto = COALESCE(s.grupodesconto, t.itab_grupodesconto),
+        itab_descontoadd = COALESCE(s.descontoadd, t.itab_descontoadd, 0),
+        itab_datatabela = CURRENT_DATE,
+        itab_datavencimento = COALESCE(s.datavencimento, t.itab_datavencimento),
+        itab_status = true
+    FROM stg_tabela_preco s
+    WHERE t.itab_idprod = s.pro_id AND t.itab_tabela = %(tabela)s
+"""
+
+_INSERT_PRECO_SQL = """
+    INSERT INTO cad_tabelaspre (
+        itab_idprod, itab_idindustria, itab_tabela, itab_precobruto, itab_precopromo,
+        itab_precoespecial, itab_ipi, itab_st, itab_grupodesconto, itab_descontoadd,
+        itab_datatabela, itab_datavencimento, itab_prepeso, itab_status
+    )
+    SELECT s.pro_id, %(industria)s, %(tabela)s, COALESCE(s.precobruto, 0), COALESCE(s.precopromo, 0),
+           COALESCE(s.precoespecial, 0), COALESCE(s.ipi, 0), COALESCE(s.st, 0), s.grupodesconto,
+           COALESCE(s.descontoadd, 0), CURRENT_DATE, s.datavencimento, 0, true
+    FROM stg_tabela_preco s
+    WHERE s.pro_id IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM cad_tabelaspre t
+          WHERE t.itab_idprod = s.pro_id AND t.itab_tabela = %(tabela)s
+      )
+    ON CONFLICT (itab_idprod, itab_tabela) DO NOTHING
+"""
+
+
+def normalize_code(value):
+    """
+    Código normalizado, idêntico a fn_normalizar_codigo no banco: mantém só
+    A-Z e 0-9 (minúsculas saem antes do UPPER, como lá), tira zeros à
+    esquerda ('000' -> '0'). None para código vazio.
+    """
+    if value is None or str(value).strip() == "":
+        return None
+    clean = _NOT_CODE_CHARS.sub("", str(value)).upper().lstrip("0")
+    return clean or "0"
+
+
+def load_code_map(cur, industria: int) -> dict:
+    """
+    {código normalizado: (pro_id, pro_codprod)} dos produtos da indústria.
+
+    Usa pro_codigonormalizado gravado pelo trigger e, para linhas antigas sem
+    ele, normaliza pro_codprod aqui; em conflito vale o normalizado gravado.
+    """
+    cur.execute(_CODE_MAP_SQL, {"industria": industria})
+    code_map = {}
+    for pro_id, codprod, stored in cur.fetchall():
+        key = stored or normalize_code(codprod)
+        if key is not None:
+            code_map.setdefault(key, (pro_id, codprod))
+    return code_map
+
+
+# --- Pré-processamento vetorizado -------------------------------------------------
+# Cada coluna mapeada é interpretada de uma vez (pd.to_numeric, .str, numpy) em
+# vez de célula a célula; o resultado é um DataFrame tipado com a máscara de
+# validade e o motivo de cada linha rejeitada, antes de qualquer SQL.
+
+# Tamanho das colunas de cad_prod (o merge ainda aplica LEFT por segurança)
+_TEXT_LIMITS = {"nome": 100, "setor": 30, "linha_prod": 50, "ncm": 10, "origem": 1,
+                "aplicacao": 300, "codbarras": 13}
+_CODE_MAX = 25
+
+MOTIVO_SEM_CODIGO = "sem código"
+MOTIVO_SEM_PRECO = "sem preço"
+
+# Texto que conta como célula vazia: '' e 'nan' em qualquer caixa
+_BLANK_TEXT = {""} | {a + b + c for a in "nN" for b in "aA" for c in "nN"}
+# Vírgula decimal vira ponto; 'R$', '%' e espaços saem ('R$ 1 234,50' -> '1234.50')
+_NUMBER_TEXT = str.maketrans({"R": None, "$": None, "%": None, " ": None, "\xa0": None})
+# infer_dtype de colunas object só com números (e vazios)
+_NUMERIC_INFERRED = ("floating", "integer", "mixed-integer-float", "empty")
+# Espelho vetorizado de normalize_code: zeros/símbolos do início e tudo fora de A-Z0-9
+# (o UPPER de lá não muda nada: minúsculas já saíram)
+_CODE_JUNK = r"^[^1-9A-Z]+|[^A-Z0-9]"
+
+
+def _typed(serie: pd.Series) -> bool:
+    """Coluna homogênea numérica/data (read_excel não misturou texto nela)"""
+    dtype = serie.dtype
+    return (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)) \
+        or pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+def _blank(serie: pd.Series) -> pd.Series:
+    """None/NaN/NaT, texto vazio ou 'nan'"""
+    if _typed(serie) or pd.api.types.is_bool_dtype(serie.dtype):
+        return serie.isna()
+    return serie.isna() | serie.str.strip().isin(_BLANK_TEXT)
+
+
+def _number_texts(serie: pd.Series) -> pd.Series:
+    """Texto -> número: sem R$/%/espaços; com vírgula (pt-BR), os pontos são de milhar ('1.234,50' -> 1234.50)"""
+    cleaned = serie.str.translate(_NUMBER_TEXT)
+    comma = cleaned.str.contains(",", regex=False).fillna(False).astype(bool)
+    if comma.any():
+        cleaned[comma] = cleaned[comma].str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def _numbers(serie: pd.Series) -> pd.Series:
+    """'R$ 1.234,50' / '12%' / 10.5 -> float; NaN se vazio ou inválido"""
+    inferred = None if _typed(serie) else pd.api.types.infer_dtype(serie, skipna=True)
+    if inferred is None or inferred in _NUMERIC_INFERRED:
+        return pd.to_numeric(serie, errors="coerce").astype(float)
+    if inferred == "string":
+        return _number_texts(serie).astype(float)
+    # Misturada: as células numéricas de uma vez, as de texto pela limpeza
+    kinds = serie.map(type)
+    is_str = kinds.eq(str)
+    nums = pd.to_numeric(serie.where(~is_str & ~kinds.eq(bool)), errors="coerce").astype(float)
+    if is_str.any():
+        nums[is_str] = _number_texts(serie[is_str])
+    return nums
+
+
+def _integers(serie: pd.Series) -> pd.Series:
+    """Parte inteira (Int64); fora da faixa de integer do Postgres vira nulo"""
+    nums = _numbers(serie)
+    return np.trunc(nums.where(nums.abs() < 2 ** 31)).astype("Int64")
+
+
+def _float_texts(values: np.ndarray) -> np.ndarray:
+    """Floats -> texto (inteiros sem '.0', como o Excel mostra); NaN vira None"""
+    integral = np.isfinite(values) & (np.abs(values) < 1e18)
+    integral[integral] = values[integral] % 1 == 0
+    other = ~integral & ~np.isnan(values)
+    out = np.full(len(values), None, dtype=object)
+    out[integral] = values[integral].astype(np.int64).astype(str)
+    out[other] = values[other].astype(str)
+    return out
+
+
+def _texts(serie: pd.Series) -> pd.Series:
+    """Texto da célula sem espaços nas pontas; números inteiros do Excel (12.0) viram '12'"""
+    if pd.api.types.is_float_dtype(serie.dtype):
+        return pd.Series(_float_texts(serie.to_numpy()), index=serie.index)
+    if _typed(serie):
+        return serie.astype(str).where(serie.notna())
+    inferred = pd.api.types.infer_dtype(serie, skipna=True)
+    if inferred == "empty":
+        return pd.Series(None, index=serie.index, dtype=object)
+    if inferred == "string":
+        # Coluna só de texto (o caso comum): um strip e pronto
+        out = serie.str.strip()
+        return out.where(~out.isin(_BLANK_TEXT))
+    if inferred in _NUMERIC_INFERRED:
+        # Só números com vazios no meio (object por causa do None)
+        return pd.Series(_float_texts(serie.to_numpy(dtype=float, na_value=np.nan)), index=serie.index)
+
+    kinds = serie.map(type)
+    is_str = kinds.eq(str).to_numpy()
+    is_float = kinds.isin((float, np.float64)).to_numpy()
+    values = serie.to_numpy()
+    out = np.full(len(values), None, dtype=object)
+    if is_str.any():
+        out[is_str] = serie[is_str].str.strip().to_numpy()
+    if is_float.any():
+        out[is_float] = _float_texts(values[is_float].astype(float))
+    others = ~is_str & ~is_float & serie.notna().to_numpy()
+    if others.any():
+        out[others] = serie[others].astype(str).str.strip().to_numpy()
+    out = pd.Series(out, index=serie.index)
+    return out.where(~out.isin(_BLANK_TEXT))
+
+
+def _dates(serie: pd.Series) -> pd.Series:
+    """Datas do Excel ficam como estão; texto é lido dia/mês/ano"""
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        parsed = serie
+    else:
+        is_date = serie.map(type).isin((datetime.datetime, datetime.date, pd.Timestamp))
+        parsed = pd.to_datetime(serie.where(is_date), errors="coerce")
+        text = ~is_date & ~_blank(serie)
+        if text.any():
+            parsed[text] = pd.to_datetime(serie[text].astype(str).str.strip(), format="mixed", dayfirst=True,
+                                          errors="coerce")
+    return parsed.dt.date.where(parsed.notna())
+
+
+def normalize_codes(codes: pd.Series) -> pd.Series:
+    """normalize_code para uma coluna inteira de códigos (texto ou NaN)"""
+    clean = codes.str.replace(_CODE_JUNK, "", regex=True)
+    return clean.where(clean.ne(""), "0").where(codes.notna())
+
+
+# (coluna da staging, campo do mapeamento, parser)
+_PARSERS = [
+    ("codigo", "codigo", _texts), ("nome", "descricao", _texts), ("peso", "peso", _numbers),
+    ("embalagem", "embalagem", _integers), ("grupo", "grupo", _integers), ("setor", "setor", _texts),
+    ("linha_prod", "linha", _texts), ("ncm", "ncm", _texts), ("origem", "origem", _texts),
+    ("aplicacao", "aplicacao", _texts), ("codbarras", "codbarras", _texts),
+    ("precobruto", "preco", _numbers), ("precopromo", "preco_promocao", _numbers),
+    ("precoespecial", "preco_especial", _numbers), ("ipi", "ipi", _numbers), ("st", "st", _numbers),
+    ("grupodesconto", "grupodesconto", _integers), ("descontoadd", "descontoadd", _numbers),
+    ("datavencimento", "datavencimento", _dates),
+]
+
+
+def prepare_rows(data_df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
+    """
+    Interpreta as linhas da planilha conforme o mapeamento {campo: índice da coluna}.
+
+    Retorna um DataFrame com o mesmo índice, as colunas de ROW_COLUMNS já
+    tipadas (NaN/<NA> = não informado), `valido` e `motivo` (None nas linhas
+    válidas). Sem código ou sem preço (vazio ou zero) a linha não entra,
+    como no fluxo antigo; preço ilegível e código longo demais também não.
+    """
+    ncols = data_df.shape[1]
+    empty = pd.Series(None, index=data_df.index, dtype=object)
+
+    def column(field):
+        col_idx = mapping.get(field)
+        if col_idx is None or not 0 <= col_idx < ncols:
+            return empty
+        return data_df.iloc[:, col_idx]
+
+    frame = pd.DataFrame({"linha": data_df.index.astype(int)}, index=data_df.index)
+    for name, field, parser in _PARSERS:
+        source = column(field)
+        # Coluna não mapeada: só o tipo de saída do parser, sem percorrer as linhas
+        frame[name] = parser(source) if source is not empty else parser(empty.iloc[:0]).reindex(data_df.index)
+    for name, limit in _TEXT_LIMITS.items():
+        if frame[name].notna().any():
+            frame[name] = frame[name].str.slice(0, limit)
+    frame["codigo_norm"] = normalize_codes(frame["codigo"])
+
+    preco_raw = column("preco")
+    lidos = frame["precobruto"].notna().to_numpy()
+    sem_preco = pd.Series(False, index=data_df.index)
+    sem_preco[~lidos] = _blank(preco_raw[~lidos]).to_numpy(dtype=bool)
+    motivo = pd.Series(None, index=data_df.index, dtype=object)
+    longo = frame["codigo"].str.len() > _CODE_MAX
+    motivo[longo] = "código '" + frame.loc[longo, "codigo"].str.slice(0, 30) + f"' maior que {_CODE_MAX} caracteres"
+    invalido = frame["precobruto"].isna() & ~sem_preco
+    motivo[invalido] = "preço '" + preco_raw[invalido].astype(str).str.slice(0, 30) + "' inválido"
+    motivo[sem_preco | frame["precobruto"].eq(0)] = MOTIVO_SEM_PRECO
+    motivo[frame["codigo"].isna()] = MOTIVO_SEM_CODIGO
+
+    frame["valido"] = motivo.isna()
+    frame["motivo"] = motivo
+    return frame
+
+
+def build_staging_rows(data_df: pd.DataFrame, mapping: dict):
+    """
+    Linhas válidas de prepare_rows como tuplas na ordem de ROW_COLUMNS.
+
+    Retorna (linhas, ignoradas, erros): as tuplas (None = não informado), a
+    quantidade de linhas rejeitadas e as mensagens das rejeitadas por outro
+    motivo que não a falta de código/preço.
+    """
+    frame = prepare_rows(data_df, mapping)
+    valid = frame.loc[frame["valido"]]
+    rows = list(zip(*(valid[name].to_numpy(dtype=object, na_value=None).tolist() for name in ROW_COLUMNS)))
+
+    rejected = frame.loc[~frame["valido"], "motivo"]
+    reported = rejected[~rejected.isin((MOTIVO_SEM_CODIGO, MOTIVO_SEM_PRECO))]
+    errors = [f"Linha {idx}: {motivo}" for idx, motivo in reported.items()]
+    return rows, len(rejected), errors
+
+
+def _copy_rows(cur, rows, code_map: dict):
+    """COPY das tuplas para a staging (CSV: None vira campo vazio = NULL)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        match = code_map.get(row[-1])
+        writer.writerow(row + (match[0] if match else None,))
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY stg_tabela_preco ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def merge_staging_rows(conn, batches, industria: int, tabela: str, commit: bool = True,
+                       code_map: dict = None) -> dict:
+    """
+    Carrega os lotes de linhas (listas de tuplas de build_staging_rows, um
+    COPY por lote) na staging e faz o merge em cad_prod/cad_tabelaspre.
+    Faz commit no final (commit=False deixa a transação aberta para o
+    chamador); rollback se algo falhar.
+
+    `code_map` (load_code_map) permite reaproveitar o mapa entre chamadas
+    (importação em várias transações); os produtos criados aqui são
+    acrescentados a ele.
+
+    Retorna contagens: inserted/updated (produtos), skipped (duplicados na
+    planilha ou não resolvidos) e prices_inserted/prices_updated.
+    """
+    params = {"industria": industria, "tabela": tabela}
+    cur = conn.cursor()
+    try:
+        shared_map = code_map is not None
+        if not shared_map:
+            code_map = load_code_map(cur, industria)
+        cur.execute(_STAGING_DDL)
+        for rows in batches:
+            if rows:
+                _copy_rows(cur, rows, code_map)
+        cur.execute(_DEDUP_SQL)
+        duplicados = cur.rowcount
+        cur.execute("ANALYZE stg_tabela_preco")
+
+        cur.execute(_UPDATE_PROD_SQL)
+        updated = cur.rowcount
+
+        cur.execute(_INSERT_PROD_SQL, params)
+        inserted = cur.rowcount
+        # Conflito com produto criado por outra importação no meio do caminho
+        cur.execute(_MATCH_NORM_SQL, params)
+        cur.execute("SELECT COUNT(*) FROM stg_tabela_preco WHERE pro_id IS NULL")
+        sem_produto = cur.fetchone()[0]
+
+        cur.execute(_UPDATE_PRECO_SQL, params)
+        prices_updated = cur.rowcount
+        cur.execute(_INSERT_PRECO_SQL, params)
+        prices_inserted = cur.rowcount
+
+        if shared_map:
+            cur.execute("SELECT codigo_norm, pro_id, codigo FROM stg_tabela_preco WHERE pro_id IS NOT NULL")
+            for norm, pro_id, codigo in cur.fetchall():
+                code_map.setdefault(norm, (pro_id, codigo))
+
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "skipped": duplicados + sem_produto,
+        "prices_inserted": prices_inserted,
+        "prices_updated": prices_updated,
+    }
+
+
+def import_price_rows(chunks, mapping: dict, industria: int, tabela: str) -> dict:
+    """
+    Importa as linhas de dados da planilha (já sem linhas totalmente vazias).
+
+    `chunks`: um DataFrame ou um iterável de DataFrames (lotes do leitor em
+    streaming, services/price_sheet.iter_sheet_chunks); cada lote é
+    interpretado e enviado por COPY antes de ler o próximo.
+
+    Retorna {"inserted", "updated", "skipped", "prices_inserted", "prices_updated",
+    "errors", "ms"}; `skipped` inclui as linhas sem código/preço.
+    """
+    start = time.perf_counter()
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    parsed = {"rows": 0, "skipped": 0, "errors": []}
+
+    def batches():
+        for chunk in chunks:
+            rows, skipped, errors = build_staging_rows(chunk, mapping)
+            parsed["rows"] += len(rows)
+            parsed["skipped"] += skipped
+            parsed["errors"].extend(errors[:50 - len(parsed["errors"])])
+            yield rows
+
+    conn = get_current_engine().raw_connection()
+    try:
+        counts = merge_staging_rows(conn, batches(), industria, tabela)
+    finally:
+        conn.close()
+
+    counts["skipped"] += parsed["skipped"]
+    counts["errors"] = parsed["errors"]
+    counts["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"📦 [PRICE IMPORT] {parsed['rows']} linhas | total {counts['ms']:.0f} ms | "
+          f"+{counts['inserted']} ~{counts['updated']} produtos, ignoradas {counts['skipped']}", flush=True)
+    return counts
@@ -0,0 +1,250 @@
+"""
+Layouts conhecidos de tabela de preço.
+
+Cada indústria manda a tabela sempre no mesmo formato, mas o analyze-sheet
+mandava a amostra para a OpenAI a cada upload. Aqui o mapeamento aceito numa
+importação fica em bi_price_layouts (sql/bi_price_layouts.sql), indexado pela
+impressão digital do cabeçalho: sha1 de (nome da aba, nº de colunas do
+cabeçalho, células do cabeçalho normalizadas). Num upload novo calculamos a
+impressão digital de cada uma das primeiras linhas da aba (o logo da empresa
+pode empurrar o cabeçalho algumas linhas) e, se alguma bater, o mapeamento
+salvo é reaproveitado sem chamar a IA. O layout é sempre da indústria
+informada: o mesmo cabeçalho de outro fornecedor não é aplicado (as colunas
+podem significar outra coisa), e sem indústria a busca nem é feita.
+
+detect_columns é o detector local por palavras-chave + perfil dos dados,
+usado quando a IA falha (sem chave, timeout, JSON inválido).
+"""
+import hashlib
+import json
+import re
+import unicodedata
+
+import pandas as pd
+from sqlalchemy import text
+
+from services.database import execute_rows, execute_scalar_row, get_current_engine
+from utils.cache import bi_cache
+
+# Linhas do início da aba em que o cabeçalho pode estar
+HEADER_SCAN_ROWS = 30
+
+_SPACES = re.compile(r"\s+")
+
+_LOOKUP_SQL = """
+    SELECT fingerprint, industria, header_row, data_start_row, mapping
+    FROM bi_price_layouts
+    WHERE fingerprint = ANY(:fingerprints) AND industria = :industria
+    ORDER BY atualizado_em DESC
+    LIMIT 1
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO bi_price_layouts (fingerprint, industria, sheet_name, header_row, data_start_row, mapping)
+    VALUES (:fingerprint, :industria, :sheet_name, :header_row, :data_start_row, CAST(:mapping AS jsonb))
+    ON CONFLICT (fingerprint, industria) DO UPDATE SET
+        header_row = EXCLUDED.header_row,
+        data_start_row = EXCLUDED.data_start_row,
+        mapping = EXCLUDED.mapping,
+        usos = bi_price_layouts.usos + 1,
+        atualizado_em = now()
+"""
+
+
+# --- impressão digital -----------------------------------------------------------
+
+def _norm_cell(value) -> str:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return _SPACES.sub(" ", str(value)).strip().upper()
+
+
+def header_cells(sheet: pd.DataFrame, header_row: int) -> list:
+    """Células da linha de cabeçalho normalizadas, até a última preenchida"""
+    if not 0 <= header_row < len(sheet):
+        return []
+    cells = [_norm_cell(v) for v in sheet.iloc[header_row].tolist()]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def header_fingerprint(sheet_name: str, cells: list) -> str:
+    payload = json.dumps([(sheet_name or "").strip().lower(), len(cells), cells], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _candidate_fingerprints(sheet: pd.DataFrame, sheet_name: str) -> dict:
+    """{impressão digital: linha} das primeiras linhas com pelo menos 2 células preenchidas"""
+    candidates = {}
+    for row in range(min(len(sheet), HEADER_SCAN_ROWS)):
+        cells = header_cells(sheet, row)
+        if sum(1 for c in cells if c) >= 2:
+            candidates.setdefault(header_fingerprint(sheet_name, cells), row)
+    return candidates
+
+
+# --- persistência ------------------------------------------------------------------
+
+def _table_exists() -> bool:
+    row = execute_scalar_row("SELECT to_regclass('bi_price_layouts') IS NOT NULL AS existe")
+    return bool(row and row["existe"])
+
+
+def _has_table() -> bool:
+    """Existência da tabela no schema do tenant, cacheada por 1 minuto"""
+    return bi_cache.get_or_compute("price_layouts_table", (), _table_exists, ttl=60)
+
+
+def find_layout(sheet: pd.DataFrame, sheet_name: str, industria: int):
+    """
+    Layout salvo da indústria que bate com o cabeçalho da aba, ou None
+    (também sem indústria: layout de outra indústria nunca é usado).
+
+    Retorna {"header_row", "data_start_row", "mapping", "industria_detectada"}
+    (mesmas chaves da resposta da IA) com as linhas ajustadas para onde o
+    cabeçalho está neste arquivo.
+    """
+    if industria is None:
+        return None
+    try:
+        if not _has_table():
+            return None
+        candidates = _candidate_fingerprints(sheet, sheet_name)
+        if not candidates:
+            return None
+        rows = execute_rows(_LOOKUP_SQL, {"fingerprints": list(candidates), "industria": industria})
+        if not rows:
+            return None
+
+        layout = rows[0]
+        mapping = layout["mapping"]
+        if isinstance(mapping, str):
+            mapping = json.loads(mapping)
+        header_row = candidates[layout["fingerprint"]]
+        return {
+            "header_row": header_row,
+            "data_start_row": header_row + (layout["data_start_row"] - layout["header_row"]),
+            "mapping": {field: idx for field, idx in mapping.items() if idx is not None},
+            "industria_detectada": layout["industria"],
+        }
+    except Exception as e:
+        print(f"⚠️ [PRICE LAYOUT] Falha ao buscar layout: {e}", flush=True)
+        return None
+
+
+def save_layout(sheet: pd.DataFrame, sheet_name: str, header_row: int, data_start_row: int,
+                mapping: dict, industria: int) -> bool:
+    """
+    Guarda (ou renova) o mapeamento aceito para o cabeçalho desta aba.
+    Escrita direta numa transação (sem o retry de execute_rows, que engolia a
+    falha): True só se o upsert foi commitado.
+    """
+    try:
+        cells = header_cells(sheet, header_row)
+        if sum(1 for c in cells if c) < 2 or not _has_table():
+            return False
+        with get_current_engine().begin() as conn:
+            conn.execute(text(_UPSERT_SQL), {
+                "fingerprint": header_fingerprint(sheet_name, cells),
+                "industria": industria,
+                "sheet_name": (sheet_name or "")[:100],
+                "header_row": header_row,
+                "data_start_row": data_start_row,
+                "mapping": json.dumps({field: idx for field, idx in mapping.items() if idx is not None}),
+            })
+        return True
+    except Exception as e:
+        print(f"⚠️ [PRICE LAYOUT] Falha ao salvar layout: {e}", flush=True)
+        return False
+
+
+# --- detector local -------------------------------------------------------------
+
+# (campo, padrão no cabeçalho sem acentos); os mais específicos primeiro.
+# Cada coluna fica com o primeiro campo que casar, cada campo com a primeira coluna.
+_HEADER_RULES = [
+    ("referencia_original", r"ORIGINAL|\bN\.? ?ORIG|\bOEM\b"),
+    ("preco_promocao", r"PROMO"),
+    ("preco_especial", r"ESPECIAL"),
+    ("ipi", r"\bIPI\b"),
+    ("st", r"\bST\b|SUBST"),
+    ("codbarras", r"BARRA|\bEAN\b|\bGTIN\b"),
+    ("ncm", r"\bNCM\b|CLASS\.? ?FISCAL"),
+    ("embalagem", r"\bEMB|\bQTD\.? ?(POR )?CX|MULTIPLO"),
+    ("peso", r"\bPESO\b"),
+    ("aplicacao", r"APLICA|VEICULO"),
+    ("codigo", r"\bCOD|\bREF|\bREFERENCIA|\bITEM\b|\bSKU\b"),
+    ("descricao", r"DESCR|\bPRODUTO\b|\bNOME\b"),
+    ("preco", r"PRECO|\bVALOR\b|\bVLR\b|\bR\$"),
+]
+_HEADER_PATTERNS = [(field, re.compile(pattern)) for field, pattern in _HEADER_RULES]
+
+
+def _plain(value) -> str:
+    text = unicodedata.normalize("NFKD", _norm_cell(value))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _match_headers(cells: list) -> dict:
+    mapping = {}
+    for idx, cell in enumerate(cells):
+        if not cell:
+            continue
+        for field, pattern in _HEADER_PATTERNS:
+            if field not in mapping and pattern.search(cell):
+                mapping[field] = idx
+                break
+    return mapping
+
+
+def _numeric_share(serie: pd.Series) -> float:
+    filled = serie.dropna()
+    if filled.empty:
+        return 0.0
+    numbers = pd.to_numeric(filled.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+    return numbers.notna().mean() * len(filled) / len(serie)
+
+
+def detect_columns(sheet: pd.DataFrame) -> dict:
+    """
+    Mapeamento por heurística, no mesmo formato da resposta da IA:
+    {"header_row", "data_start_row", "mapping"}.
+
+    Cabeçalho = linha (entre as primeiras HEADER_SCAN_ROWS) com mais nomes de
+    campo reconhecidos. Sem nome reconhecível, descrição vira a coluna de
+    texto mais longo e preço a coluna mais numérica das linhas de dados.
+    """
+    best_row, best = 0, {}
+    for row in range(min(len(sheet), HEADER_SCAN_ROWS)):
+        found = _match_headers([_plain(v) for v in sheet.iloc[row].tolist()])
+        if len(found) > len(best):
+            best_row, best = row, found
+
+    header_row = best_row if len(best) >= 2 else 0
+    mapping = best if len(best) >= 2 else {}
+    data_start_row = header_row + 1
+    sample = sheet.iloc[data_start_row:data_start_row + 200]
+
+    used = set(mapping.values())
+    free = [i for i in range(sample.shape[1]) if i not in used]
+    if "descricao" not in mapping and free:
+        lengths = {i: sample.iloc[:, i].dropna().map(lambda v: len(str(v)) if isinstance(v, str) else 0).mean()
+                   for i in free}
+        lengths = {i: size for i, size in lengths.items() if pd.notna(size) and size > 0}
+        if lengths:
+            mapping["descricao"] = max(lengths, key=lengths.get)
+            free.remove(mapping["descricao"])
+    if "preco" not in mapping and free:
+        shares = {i: _numeric_share(sample.iloc[:, i]) for i in free}
+        col = max(shares, key=shares.get)
+        if shares[col] >= 0.5:
+            mapping["preco"] = col
+            free.remove(col)
+    if "codigo" not in mapping and free:
+        # Primeira coluna quase toda preenchida que sobrou
+        filled = [i for i in free if sample.iloc[:, i].notna().mean() >= 0.8]
+        if filled:
+            mapping["codigo"] = filled[0]
+
+    return {"header_row": header_row, "data_start_row": data_start_row, "mapping": mapping}
@@ -0,0 +1,298 @@
+"""
+Sessão de importação de tabela de preço.
+
+O fluxo analyze-sheet -> import lia a mesma aba da planilha 4-5 vezes
+(amostra para a IA, cabeçalhos, preview, contagem e depois a importação),
+cada uma com um pd.ExcelFile novo. Aqui a aba é lida uma vez e fica no
+bi_cache (região "price_sheet", TTL PRICE_SHEET_TTL) sob a chave
+(sha1 do arquivo, aba): o sha1 é o session_id devolvido ao frontend, e
+reenviar o mesmo arquivo cai na mesma sessão.
+
+A aba fica como DataFrame sem cabeçalho (header=None), sem as linhas e
+colunas vazias do fim (formatação do Excel costuma estender max_row/max_column).
+
+Arquivos acima de PRICE_SHEET_STREAM_MB não passam pelo cache: o upload fica
+no arquivo temporário do UploadFile (nunca vira bytes em memória) e é lido com
+openpyxl em modo read_only (iter_rows), em lotes de PRICE_IMPORT_CHUNK_ROWS
+linhas. Três partes do read_only do openpyxl cresciam com a aba e são
+substituídas aqui: a tabela de textos compartilhados (lista inteira em
+memória) vai para um arquivo temporário mapeado em memória, só com os
+offsets no heap; a dimensão da aba é lida só até o início de <sheetData>
+(sem <dimension>, o openpyxl montava a árvore da aba inteira para
+procurá-la); e as <row> já lidas são soltas da árvore do XML. Assim a
+memória do parse fica limitada ao lote.
+"""
+import hashlib
+import io
+import mmap
+import tempfile
+from array import array
+from contextlib import contextmanager
+from itertools import islice
+
+import pandas as pd
+from fastapi import HTTPException
+from openpyxl.cell.text import Text
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet._reader import DATA_TAG, DIMENSION_TAG, ROW_TAG, WorkSheetParser
+from openpyxl.xml.constants import SHARED_STRINGS, SHEET_MAIN_NS
+from openpyxl.xml.functions import iterparse
+
+from config import PRICE_IMPORT_CHUNK_ROWS, PRICE_SHEET_STREAM_MB, PRICE_SHEET_TTL
+from utils.cache import bi_cache
+
+_REGION = "price_sheet"
+
+
+def session_id(source) -> str:
+    """Chave da sessão: sha1 do arquivo enviado (bytes ou arquivo aberto em modo binário)"""
+    if isinstance(source, bytes):
+        return hashlib.sha1(source).hexdigest()
+    digest = hashlib.sha1()
+    source.seek(0)
+    for block in iter(lambda: source.read(1024 * 1024), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _trim_empty_tail(df: pd.DataFrame) -> pd.DataFrame:
+    """Remove linhas/colunas totalmente vazias do fim, mantendo os índices posicionais"""
+    filled = df.notna().to_numpy()
+    if not filled.any():
+        return df.iloc[0:0, 0:0]
+    last_row = filled.any(axis=1).nonzero()[0][-1]
+    last_col = filled.any(axis=0).nonzero()[0][-1]
+    return df.iloc[:last_row + 1, :last_col + 1]
+
+
+def parse_sheet(file_content: bytes, sheet_name: str) -> pd.DataFrame:
+    df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name, header=None, engine="openpyxl")
+    return _trim_empty_tail(df)
+
+
+def load_sheet(sheet_name: str, file_content: bytes = None, session: str = None):
+    """
+    Aba da planilha da sessão: (session_id, DataFrame).
+
+    Com `file_content` lê (ou reaproveita) a aba; só com `session` exige que a
+    sessão ainda esteja no cache (HTTP 410 se expirou).
+    """
+    if file_content is not None:
+        sid = session_id(file_content)
+        df = bi_cache.get_or_compute(_REGION, (sid, sheet_name), lambda: parse_sheet(file_content, sheet_name),
+                                     ttl=PRICE_SHEET_TTL)
+        return sid, df
+
+    df = bi_cache.get(_REGION, (session, sheet_name)) if session else None
+    if df is None:
+        raise HTTPException(status_code=410, detail="Sessão de importação expirada; envie o arquivo novamente")
+    return session, df
+
+
+# --- Leitura em streaming (read_only) -------------------------------------------
+
+def file_size(fileobj) -> int:
+    """Tamanho do arquivo aberto (ex.: UploadFile.file) sem ler o conteúdo"""
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def is_large_file(size: int) -> bool:
+    """Arquivo grande demais para ler a aba inteira / guardar na sessão"""
+    return size > PRICE_SHEET_STREAM_MB * 1024 * 1024
+
+
+class _SpooledStrings:
+    """
+    Textos compartilhados do xlsx (xl/sharedStrings.xml) num arquivo temporário.
+
+    Planilhas de preço costumam ter um texto distinto por linha (código,
+    descrição), então a lista do openpyxl crescia com o arquivo. Aqui cada
+    texto vai em UTF-8 para o arquivo e só o offset fica em memória; o
+    WorkSheetParser só precisa de `strings[i]`.
+    """
+    _TAG = "{%s}si" % SHEET_MAIN_NS
+
+    def __init__(self, xml_source):
+        self._file = tempfile.TemporaryFile()
+        self._offsets = array("q", [0])
+        self._map = None
+        events = iterparse(xml_source, events=("start", "end"))
+        _, root = next(events)
+        for event, node in events:
+            if event == "end" and node.tag == self._TAG:
+                text = Text.from_tree(node).content.replace("x005F_", "")
+                self._file.write(text.encode("utf-8"))
+                self._offsets.append(self._file.tell())
+                root.clear()  # descarta os <si> já lidos
+        self._file.flush()
+        if self._offsets[-1]:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return self._map[start:end].decode("utf-8") if end > start else ""
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class _StreamingWorksheet(ReadOnlyWorksheet):
+    """Aba read_only que procura <dimension> só no cabeçalho do XML"""
+
+    def _get_size(self):
+        with self._get_source() as src:
+            for _, element in iterparse(src, events=("start",)):
+                if element.tag == DIMENSION_TAG:
+                    ref = element.get("ref")
+                    if ref:
+                        self._min_column, self._min_row, self._max_column, self._max_row = range_boundaries(ref)
+                    return
+                if element.tag == DATA_TAG:
+                    return
+
+
+class _StreamingReader(ExcelReader):
+    """ExcelReader do openpyxl com a tabela de textos em _SpooledStrings e abas _StreamingWorksheet"""
+
+    def read_strings(self):
+        ct = self.package.find(SHARED_STRINGS)
+        if ct is not None:
+            with self.archive.open(ct.PartName[1:]) as src:
+                self.shared_strings = _SpooledStrings(src)
+
+    def read_worksheets(self):
+        # Mesmo ramo read_only do ExcelReader (gráficos em aba própria não têm células)
+        for sheet, rel in self.parser.find_sheets():
+            if rel.target not in self.valid_files or "chartsheet" in rel.Type:
+                continue
+            ws = _StreamingWorksheet(self.wb, sheet.name, rel.target, self.shared_strings)
+            ws.sheet_state = sheet.state
+            self.wb._sheets.append(ws)
+
+
+@contextmanager
+def _open_read_only(source):
+    """`source`: bytes, arquivo aberto em modo binário (UploadFile.file) ou caminho (jobs de importação)"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
+    reader = _StreamingReader(source, read_only=True, data_only=True)
+    try:
+        reader.read()
+        yield reader.wb
+    finally:
+        reader.wb.close()
+        if isinstance(reader.shared_strings, _SpooledStrings):
+            reader.shared_strings.close()
+
+
+def list_sheets(source) -> list:
+    """
+    Abas do arquivo com as dimensões declaradas no xlsx, sem carregar as células.
+    rows/cols vêm None quando o arquivo não grava a dimensão da aba.
+    """
+    with _open_read_only(source) as wb:
+        return [{"name": ws.title, "rows": ws.max_row, "cols": ws.max_column} for ws in wb.worksheets]
+
+
+class _RowParser(WorkSheetParser):
+    """
+    WorkSheetParser que só lê as linhas e solta cada <row> depois de lida.
+    O parse() do openpyxl limpa o elemento mas o deixa preso ao <sheetData>
+    (e guarda os atributos de cada linha em row_dimensions), o que cresce com a aba.
+    """
+
+    def parse(self):
+        sheet_data = None
+        for event, element in iterparse(self.source, events=("start", "end")):
+            if event == "start":
+                if element.tag == DATA_TAG:
+                    sheet_data = element
+            elif element.tag == ROW_TAG:
+                row = self.parse_row(element)
+                self.row_dimensions.clear()
+                if sheet_data is not None:
+                    sheet_data.clear()
+                yield row
+            elif element.tag == DATA_TAG:
+                return
+
+
+def _row_values(cells: list, width: int) -> tuple:
+    """Células de uma linha do parser -> tupla posicional (coluna 1 = índice 0)"""
+    width = width or (cells[-1]["column"] if cells else 0)
+    values = [None] * width
+    for cell in cells:
+        if cell["column"] <= width:
+            values[cell["column"] - 1] = cell["value"]
+    return tuple(values)
+
+
+def _iter_values(source, sheet_name: str, start_row: int = 0, max_rows: int = None):
+    """(índice 0-based da linha, tupla de valores), como as linhas de read_excel(header=None)"""
+    with _open_read_only(source) as wb:
+        ws = wb[sheet_name]
+        width = ws.max_column
+        stop = start_row + max_rows if max_rows is not None else None  # nº (1-based) da última linha
+        next_row = start_row + 1
+        with ws._get_source() as src:
+            parser = _RowParser(src, ws._shared_strings, data_only=True, epoch=wb.epoch,
+                                date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+            for number, cells in parser.parse():
+                if number < next_row:
+                    continue
+                # Linhas que o xlsx não grava (vazias) saem como no read_excel
+                for missing in range(next_row, number if stop is None else min(number, stop + 1)):
+                    yield missing - 1, (None,) * (width or 0)
+                if stop is not None and number > stop:
+                    break
+                yield number - 1, _row_values(cells, width)
+                next_row = number + 1
+
+
+def _chunk_frame(batch) -> pd.DataFrame:
+    index = [idx for idx, _ in batch]
+    return pd.DataFrame([values for _, values in batch], index=index)
+
+
+def read_sheet_head(source, sheet_name: str, nrows: int) -> pd.DataFrame:
+    """Primeiras `nrows` linhas da aba (amostra, cabeçalho e preview de arquivos grandes)"""
+    batch = list(_iter_values(source, sheet_name, max_rows=nrows))
+    return _trim_empty_tail(_chunk_frame(batch)) if batch else pd.DataFrame()
+
+
+def count_sheet_rows(source, sheet_name: str, start_row: int) -> int:
+    """Linhas com pelo menos uma célula preenchida a partir de `start_row`"""
+    return sum(
+        1 for _, values in _iter_values(source, sheet_name, start_row)
+        if any(v is not None and v != "" for v in values)
+    )
+
+
+def iter_sheet_chunks(source, sheet_name: str, start_row: int = 0,
+                      chunk_size: int = PRICE_IMPORT_CHUNK_ROWS):
+    """
+    Lotes da aba como DataFrames (índice = linha 0-based, colunas posicionais),
+    sem as linhas totalmente vazias. Só um lote fica em memória por vez.
+    """
+    rows = (
+        (idx, values) for idx, values in _iter_values(source, sheet_name, start_row)
+        if any(v is not None and v != "" for v in values)
+    )
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield _chunk_frame(batch)
@@ -0,0 +1,43 @@
+"""
+Service: Séries Mensais
+Uma query agrupada por date_trunc('month') para o período inteiro, com os
+meses sem movimento preenchidos com zero no Python (em vez de uma query por mês).
+"""
+from datetime import date
+
+from services.database import execute_rows
+from services.periods import filtro_periodo, meses_do_periodo
+
+
+def preencher_serie_mensal(rows, inicio: date, fim: date, campo_mes: str = "mes", campo_valor: str = "valor"):
+    """Lista [{"mes": date, "valor": float}] com todos os meses de [inicio, fim)"""
+    valores = {}
+    for r in rows:
+        mes = r[campo_mes]
+        valores[date(mes.year, mes.month, 1)] = float(r[campo_valor] or 0)
+    return [{"mes": m, "valor": valores.get(m, 0.0)} for m in meses_do_periodo(inicio, fim)]
+
+
+def fetch_serie_mensal(valor_sql: str, from_sql: str, inicio: date, fim: date, where: str = "",
+                       params: dict = None, coluna_data: str = "p.ped_data"):
+    """
+    Série mensal zero-filled de `valor_sql` no período [inicio, fim).
+
+    Args:
+        valor_sql: Agregação (ex.: "SUM(p.ped_totliq)")
+        from_sql: FROM + JOINs (ex.: "pedidos p JOIN vendedores v ON ...")
+        where: Condições extras, já com AND na frente
+        params: Bind params usados em `where`
+        coluna_data: Coluna de data usada no filtro e no agrupamento
+    """
+    filtro, filtro_params = filtro_periodo(inicio, fim, coluna=coluna_data, nome="serie")
+    query = f"""
+        SELECT date_trunc('month', {coluna_data})::date AS mes,
+               COALESCE({valor_sql}, 0) AS valor
+        FROM {from_sql}
+        WHERE {filtro}
+          {where}
+        GROUP BY 1
+    """
+    rows = execute_rows(query, {**(params or {}), **filtro_params})
+    return preencher_serie_mensal(rows, inicio, fim)
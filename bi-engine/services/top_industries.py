@@ -3,8 +3,10 @@ Service: Top Industries
 Retorna TOP N indústrias por faturamento ou quantidade.
 Usado no Bubble Chart da IntelligencePage.
 """
-import pandas as pd
 from services.database import execute_query
+from services.periods import resolve_periodo
+from services.vendas_cube import fontes_vendas
+from utils.serialization import records
 
 
 def fetch_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', limit: int = 6, startDate: str = None, endDate: str = None):
@@ -21,14 +23,8 @@ def fetch_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', l
     """
     print(f"--- BI: Fetching TOP {limit} Industries ({ano}/{mes}) range={startDate}:{endDate} metrica={metrica} ---", flush=True)
     
-    # Build Date Filter
-    if startDate and endDate:
-        date_filter = f"p.ped_data BETWEEN :startDate AND :endDate"
-    else:
-        if mes and mes != 'Todos':
-            date_filter = f"p.ped_data >= make_date(:ano, {int(mes)}, 1) AND p.ped_data < (make_date(:ano, {int(mes)}, 1) + INTERVAL '1 month')"
-        else:
-            date_filter = f"p.ped_data >= make_date(:ano, 1, 1) AND p.ped_data <= make_date(:ano, 12, 31)"
+    inicio, fim = resolve_periodo(ano, mes, startDate, endDate)
+    itens_src, pedidos_src, params = fontes_vendas(inicio, fim)
     
     query = f"""
         WITH vendas_industria AS (
@@ -36,18 +32,21 @@ def fetch_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', l
                 f.for_codigo as codigo,
                 f.for_nomered as nome,
                 f.for_homepage as imagem_url,
-                SUM(i.ite_totliquido) as total_vendas,
-                SUM(i.ite_quant) as total_quantidade,
-                COUNT(DISTINCT i.ite_idproduto) as total_unidades,
-                COUNT(DISTINCT p.ped_pedido) as total_pedidos
-            FROM pedidos p
-            JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
-            JOIN fornecedores f ON p.ped_industria = f.for_codigo
-            WHERE {date_filter}
-              AND p.ped_situacao IN ('P', 'F')
+                SUM(v.valor) as total_vendas,
+                SUM(v.quantidade) as total_quantidade,
+                COUNT(DISTINCT v.produto) as total_unidades
+            FROM ({itens_src}) v
+            JOIN fornecedores f ON v.industria = f.for_codigo
+            WHERE v.situacao IN ('P', 'F')
               AND f.for_tipo2 = 'A'
             GROUP BY f.for_codigo, f.for_nomered, f.for_homepage
         ),
+        pedidos_industria AS (
+            SELECT industria, SUM(pedidos) as total_pedidos
+            FROM ({pedidos_src}) pd
+            WHERE pd.situacao IN ('P', 'F')
+            GROUP BY industria
+        ),
         total_geral AS (
             SELECT SUM(total_vendas) as grand_total_vendas,
                    SUM(total_quantidade) as grand_total_quantidade
@@ -60,13 +59,14 @@ def fetch_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', l
             vi.total_vendas,
             vi.total_quantidade,
             vi.total_unidades,
-            vi.total_pedidos,
+            COALESCE(pi.total_pedidos, 0) as total_pedidos,
             CASE 
                 WHEN tg.grand_total_vendas > 0 
                 THEN ROUND((vi.total_vendas / tg.grand_total_vendas * 100)::numeric, 2)
                 ELSE 0 
             END as percentual
         FROM vendas_industria vi
+        LEFT JOIN pedidos_industria pi ON pi.industria = vi.codigo
         CROSS JOIN total_geral tg
         ORDER BY 
             CASE 
@@ -76,37 +76,25 @@ def fetch_top_industries(ano: int, mes: str = 'Todos', metrica: str = 'valor', l
             END DESC
         LIMIT :limit
     """
+    params.update({"metrica": metrica, "limit": limit})
     
     try:
-        df = execute_query(query, {"ano": ano, "metrica": metrica, "limit": limit, "startDate": startDate, "endDate": endDate})
+        df = execute_query(query, params)
         
         if df.empty:
             return []
         
         # Convert to list of dicts with ranking
-        result = []
-        for idx, row in df.iterrows():
-            try:
-                # Use pd.to_numeric or safe defaults
-                total_vendas = float(row.get('total_vendas', 0) if pd.notna(row.get('total_vendas')) else 0)
-                total_quantidade = float(row.get('total_quantidade', 0) if pd.notna(row.get('total_quantidade')) else 0)
-                total_unidades = int(row.get('total_unidades', 0) if pd.notna(row.get('total_unidades')) else 0)
-                total_pedidos = int(row.get('total_pedidos', 0) if pd.notna(row.get('total_pedidos')) else 0)
-                
-                result.append({
-                    "codigo": int(row['codigo']) if pd.notna(row.get('codigo')) else 0,
-                    "nome": row.get('nome', 'N/A'),
-                    "imagem_url": row.get('imagem_url') if pd.notna(row.get('imagem_url')) else None,
-                    "total_vendas": total_vendas,
-                    "total_quantidade": total_quantidade,
-                    "total_unidades": total_unidades,
-                    "total_pedidos": total_pedidos,
-                    "percentual": float(row.get('percentual', 0) if pd.notna(row.get('percentual')) else 0.0),
-                    "ranking": idx + 1
-                })
-            except Exception as e:
-                print(f"⚠️ [TOP INDUSTRIES] Error processing row {idx}: {e}", flush=True)
-                continue
+        df['ranking'] = range(1, len(df) + 1)
+        result = records(
+            df,
+            columns=["codigo", "nome", "imagem_url", "total_vendas", "total_quantidade",
+                     "total_unidades", "total_pedidos", "percentual", "ranking"],
+            types={"codigo": "int", "total_vendas": "float", "total_quantidade": "float",
+                   "total_unidades": "int", "total_pedidos": "int", "percentual": "float"},
+            fill={"codigo": 0, "total_vendas": 0.0, "total_quantidade": 0.0,
+                  "total_unidades": 0, "total_pedidos": 0, "percentual": 0.0}
+        )
         
         return result
         
@@ -0,0 +1,186 @@
+"""
+Service: Cubo de Vendas
+Agregados de vendas (período × indústria × cliente × vendedor × produto) lidos
+do cubo diário `bi_fato_vendas_diario` / `bi_fato_pedidos_diario`
+(sql/bi_fato_vendas_diario.sql) em vez de varrer pedidos + itens_ped.
+
+Dias ainda não consolidados (>= atualizado_ate, normalmente só hoje) são
+lidos direto das tabelas de origem, então o resultado é sempre completo.
+Sem o cubo no schema do tenant (ou com BI_FATO_VENDAS=off) tudo vem da origem.
+"""
+from datetime import date
+
+from config import BI_FATO_VENDAS
+from services.database import execute_rows, execute_scalar_row
+from utils.cache import bi_cache
+
+SITUACOES_VENDA = ('P', 'F')
+
+# Dimensões aceitas em group_by -> expressão sobre as colunas do cubo
+DIMENSOES = {
+    "dia": "dia",
+    "mes": "date_trunc('month', dia)::date",
+    "ano": "EXTRACT(YEAR FROM dia)::int",
+    "industria": "industria",
+    "cliente": "cliente",
+    "vendedor": "vendedor",
+    "produto": "produto",
+}
+
+# Grão de item: origem com as mesmas colunas do cubo
+_ITENS_ORIGEM = """
+    SELECT p.ped_data AS dia, p.ped_industria AS industria, p.ped_cliente AS cliente,
+           p.ped_vendedor AS vendedor, i.ite_idproduto AS produto,
+           COALESCE(p.ped_situacao, '') AS situacao,
+           i.ite_totliquido AS valor, i.ite_quant AS quantidade, 1 AS itens
+    FROM pedidos p
+    JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
+    WHERE p.ped_data >= {inicio} AND p.ped_data < {fim}
+"""
+
+# Grão de pedido: só pedidos com itens (mesma semântica do JOIN dos dashboards)
+_PEDIDOS_ORIGEM = """
+    SELECT p.ped_data AS dia, p.ped_industria AS industria, p.ped_cliente AS cliente,
+           p.ped_vendedor AS vendedor, COALESCE(p.ped_situacao, '') AS situacao,
+           1 AS pedidos, p.ped_totliq AS valor_pedidos
+    FROM pedidos p
+    WHERE p.ped_data >= {inicio} AND p.ped_data < {fim}
+      AND EXISTS (
+          SELECT 1 FROM itens_ped i
+          WHERE i.ite_pedido = p.ped_pedido AND i.ite_industria = p.ped_industria
+      )
+"""
+
+_ITENS_CUBO = """
+    SELECT dia, industria, cliente, vendedor, produto, situacao, valor, quantidade, itens
+    FROM bi_fato_vendas_diario
+    WHERE dia >= :inicio AND dia < LEAST(:fim, :watermark)
+"""
+
+_PEDIDOS_CUBO = """
+    SELECT dia, industria, cliente, vendedor, situacao, pedidos, valor_pedidos
+    FROM bi_fato_pedidos_diario
+    WHERE dia >= :inicio AND dia < LEAST(:fim, :watermark)
+"""
+
+
+def _load_watermark():
+    """Data até onde o cubo está consolidado no schema do tenant (ou None)"""
+    exists = execute_scalar_row("SELECT to_regclass('bi_fato_vendas_controle') IS NOT NULL AS existe")
+    if not exists or not exists["existe"]:
+        return None
+    row = execute_scalar_row(
+        "SELECT atualizado_ate FROM bi_fato_vendas_controle WHERE tabela = 'bi_fato_vendas_diario'"
+    )
+    return row["atualizado_ate"] if row else None
+
+
+def get_watermark():
+    """Watermark do cubo do tenant atual, cacheado por 1 minuto. None = sem cubo."""
+    if BI_FATO_VENDAS == "off":
+        return None
+    # False é cacheável (None não distingue "sem cubo" de miss)
+    watermark = bi_cache.get_or_compute("cube_watermark", (), lambda: _load_watermark() or False, ttl=60)
+    return watermark or None
+
+
+def fontes_vendas(inicio: date, fim: date):
+    """
+    Subqueries SQL (itens, pedidos) e parâmetros para o período [inicio, fim).
+
+    itens:   dia, industria, cliente, vendedor, produto, situacao, valor, quantidade, itens
+    pedidos: dia, industria, cliente, vendedor, situacao, pedidos, valor_pedidos
+    Usar como `FROM (<itens>) v` em queries próprias dos services.
+    """
+    params = {"inicio": inicio, "fim": fim}
+    watermark = get_watermark()
+    if watermark is None or inicio >= watermark:
+        itens = _ITENS_ORIGEM.format(inicio=":inicio", fim=":fim")
+        pedidos = _PEDIDOS_ORIGEM.format(inicio=":inicio", fim=":fim")
+        return itens, pedidos, params
+
+    params["watermark"] = watermark
+    itens = _ITENS_CUBO
+    pedidos = _PEDIDOS_CUBO
+    if fim > watermark:
+        # Cauda não consolidada (hoje) direto da origem
+        inicio_cauda = "GREATEST(:inicio, :watermark)"
+        itens += " UNION ALL " + _ITENS_ORIGEM.format(inicio=inicio_cauda, fim=":fim")
+        pedidos += " UNION ALL " + _PEDIDOS_ORIGEM.format(inicio=inicio_cauda, fim=":fim")
+    return itens, pedidos, params
+
+
+def fetch_vendas_agregadas(inicio: date, fim: date, group_by=(), industria: int = None,
+                           cliente: int = None, vendedor: int = None, situacoes=SITUACOES_VENDA):
+    """
+    Agregados de vendas no período half-open [inicio, fim).
+
+    Retorna lista de dicts com as dimensões de `group_by` e as medidas:
+    valor, quantidade, itens, clientes, produtos e (sem 'produto' no
+    group_by) pedidos / valor_pedidos.
+    """
+    for dim in group_by:
+        if dim not in DIMENSOES:
+            raise ValueError(f"Dimensão inválida: {dim}")
+
+    itens_src, pedidos_src, params = fontes_vendas(inicio, fim)
+
+    filtros = ["situacao IN (" + ", ".join(f"'{s}'" for s in situacoes) + ")"]
+    if industria:
+        filtros.append("industria = :industria")
+        params["industria"] = industria
+    if cliente:
+        filtros.append("cliente = :cliente")
+        params["cliente"] = cliente
+    if vendedor:
+        filtros.append("vendedor = :vendedor")
+        params["vendedor"] = vendedor
+    where = " AND ".join(filtros)
+
+    dims_select = ", ".join(f"{DIMENSOES[d]} AS {d}" for d in group_by)
+    group = f"GROUP BY {', '.join(str(n) for n in range(1, len(group_by) + 1))}" if group_by else ""
+    prefix = dims_select + ", " if group_by else ""
+
+    itens_q = f"""
+        SELECT {prefix}
+               COALESCE(SUM(valor), 0) AS valor,
+               COALESCE(SUM(quantidade), 0) AS quantidade,
+               COALESCE(SUM(itens), 0) AS itens,
+               COUNT(DISTINCT cliente) AS clientes,
+               COUNT(DISTINCT produto) AS produtos
+        FROM ({itens_src}) f
+        WHERE {where}
+        {group}
+    """
+
+    if "produto" in group_by:
+        query = itens_q
+    else:
+        pedidos_q = f"""
+            SELECT {prefix}
+                   COALESCE(SUM(pedidos), 0) AS pedidos,
+                   COALESCE(SUM(valor_pedidos), 0) AS valor_pedidos
+            FROM ({pedidos_src}) f
+            WHERE {where}
+            {group}
+        """
+        if group_by:
+            using = ", ".join(group_by)
+            query = f"""
+                SELECT a.*, COALESCE(b.pedidos, 0) AS pedidos, COALESCE(b.valor_pedidos, 0) AS valor_pedidos
+                FROM ({itens_q}) a
+                LEFT JOIN ({pedidos_q}) b USING ({using})
+                ORDER BY {using}
+            """
+        else:
+            query = f"SELECT a.*, b.pedidos, b.valor_pedidos FROM ({itens_q}) a CROSS JOIN ({pedidos_q}) b"
+
+    return execute_rows(query, params)
+
+
+def fetch_vendas_totais(inicio: date, fim: date, industria: int = None, cliente: int = None, vendedor: int = None):
+    """Totais do período [inicio, fim) numa única linha (dict)"""
+    rows = fetch_vendas_agregadas(inicio, fim, industria=industria, cliente=cliente, vendedor=vendedor)
+    if rows:
+        return rows[0]
+    return {"valor": 0, "quantidade": 0, "itens": 0, "clientes": 0, "produtos": 0, "pedidos": 0, "valor_pedidos": 0}
@@ -0,0 +1,212 @@
+-- =====================================================
+-- CUBO DIÁRIO DE VENDAS (BI)
+-- Pré-agregação de pedidos + itens_ped por
+-- dia × indústria × cliente × vendedor × produto × situação,
+-- com refresh incremental (watermark + dias alterados).
+--
+-- Aplicar em cada schema/tenant:  python create_fato_vendas.py
+-- Atualizar (cron, ~5 min):       python create_fato_vendas.py --refresh
+-- =====================================================
+
+-- 1. Fato no grão de ITEM (valor, quantidade, linhas)
+CREATE TABLE IF NOT EXISTS bi_fato_vendas_diario (
+    dia         DATE        NOT NULL,
+    industria   INTEGER     NOT NULL,
+    cliente     INTEGER     NOT NULL,
+    vendedor    INTEGER     NOT NULL,
+    produto     INTEGER     NOT NULL,
+    situacao    VARCHAR(1)  NOT NULL,
+    valor       DOUBLE PRECISION NOT NULL DEFAULT 0,
+    quantidade  DOUBLE PRECISION NOT NULL DEFAULT 0,
+    itens       INTEGER     NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, industria, cliente, vendedor, produto, situacao)
+);
+CREATE INDEX IF NOT EXISTS idx_bi_fato_vendas_industria_dia ON bi_fato_vendas_diario (industria, dia);
+CREATE INDEX IF NOT EXISTS idx_bi_fato_vendas_cliente_dia ON bi_fato_vendas_diario (cliente, dia);
+CREATE INDEX IF NOT EXISTS idx_bi_fato_vendas_vendedor_dia ON bi_fato_vendas_diario (vendedor, dia);
+
+-- 2. Fato no grão de PEDIDO (contagem de pedidos é aditiva aqui,
+--    já que cada pedido tem um único dia/indústria/cliente/vendedor)
+CREATE TABLE IF NOT EXISTS bi_fato_pedidos_diario (
+    dia           DATE        NOT NULL,
+    industria     INTEGER     NOT NULL,
+    cliente       INTEGER     NOT NULL,
+    vendedor      INTEGER     NOT NULL,
+    situacao      VARCHAR(1)  NOT NULL,
+    pedidos       INTEGER     NOT NULL DEFAULT 0,
+    valor_pedidos DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, industria, cliente, vendedor, situacao)
+);
+CREATE INDEX IF NOT EXISTS idx_bi_fato_pedidos_industria_dia ON bi_fato_pedidos_diario (industria, dia);
+
+-- 3. Controle: dias < atualizado_ate estão consolidados no cubo;
+--    dias >= atualizado_ate são lidos direto de pedidos/itens_ped
+CREATE TABLE IF NOT EXISTS bi_fato_vendas_controle (
+    tabela          VARCHAR(60) PRIMARY KEY,
+    atualizado_ate  DATE,
+    atualizado_em   TIMESTAMP,
+    dias_processados INTEGER
+);
+
+-- 4. Dias alterados após a consolidação (pedidos não têm coluna de
+--    última alteração; os triggers abaixo fazem esse papel)
+CREATE TABLE IF NOT EXISTS bi_fato_vendas_dias_alterados (
+    dia DATE PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION fn_bi_fato_marca_dias_pedidos()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO bi_fato_vendas_dias_alterados (dia)
+        SELECT DISTINCT ped_data FROM old_rows WHERE ped_data IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        INSERT INTO bi_fato_vendas_dias_alterados (dia)
+        SELECT DISTINCT ped_data FROM new_rows WHERE ped_data IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION fn_bi_fato_marca_dias_itens()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO bi_fato_vendas_dias_alterados (dia)
+        SELECT DISTINCT p.ped_data
+        FROM old_rows o
+        JOIN pedidos p ON p.ped_pedido = o.ite_pedido AND p.ped_industria = o.ite_industria
+        WHERE p.ped_data IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        INSERT INTO bi_fato_vendas_dias_alterados (dia)
+        SELECT DISTINCT p.ped_data
+        FROM new_rows n
+        JOIN pedidos p ON p.ped_pedido = n.ite_pedido AND p.ped_industria = n.ite_industria
+        WHERE p.ped_data IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Triggers por statement (transition tables: 1 INSERT por comando, não por linha)
+DROP TRIGGER IF EXISTS trg_bi_fato_pedidos_ins ON pedidos;
+DROP TRIGGER IF EXISTS trg_bi_fato_pedidos_upd ON pedidos;
+DROP TRIGGER IF EXISTS trg_bi_fato_pedidos_del ON pedidos;
+CREATE TRIGGER trg_bi_fato_pedidos_ins AFTER INSERT ON pedidos
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_pedidos();
+CREATE TRIGGER trg_bi_fato_pedidos_upd AFTER UPDATE ON pedidos
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_pedidos();
+CREATE TRIGGER trg_bi_fato_pedidos_del AFTER DELETE ON pedidos
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_pedidos();
+
+DROP TRIGGER IF EXISTS trg_bi_fato_itens_ins ON itens_ped;
+DROP TRIGGER IF EXISTS trg_bi_fato_itens_upd ON itens_ped;
+DROP TRIGGER IF EXISTS trg_bi_fato_itens_del ON itens_ped;
+CREATE TRIGGER trg_bi_fato_itens_ins AFTER INSERT ON itens_ped
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_itens();
+CREATE TRIGGER trg_bi_fato_itens_upd AFTER UPDATE ON itens_ped
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_itens();
+CREATE TRIGGER trg_bi_fato_itens_del AFTER DELETE ON itens_ped
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_bi_fato_marca_dias_itens();
+
+-- 5. Refresh incremental
+-- Reagrega: dias >= watermark anterior (inclui hoje) + dias marcados como
+-- alterados. p_full = TRUE reconstrói tudo.
+CREATE OR REPLACE FUNCTION fn_bi_fato_vendas_refresh(p_full BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_watermark DATE;
+    v_hoje DATE := CURRENT_DATE;
+    v_dias INTEGER;
+BEGIN
+    -- Um refresh por vez por schema
+    PERFORM pg_advisory_xact_lock(hashtext(current_schema() || '.bi_fato_vendas_diario'));
+
+    SELECT atualizado_ate INTO v_watermark
+    FROM bi_fato_vendas_controle
+    WHERE tabela = 'bi_fato_vendas_diario';
+
+    DROP TABLE IF EXISTS tmp_bi_fato_dias;
+    CREATE TEMP TABLE tmp_bi_fato_dias (dia DATE PRIMARY KEY) ON COMMIT DROP;
+
+    IF p_full OR v_watermark IS NULL THEN
+        TRUNCATE bi_fato_vendas_diario, bi_fato_pedidos_diario;
+        INSERT INTO tmp_bi_fato_dias
+        SELECT DISTINCT ped_data FROM pedidos WHERE ped_data IS NOT NULL AND ped_data < v_hoje;
+        DELETE FROM bi_fato_vendas_dias_alterados;
+    ELSE
+        -- Captura e consome os dias alterados (novas marcações durante o
+        -- refresh permanecem para a próxima rodada)
+        WITH consumidos AS (
+            DELETE FROM bi_fato_vendas_dias_alterados
+            WHERE dia < v_hoje
+            RETURNING dia
+        )
+        INSERT INTO tmp_bi_fato_dias
+        SELECT dia FROM consumidos
+        UNION
+        SELECT d::DATE FROM generate_series(v_watermark, v_hoje - 1, INTERVAL '1 day') d
+        ON CONFLICT DO NOTHING;
+
+        DELETE FROM bi_fato_vendas_diario f USING tmp_bi_fato_dias t WHERE f.dia = t.dia;
+        DELETE FROM bi_fato_pedidos_diario f USING tmp_bi_fato_dias t WHERE f.dia = t.dia;
+    END IF;
+
+    INSERT INTO bi_fato_vendas_diario (dia, industria, cliente, vendedor, produto, situacao, valor, quantidade, itens)
+    SELECT
+        p.ped_data,
+        p.ped_industria,
+        p.ped_cliente,
+        p.ped_vendedor,
+        i.ite_idproduto,
+        COALESCE(p.ped_situacao, ''),
+        COALESCE(SUM(i.ite_totliquido), 0),
+        COALESCE(SUM(i.ite_quant), 0),
+        COUNT(*)
+    FROM pedidos p
+    JOIN itens_ped i ON p.ped_pedido = i.ite_pedido AND p.ped_industria = i.ite_industria
+    JOIN tmp_bi_fato_dias t ON t.dia = p.ped_data
+    GROUP BY 1, 2, 3, 4, 5, 6;
+
+    -- Só pedidos com itens (mesma semântica do JOIN usado nos dashboards)
+    INSERT INTO bi_fato_pedidos_diario (dia, industria, cliente, vendedor, situacao, pedidos, valor_pedidos)
+    SELECT
+        p.ped_data,
+        p.ped_industria,
+        p.ped_cliente,
+        p.ped_vendedor,
+        COALESCE(p.ped_situacao, ''),
+        COUNT(*),
+        COALESCE(SUM(p.ped_totliq), 0)
+    FROM pedidos p
+    JOIN tmp_bi_fato_dias t ON t.dia = p.ped_data
+    WHERE EXISTS (
+        SELECT 1 FROM itens_ped i
+        WHERE i.ite_pedido = p.ped_pedido AND i.ite_industria = p.ped_industria
+    )
+    GROUP BY 1, 2, 3, 4, 5;
+
+    SELECT COUNT(*) INTO v_dias FROM tmp_bi_fato_dias;
+
+    INSERT INTO bi_fato_vendas_controle (tabela, atualizado_ate, atualizado_em, dias_processados)
+    VALUES ('bi_fato_vendas_diario', v_hoje, NOW(), v_dias)
+    ON CONFLICT (tabela) DO UPDATE
+        SET atualizado_ate = EXCLUDED.atualizado_ate,
+            atualizado_em = EXCLUDED.atualizado_em,
+            dias_processados = EXCLUDED.dias_processados;
+
+    RETURN v_dias;
+END;
+$$;
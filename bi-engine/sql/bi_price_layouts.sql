@@ -0,0 +1,22 @@
+-- =====================================================
+-- LAYOUTS CONHECIDOS DE TABELAS DE PREÇO (BI)
+-- Mapeamento de colunas aceito numa importação, indexado pela
+-- impressão digital do cabeçalho (services/price_layouts.py).
+-- Uploads seguintes com o mesmo layout não passam pela IA.
+--
+-- Aplicar em cada schema/tenant:  python create_price_layouts.py
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS bi_price_layouts (
+    fingerprint     VARCHAR(40)  NOT NULL,   -- sha1(aba, nº de colunas, células do cabeçalho)
+    industria       INTEGER      NOT NULL,
+    sheet_name      VARCHAR(100),
+    header_row      INTEGER      NOT NULL,
+    data_start_row  INTEGER      NOT NULL,
+    mapping         JSONB        NOT NULL,   -- {campo: índice da coluna}
+    usos            INTEGER      NOT NULL DEFAULT 1,
+    criado_em       TIMESTAMP    NOT NULL DEFAULT now(),
+    atualizado_em   TIMESTAMP    NOT NULL DEFAULT now(),
+    PRIMARY KEY (fingerprint, industria)
+);
+CREATE INDEX IF NOT EXISTS idx_bi_price_layouts_fingerprint ON bi_price_layouts (fingerprint, atualizado_em DESC);
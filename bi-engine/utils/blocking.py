@@ -0,0 +1,146 @@
+"""
+Execução de código bloqueante (queries, pandas, OpenAI) fora do event loop.
+
+Todas as rotas são `async def`; chamar `execute_query` direto nelas trava o
+worker inteiro enquanto a query roda. `run_blocking` manda a função para um
+thread-pool limitado, com um teto de tarefas simultâneas por tenant para que
+um tenant com análises pesadas não ocupe todas as threads.
+
+`run_coalesced` é o mesmo caminho com coalescência: requisições simultâneas
+idênticas (mesmo tenant, função e argumentos) aguardam uma única execução.
+
+"Tenant" aqui é a identidade do banco (get_tenant_key: CNPJ, engine e schema),
+não só o CNPJ: requisições sem CNPJ de bancos diferentes não dividem vaga nem
+resultado.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_EXECUTOR_WORKERS, DB_TENANT_CONCURRENCY
+from utils.tenant_context import get_tenant_key, hold_tenant_engine
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="bi-db")
+_tenant_slots = {}
+# (tenant, função, args) -> Task em andamento; contadores por função
+_in_flight = {}
+_coalesce_stats = {}
+
+
+def _slot_idle(slot: asyncio.Semaphore) -> bool:
+    return slot._value == DB_TENANT_CONCURRENCY and not slot._waiters
+
+
+def _get_tenant_slot(tenant_id) -> asyncio.Semaphore:
+    """Semáforo que limita quantas tarefas do tenant rodam ao mesmo tempo"""
+    slot = _tenant_slots.get(tenant_id)
+    if slot is None:
+        # Tenant novo: descarta os semáforos ociosos (sem tarefa nem fila) para o
+        # dicionário não crescer com todo tenant já visto pelo worker
+        for idle in [t for t, s in _tenant_slots.items() if _slot_idle(s)]:
+            del _tenant_slots[idle]
+        slot = asyncio.Semaphore(DB_TENANT_CONCURRENCY)
+        _tenant_slots[tenant_id] = slot
+    return slot
+
+
+def _thread_done(loop, slot, release, _future):
+    """Fim da thread (não da espera): devolve a vaga do tenant e o lease do engine"""
+    release()
+    try:
+        loop.call_soon_threadsafe(slot.release)
+    except RuntimeError:
+        pass  # loop já encerrado (shutdown)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Executa `func(*args, **kwargs)` no pool de threads do BI e aguarda o resultado.
+
+    O contexto (engine e CNPJ do tenant) é copiado para a thread, então
+    `execute_query` continua enxergando o banco do tenant da requisição; o
+    engine fica com lease no registry enquanto a thread roda.
+    """
+    slot = _get_tenant_slot(get_tenant_key())
+    await slot.acquire()
+    # Vaga e lease no engine ficam presos até a thread terminar: se quem aguarda
+    # for cancelado (cliente desconectou), a query continua contando no teto
+    release = hold_tenant_engine()
+    try:
+        ctx = contextvars.copy_context()
+        future = _executor.submit(ctx.run, func, *args, **kwargs)
+    except BaseException:
+        release()
+        slot.release()
+        raise
+    future.add_done_callback(functools.partial(_thread_done, asyncio.get_running_loop(), slot, release))
+    return await asyncio.wrap_future(future)
+
+
+async def run_coalesced(func, *args):
+    """
+    `run_blocking` para cálculos somente leitura (dashboards, insights):
+    enquanto uma chamada com o mesmo tenant, função e argumentos estiver em
+    andamento, as seguintes aguardam o mesmo resultado em vez de ocupar outra
+    thread / vaga do tenant. O resultado é compartilhado: quem recebe não deve alterá-lo.
+    """
+    name = func.__qualname__
+    key = (get_tenant_key(), func.__module__, name, args)
+    stats = _coalesce_stats.setdefault(name, {"calls": 0, "coalesced": 0})
+    stats["calls"] += 1
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(run_blocking(func, *args))
+        _in_flight[key] = task
+        task.add_done_callback(functools.partial(_flight_done, key))
+    else:
+        stats["coalesced"] += 1
+    # shield: cliente que desconecta cancela só a própria espera, não o cálculo dos outros
+    return await asyncio.shield(task)
+
+
+def _flight_done(key, task):
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    if not task.cancelled():
+        task.exception()  # marca como lida mesmo se todos os aguardantes desistiram
+
+
+async def iterate_blocking(iterator):
+    """
+    Consome um iterador bloqueante (ex.: services.database.stream_rows) no pool
+    do BI, um item por vez, sem segurar a vaga do tenant entre os itens.
+    """
+    done = object()
+    try:
+        while True:
+            item = await run_blocking(next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_blocking(close)
+
+
+def get_executor_stats():
+    """Snapshot da ocupação do pool (para diagnóstico)"""
+    return {
+        "workers": DB_EXECUTOR_WORKERS,
+        "tenant_concurrency": DB_TENANT_CONCURRENCY,
+        "queued": _executor._work_queue.qsize(),
+        "tenants": [
+            {"cnpj": cnpj, "schema": schema, "running": DB_TENANT_CONCURRENCY - slot._value}
+            for (cnpj, _, schema), slot in _tenant_slots.items()
+        ],
+        "in_flight": len(_in_flight),
+        "coalescing": get_coalesce_stats(),
+    }
+
+
+def get_coalesce_stats():
+    """Chamadas e chamadas coalescidas (atendidas por um cálculo já em andamento) por função"""
+    return {name: dict(stats) for name, stats in _coalesce_stats.items()}
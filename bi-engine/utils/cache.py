@@ -0,0 +1,417 @@
+"""
+Cache unificado do BI.
+
+Substitui os dicts soltos de cada service por um único cache com:
+- LRU + TTL (entradas expiram e as menos usadas saem primeiro)
+- orçamento de memória (CACHE_MAX_MB) além do limite de entradas
+- namespace por tenant (CNPJ), para nunca misturar dados de empresas
+- single-flight: requisições simultâneas pela mesma chave esperam o
+  primeiro cálculo em vez de bater no banco N vezes
+- contadores de hit/miss/eviction por região (faturamento, full_tab, ...)
+
+O armazenamento é plugável (CACHE_BACKEND):
+- "memory": dict LRU no próprio processo (padrão)
+- "redis": compartilhado entre workers uvicorn, via protocolo Redis
+
+Uso típico:
+    from utils.cache import bi_cache
+    df = bi_cache.get_or_compute("faturamento", (ano,), lambda: execute_query(...))
+"""
+import copy
+import functools
+import hashlib
+import hmac
+import pickle
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+import pandas as pd
+
+from config import (
+    CACHE_DEFAULT_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_MB, CACHE_BACKEND, REDIS_URL, CACHE_REDIS_PREFIX, CACHE_REDIS_SECRET,
+)
+from utils.tenant_context import get_tenant_cnpj
+
+MISSING = object()
+
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """Estimativa (barata) de bytes ocupados por um valor cacheado"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return size + sum(estimate_size(v, _depth + 1) for v in value)
+    return size
+
+
+# --- Serialização (backends externos) ----------------------------------------
+# pickle protocolo 5 (DataFrames saem como buffers numpy, sem passar por JSON)
+# + zlib rápido quando compensa. 1 byte de cabeçalho indica o formato, seguido
+# do HMAC-SHA256 (cabeçalho + payload) com a chave do cache: pickle.loads
+# executa código, então só desserializa o que um worker do BI assinou (quem
+# só tem acesso de escrita ao Redis não consegue forjar um valor).
+
+_RAW = b"p"
+_ZLIB = b"z"
+_MAC_SIZE = hashlib.sha256().digest_size
+_COMPRESS_MIN_BYTES = 1024
+
+
+class InvalidSignature(ValueError):
+    """Valor do backend externo sem assinatura válida (não é desserializado)"""
+
+
+def _mac(secret: bytes, header: bytes, payload: bytes) -> bytes:
+    return hmac.new(secret, header + payload, hashlib.sha256).digest()
+
+
+def dumps(value, secret: bytes) -> bytes:
+    header, payload = _RAW, pickle.dumps(value, protocol=5)
+    if len(payload) >= _COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 1)
+        if len(compressed) < len(payload):
+            header, payload = _ZLIB, compressed
+    return header + _mac(secret, header, payload) + payload
+
+
+def loads(data: bytes, secret: bytes):
+    header, mac, payload = data[:1], data[1:1 + _MAC_SIZE], data[1 + _MAC_SIZE:]
+    if header not in (_RAW, _ZLIB) or not hmac.compare_digest(mac, _mac(secret, header, payload)):
+        raise InvalidSignature("assinatura inválida")
+    if header == _ZLIB:
+        payload = zlib.decompress(payload)
+    return pickle.loads(payload)
+
+
+# --- Backends ----------------------------------------------------------------
+# full_key = (tenant, region, key_tuple)
+
+class CacheBackend:
+    """Interface de armazenamento do BICache"""
+    name = "base"
+
+    def get(self, full_key):
+        """Retorna o valor ou MISSING (inclusive se expirado)"""
+        raise NotImplementedError
+
+    def set(self, full_key, value, ttl: int):
+        raise NotImplementedError
+
+    def clear(self, tenant_id: str = None, region: str = None):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Dict LRU + TTL no próprio processo, com limite de entradas e de bytes.
+
+    Guarda e devolve cópias (como o Redis, que serializa): quem altera o dict /
+    DataFrame recebido não muda o valor dos próximos hits.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        # full_key -> (expires_at, size, value); ordem = LRU (mais antigo primeiro)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.evictions = defaultdict(int)
+        self.expired = defaultdict(int)
+
+    def get(self, full_key):
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                return MISSING
+            expires_at, _, value = entry
+            if expires_at <= time.time():
+                self._remove(full_key)
+                self.expired[full_key[1]] += 1
+                return MISSING
+            self._entries.move_to_end(full_key)
+        return copy.deepcopy(value)
+
+    def set(self, full_key, value, ttl: int):
+        value = copy.deepcopy(value)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # Maior que o orçamento inteiro: não vale a pena guardar
+            return
+        with self._lock:
+            if full_key in self._entries:
+                self._remove(full_key)
+            self._entries[full_key] = (time.time() + ttl, size, value)
+            self._bytes += size
+            self._evict()
+
+    def _remove(self, full_key):
+        _, size, _ = self._entries.pop(full_key)
+        self._bytes -= size
+
+    def _evict(self):
+        """Remove os menos usados até caber no limite de entradas e no orçamento"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            full_key = next(iter(self._entries))
+            self._remove(full_key)
+            self.evictions[full_key[1]] += 1
+
+    def clear(self, tenant_id: str = None, region: str = None):
+        with self._lock:
+            if tenant_id is None and region is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for full_key in [k for k in self._entries
+                             if (tenant_id is None or k[0] == tenant_id) and (region is None or k[1] == region)]:
+                self._remove(full_key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "tenants": len({k[0] for k in self._entries})
+            }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Backend compartilhado via protocolo Redis (Redis, KeyDB, fakeredis...).
+
+    TTL e eviction ficam a cargo do servidor (configure maxmemory-policy
+    allkeys-lru). Chave: "<prefix>:<tenant>:<region>:<hash dos args>".
+    Falhas de rede viram miss: o BI continua funcionando sem cache.
+    Valores são assinados com `secret` (CACHE_REDIS_SECRET); sem assinatura
+    válida viram miss e não são desserializados.
+    """
+    name = "redis"
+
+    def __init__(self, client=None, url: str = REDIS_URL, prefix: str = CACHE_REDIS_PREFIX,
+                 secret: str = CACHE_REDIS_SECRET):
+        if not secret:
+            raise ValueError("CACHE_REDIS_SECRET não configurado")
+        if client is None:
+            import redis  # dependência opcional
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.errors = 0
+        self.rejected = 0
+
+    def _redis_key(self, full_key) -> str:
+        tenant_id, region, key = full_key
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24]
+        return f"{self.prefix}:{tenant_id}:{region}:{digest}"
+
+    def get(self, full_key):
+        try:
+            data = self.client.get(self._redis_key(full_key))
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ [CACHE] Redis get falhou: {e}", flush=True)
+            return MISSING
+        if data is None:
+            return MISSING
+        try:
+            return loads(data, self.secret)
+        except InvalidSignature:
+            self.rejected += 1
+            print(f"⚠️ [CACHE] Valor sem assinatura válida ignorado: {self._redis_key(full_key)}", flush=True)
+            return MISSING
+
+    def set(self, full_key, value, ttl: int):
+        try:
+            self.client.set(self._redis_key(full_key), dumps(value, self.secret), ex=max(1, int(ttl)))
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ [CACHE] Redis set falhou: {e}", flush=True)
+
+    def clear(self, tenant_id: str = None, region: str = None):
+        pattern = f"{self.prefix}:{tenant_id or '*'}:{region or '*'}:*"
+        try:
+            batch = []
+            for redis_key in self.client.scan_iter(match=pattern, count=500):
+                batch.append(redis_key)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ [CACHE] Redis clear falhou: {e}", flush=True)
+
+    def stats(self):
+        return {"prefix": self.prefix, "errors": self.errors, "rejected": self.rejected}
+
+
+def create_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """Instancia o backend configurado; sem Redis disponível cai para memória"""
+    if kind == "redis":
+        try:
+            backend = RedisBackend()
+            backend.client.ping()
+            print(f"--- CACHE: Redis backend ({REDIS_URL.split('@')[-1]}) ---", flush=True)
+            return backend
+        except Exception as e:
+            print(f"⚠️ [CACHE] Redis indisponível ({e}), usando cache em memória", flush=True)
+    return MemoryBackend()
+
+
+# --- Cache -------------------------------------------------------------------
+
+class _Flight:
+    """Cálculo em andamento para uma chave (single-flight)"""
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class BICache:
+    def __init__(self, backend: CacheBackend = None, default_ttl: int = CACHE_DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "coalesced": 0})
+
+    # --- chaves ---
+
+    @staticmethod
+    def _namespace(tenant_id: str = None) -> str:
+        return tenant_id or get_tenant_cnpj() or "default"
+
+    def _full_key(self, region: str, key, tenant_id: str = None):
+        if not isinstance(key, tuple):
+            key = (key,)
+        return (self._namespace(tenant_id), region, key)
+
+    # --- operações básicas ---
+
+    def get(self, region: str, key, tenant_id: str = None, default=None):
+        value = self._lookup(self._full_key(region, key, tenant_id))
+        return default if value is MISSING else value
+
+    def set(self, region: str, key, value, ttl: int = None, tenant_id: str = None):
+        self._store(self._full_key(region, key, tenant_id), value, ttl)
+
+    def _lookup(self, full_key):
+        value = self.backend.get(full_key)
+        with self._lock:
+            self._stats[full_key[1]]["misses" if value is MISSING else "hits"] += 1
+        return value
+
+    def _store(self, full_key, value, ttl: int = None):
+        self.backend.set(full_key, value, self.default_ttl if ttl is None else ttl)
+
+    # --- single-flight ---
+
+    def get_or_compute(self, region: str, key, func, ttl: int = None, tenant_id: str = None, cache_if=None):
+        """
+        Retorna o valor cacheado ou calcula com `func()`.
+
+        Chamadas simultâneas para a mesma chave aguardam o mesmo cálculo.
+        `cache_if(result)` permite não guardar resultados vazios/erros.
+        """
+        full_key = self._full_key(region, key, tenant_id)
+        value = self._lookup(full_key)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[full_key] = flight
+            else:
+                flight.waiters += 1
+                self._stats[region]["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = func()
+            flight.result = result
+            if cache_if is None or cache_if(result):
+                self._store(full_key, result, ttl)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+            flight.event.set()
+
+    # --- invalidação / métricas ---
+
+    def clear(self, tenant_id: str = None, region: str = None):
+        """
+        Limpa entradas. Sem argumentos limpa tudo; com tenant_id e/ou region
+        limpa só o que casar.
+        """
+        self.backend.clear(tenant_id=tenant_id, region=region)
+
+    def stats(self):
+        with self._lock:
+            regions = {region: dict(counters) for region, counters in self._stats.items()}
+            inflight = len(self._inflight)
+        for region, count in getattr(self.backend, "evictions", {}).items():
+            regions.setdefault(region, {"hits": 0, "misses": 0, "coalesced": 0})["evictions"] = count
+        for region, count in getattr(self.backend, "expired", {}).items():
+            regions.setdefault(region, {"hits": 0, "misses": 0, "coalesced": 0})["expired"] = count
+        hits = sum(c["hits"] for c in regions.values())
+        misses = sum(c["misses"] for c in regions.values())
+        return {
+            "backend": self.backend.name,
+            **self.backend.stats(),
+            "inflight": inflight,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "evictions": sum(c.get("evictions", 0) for c in regions.values()),
+            "regions": regions
+        }
+
+
+bi_cache = BICache(create_backend())
+
+
+def tenant_cached(region: str, ttl: int = None, cache_if=None):
+    """
+    Decorator (substituto do lru_cache) que guarda o resultado no bi_cache,
+    com TTL, no namespace do tenant da requisição e chave = argumentos.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.items()))
+            return bi_cache.get_or_compute(region, key, lambda: func(*args, **kwargs), ttl=ttl, cache_if=cache_if)
+        wrapper.cache_region = region
+        return wrapper
+    return decorator
@@ -0,0 +1,98 @@
+"""
+Setup de sessão do Postgres por conexão física.
+
+Os parâmetros (encoding, application_name, statement_timeout, search_path)
+são aplicados uma única vez, no evento "connect" do pool, num único round
+trip. As queries não mandam mais nenhum SET (antes era um SET client_encoding
+a cada execute_query, o dobro de latência em bancos remotos).
+"""
+import string
+
+from sqlalchemy import event, exc
+
+from config import DB_APPLICATION_NAME, DB_STATEMENT_TIMEOUT_MS
+
+
+def quote_ident(name: str) -> str:
+    """Identificador SQL entre aspas duplas (schema vindo do header do tenant)"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def search_path_sql(search_path: str) -> str:
+    """
+    Schema(s) do header -> lista para SET search_path, lida como o antigo
+    `-c search_path=...` da conexão: itens separados por vírgula; sem aspas
+    viram minúsculas (como identificador SQL: "RO_Consult" -> ro_consult),
+    entre aspas duplas mantêm o caso.
+    """
+    items = []
+    for item in str(search_path).split(","):
+        item = item.strip()
+        if len(item) >= 2 and item[0] == item[-1] == '"':
+            items.append(quote_ident(item[1:-1].replace('""', '"')))
+        elif item:
+            items.append(quote_ident(item.translate(_ASCII_LOWER)))
+    return ", ".join(items) or quote_ident("public")
+
+
+def session_sql(search_path: str = None) -> str:
+    """SETs da sessão num único comando"""
+    app_name = DB_APPLICATION_NAME.replace("'", "''")
+    statements = [
+        "SET client_encoding TO 'UTF8'",
+        f"SET application_name TO '{app_name}'",
+        f"SET statement_timeout TO {int(DB_STATEMENT_TIMEOUT_MS)}",
+    ]
+    if search_path:
+        statements.append(f"SET search_path TO {search_path_sql(search_path)}")
+    return "; ".join(statements)
+
+
+def install_session_setup(engine, search_path: str = None):
+    """Registra o setup de sessão no pool do engine (uma vez por conexão física)"""
+    sql = session_sql(search_path)
+
+    @event.listens_for(engine, "connect")
+    def _setup_session(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(sql)
+        cursor.close()
+        # psycopg2 abre transação implícita: sem commit o rollback do pool
+        # no primeiro checkin desfaria os SETs
+        dbapi_connection.commit()
+
+    return engine
+
+
+def install_search_path_switch(engine, get_search_path, default: str = "public"):
+    """
+    Pool compartilhado entre schemas: aplica o search_path do tenant no checkout.
+
+    `get_search_path()` devolve o schema da requisição atual (ContextVar).
+    O schema aplicado fica anotado na conexão (connection_record.info, que é
+    limpo quando a conexão é invalidada); o SET só vai ao banco quando o
+    próximo tenant usa outro schema. Todo checkout confere o schema, então
+    uma conexão devolvida pelo tenant A nunca é usada pelo B com o schema de A.
+    Checkout sem tenant no contexto volta para `default`.
+    """
+    @event.listens_for(engine, "checkout")
+    def _apply_search_path(dbapi_connection, connection_record, connection_proxy):
+        wanted = get_search_path() or default
+        if connection_record.info.get("search_path") == wanted:
+            return
+        connection_record.info.pop("search_path", None)
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET search_path TO {search_path_sql(wanted)}")
+            cursor.close()
+            if not getattr(dbapi_connection, "autocommit", False):
+                dbapi_connection.commit()
+        except Exception as e:
+            # Conexão em estado desconhecido: o pool descarta e tenta outra
+            raise exc.DisconnectionError(f"search_path não aplicado: {e}")
+        connection_record.info["search_path"] = wanted
+
+    return engine
@@ -0,0 +1,239 @@
+"""
+Execução paralela das seções de um painel (get_client_details, get_industry_details, ...).
+
+Os orquestradores já rodam dentro de run_blocking (uma thread do pool do BI);
+as seções vão para um pool próprio para não disputar threads com o chamador
+(submeter no mesmo pool pode travar quando ele está cheio). Cada seção:
+  - roda com uma cópia do contexto (engine/schema/CNPJ do tenant);
+  - respeita o teto de seções simultâneas da requisição e o do pool de
+    conexões do tenant (somando todas as requisições dele), para que alguns
+    painéis abertos ao mesmo tempo não esgotem um pool pequeno (2+2);
+  - tem timeout próprio: se estourar ou falhar, o painel sai com o valor
+    padrão daquela seção em vez de derrubar o payload inteiro.
+
+Seção que estoura o timeout tem a query cancelada no servidor
+(connection.cancel() do psycopg2, sem precisar de outra conexão do pool) e
+continua contando nos dois tetos até a thread realmente terminar. Seção que
+não consegue vaga dentro do timeout sai como "timeout" sem ter rodado.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from config import DB_EXECUTOR_WORKERS, DB_SECTION_CONCURRENCY, DB_SECTION_TIMEOUT
+from utils.tenant_context import engine_registry, get_tenant_engine, hold_tenant_engine
+
+_section_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="bi-section")
+
+# Espera máxima entre tentativas de pegar vaga no pool quando ela é liberada por outra requisição
+_SLOT_POLL = 0.05
+
+
+# --- cancelamento da query da seção -------------------------------------------
+
+class _SectionCancel:
+    """Conexão DBAPI em uso pela seção, para cancelar a query quando estoura o timeout"""
+    __slots__ = ("lock", "dbapi_connection", "cancelled")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dbapi_connection = None
+        self.cancelled = False
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            dbapi_connection = self.dbapi_connection
+        if dbapi_connection is not None:
+            try:
+                dbapi_connection.cancel()
+            except Exception as e:
+                print(f"⚠️ [sections] cancel falhou: {e}", flush=True)
+
+
+_current_section = contextvars.ContextVar("bi_section", default=None)
+
+
+def section_cancelled() -> bool:
+    """True dentro de uma seção que já estourou o timeout (não vale repetir a query)"""
+    token = _current_section.get()
+    return token is not None and token.cancelled
+
+
+@contextmanager
+def cancellable(dbapi_connection):
+    """Registra a conexão da query atual na seção (se houver) enquanto ela roda"""
+    token = _current_section.get()
+    if token is None:
+        yield
+        return
+    with token.lock:
+        if token.cancelled:
+            raise TimeoutError("seção cancelada por timeout")
+        token.dbapi_connection = dbapi_connection
+    try:
+        yield
+    finally:
+        with token.lock:
+            token.dbapi_connection = None
+
+
+def _run_section(token: _SectionCancel, func):
+    _current_section.set(token)
+    return func()
+
+
+# --- teto por pool de conexões -------------------------------------------------
+
+class _PoolSlots:
+    __slots__ = ("limit", "in_use")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+
+
+_pool_slots = {}
+_pool_lock = threading.Lock()
+
+
+def _pool_limit(engine) -> int:
+    """Seções simultâneas no engine: capacidade do pool menos uma conexão para o resto das rotas"""
+    if engine is None:
+        return DB_EXECUTOR_WORKERS
+    capacity = engine_registry.capacity(engine)
+    if capacity is None:
+        pool = engine.pool
+        capacity = pool.size() + max(0, getattr(pool, "_max_overflow", 0))
+    return max(1, min(DB_EXECUTOR_WORKERS, capacity - 1))
+
+
+def _try_acquire(engine) -> bool:
+    key = id(engine) if engine is not None else None
+    with _pool_lock:
+        slots = _pool_slots.get(key)
+        if slots is None:
+            for idle in [k for k, s in _pool_slots.items() if s.in_use == 0]:
+                del _pool_slots[idle]
+            slots = _pool_slots[key] = _PoolSlots(_pool_limit(engine))
+        if slots.in_use >= slots.limit:
+            return False
+        slots.in_use += 1
+        return True
+
+
+def _release_slot(engine):
+    key = id(engine) if engine is not None else None
+    with _pool_lock:
+        slots = _pool_slots.get(key)
+        if slots is not None:
+            slots.in_use = max(0, slots.in_use - 1)
+
+
+def _section_done(engine, release_engine, _future):
+    _release_slot(engine)
+    release_engine()
+
+
+def get_section_stats():
+    """Seções rodando por engine e o teto de cada um (para diagnóstico)"""
+    with _pool_lock:
+        return [{"limit": s.limit, "in_use": s.in_use} for s in _pool_slots.values()]
+
+
+# --- execução --------------------------------------------------------------------
+
+def run_sections(sections: dict, max_concurrency: int = DB_SECTION_CONCURRENCY, timeout: float = DB_SECTION_TIMEOUT,
+                 label: str = "sections"):
+    """
+    Executa as seções em paralelo e devolve (resultados, timings).
+
+    Args:
+        sections: {nome: (func, default)}; `func()` sem argumentos (use lambda/partial)
+        max_concurrency: seções simultâneas desta chamada
+        timeout: segundos por seção, contados a partir do início dela (ou do
+            momento em que ficou esperando vaga no pool do tenant)
+
+    resultados: {nome: valor | default}
+    timings: {nome: {"ms": float, "status": "ok" | "error" | "timeout"[, "error": str]}}
+    """
+    engine = get_tenant_engine()
+    blocked_since = None  # desde quando a próxima seção espera vaga no pool
+    pending = list(sections.items())
+    running = {}
+    orphans = set()  # estouraram o timeout e ainda não terminaram: continuam contando no teto
+    results, timings = {}, {}
+
+    def submit():
+        nonlocal blocked_since
+        orphans.difference_update([f for f in orphans if f.done()])
+        while pending and len(running) + len(orphans) < max(1, max_concurrency):
+            if not _try_acquire(engine):
+                blocked_since = blocked_since or time.monotonic()
+                return
+            blocked_since = None
+            name, (func, _) = pending.pop(0)
+            ctx = contextvars.copy_context()
+            token = _SectionCancel()
+            release_engine = hold_tenant_engine()
+            try:
+                future = _section_executor.submit(ctx.run, _run_section, token, func)
+            except BaseException:
+                _release_slot(engine)
+                release_engine()
+                raise
+            future.add_done_callback(lambda f, r=release_engine: _section_done(engine, r, f))
+            running[future] = (name, time.monotonic(), token)
+
+    def finish(name, started, status, value, error=None):
+        results[name] = value
+        timings[name] = {"ms": round((time.monotonic() - started) * 1000, 1), "status": status}
+        if error is not None:
+            timings[name]["error"] = error
+            print(f"⚠️ [{label}] {name} {status}: {error}", flush=True)
+
+    submit()
+    while running or pending:
+        now = time.monotonic()
+        deadlines = [started + timeout for _, started, _ in running.values()]
+        if blocked_since is not None:
+            # Sem vaga no pool: tenta de novo em breve (a vaga pode ser liberada por outra requisição)
+            deadlines.append(min(blocked_since + timeout, now + _SLOT_POLL))
+        wait_for = list(running) + list(orphans)
+        wait_timeout = max(0, min(deadlines) - now) if deadlines else None
+        if wait_for:
+            done, _ = wait(wait_for, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+        else:
+            done = set()
+            time.sleep(wait_timeout)
+
+        for future in done:
+            if future not in running:
+                continue
+            name, started, _ = running.pop(future)
+            try:
+                finish(name, started, "ok", future.result())
+            except Exception as e:
+                finish(name, started, "error", sections[name][1], str(e))
+
+        now = time.monotonic()
+        for future, (name, started, token) in list(running.items()):
+            if now - started >= timeout:
+                running.pop(future)
+                token.cancel()
+                if not future.cancel():
+                    orphans.add(future)
+                finish(name, started, "timeout", sections[name][1], f"timeout de {timeout}s")
+
+        if blocked_since is not None and now - blocked_since >= timeout:
+            for name, (_, default) in pending:
+                finish(name, blocked_since, "timeout", default, f"sem vaga no pool em {timeout}s")
+            pending.clear()
+            blocked_since = None
+
+        submit()
+
+    # Mantém a ordem declarada das seções no payload
+    return {name: results[name] for name in sections}, {name: timings[name] for name in sections}
@@ -0,0 +1,205 @@
+"""
+Serialização de resultados para JSON.
+
+- records(df, ...): DataFrame -> lista de dicts prontos para JSON, convertendo
+  coluna a coluna (vetorizado) em vez de df.iterrows() + float()/pd.notna por
+  célula. Trata Decimal (NUMERIC do Postgres), NaN/NaT/None, datas e tipos numpy.
+- to_jsonable(value): a mesma conversão para um valor solto.
+- FastJSONResponse: default_response_class do app; renderiza com orjson
+  quando instalado (dependência opcional) e cai para json da stdlib.
+- stream_records(...): StreamingResponse NDJSON/CSV a partir de lotes de dicts.
+- encode_cursor/decode_cursor: token opaco de paginação keyset para as tabelas da UI.
+"""
+import base64
+import csv
+import datetime
+import io
+import json
+import math
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson  # dependência opcional
+except ImportError:
+    orjson = None
+
+
+def to_jsonable(value):
+    """Converte um valor solto (Decimal, numpy, NaN, datas) para tipo nativo do JSON"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, Decimal):
+        return None if not value.is_finite() else float(value)
+    if isinstance(value, np.generic):
+        return to_jsonable(value.item())
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return [to_jsonable(v) for v in value.tolist()]
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def _with_fill(values: list, mask: np.ndarray, fill):
+    if mask.any():
+        for i in np.flatnonzero(mask):
+            values[i] = fill
+    return values
+
+
+def column_values(series: pd.Series, kind: str = None, fill=None) -> list:
+    """
+    Valores de uma coluna como lista Python nativa.
+
+    kind: "float" | "int" | "str" | "date_br" (dd/mm/aaaa) | None (pela dtype)
+    fill: valor usado nos nulos (default None)
+    """
+    if kind in ("float", "int"):
+        numeric = pd.to_numeric(series, errors="coerce").astype(float)
+        mask = ~np.isfinite(numeric.to_numpy())
+        if kind == "int":
+            values = numeric.fillna(0).astype(np.int64).tolist()
+        else:
+            values = numeric.fillna(0.0).tolist()
+        return _with_fill(values, mask, fill)
+
+    if kind == "date_br":
+        dates = pd.to_datetime(series, errors="coerce")
+        return _with_fill(dates.dt.strftime("%d/%m/%Y").tolist(), dates.isna().to_numpy(), fill)
+
+    if kind == "str":
+        mask = series.isna().to_numpy()
+        return _with_fill(series.astype(str).tolist(), mask, fill)
+
+    dtype = series.dtype
+    mask = series.isna().to_numpy()
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return _with_fill(series.astype(object).tolist(), mask, fill)
+    if pd.api.types.is_float_dtype(dtype):
+        return _with_fill(series.tolist(), mask | np.isinf(series.to_numpy(dtype=float, na_value=np.nan)), fill)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return _with_fill([v.isoformat() if v is not pd.NaT else None for v in series], mask, fill)
+
+    # object: Decimal/str/date vindos do driver
+    sample = series[~mask].iloc[0] if (~mask).any() else None
+    if isinstance(sample, Decimal):
+        return column_values(series, "float", fill)
+    if isinstance(sample, str) and all(isinstance(v, str) for v in series[~mask]):
+        return _with_fill(series.tolist(), mask, fill)
+    return _with_fill([to_jsonable(v) for v in series.tolist()], mask, fill)
+
+
+def records(df: pd.DataFrame, columns=None, types: dict = None, fill: dict = None, rename: dict = None) -> list:
+    """
+    DataFrame -> [{coluna: valor}] com conversão vetorizada por coluna.
+
+    Args:
+        columns: colunas (e ordem) do resultado; default todas
+        types: {coluna: kind} (ver column_values); demais colunas pela dtype
+        fill: {coluna: valor} para nulos; default None
+        rename: {coluna: chave no JSON}
+    """
+    if df is None or df.empty:
+        return []
+    columns = list(columns or df.columns)
+    types, fill, rename = types or {}, fill or {}, rename or {}
+    keys = [rename.get(c, c) for c in columns]
+    values = [column_values(df[c], types.get(c), fill.get(c)) for c in columns]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def _null_non_finite(value):
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _null_non_finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_null_non_finite(v) for v in value]
+    return value
+
+
+def _stdlib_dumps(content) -> bytes:
+    return json.dumps(content, default=to_jsonable, ensure_ascii=False,
+                      allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(content) -> bytes:
+    """JSON compacto em bytes (orjson se disponível); NaN/inf viram null nos dois caminhos"""
+    if orjson is not None:
+        return orjson.dumps(content, default=to_jsonable,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        return _stdlib_dumps(content)
+    except ValueError:
+        # float nativo não passa pelo default=: NaN/inf de um payload montado à mão
+        return _stdlib_dumps(_null_non_finite(content))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse renderizada com orjson (fallback: json da stdlib)"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def encode_cursor(*values) -> str:
+    """Token opaco com a chave da última linha da página (paginação keyset)"""
+    return base64.urlsafe_b64encode(dumps(list(values))).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    """Valores do token de encode_cursor; HTTP 400 se o token for inválido"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+
+async def _csv_chunks(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(columns)
+    async for batch in batches:
+        for row in batch:
+            writer.writerow([to_jsonable(row.get(c)) for c in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _ndjson_chunks(batches):
+    async for batch in batches:
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+
+def stream_records(batches, format: str = "ndjson", columns=None, filename: str = "dados"):
+    """
+    StreamingResponse a partir de lotes assíncronos de dicts.
+
+    format: "ndjson" (uma linha JSON por registro) ou "csv" (separador ';',
+    cabeçalho `columns`, download como `filename`.csv). Cada lote é enviado
+    assim que chega; nada é acumulado em memória.
+    """
+    if format == "csv":
+        return StreamingResponse(
+            _csv_chunks(batches, columns), media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+    return StreamingResponse(_ndjson_chunks(batches), media_type="application/x-ndjson")
@@ -1,14 +1,316 @@
 from sqlalchemy import create_engine
+import functools
 import json
+import threading
+import time
 import urllib.parse
+from collections import OrderedDict, deque
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from contextvars import ContextVar
 from typing import Optional
+from config import DB_ENGINE_IDLE_TTL, DB_MAX_CONNECTIONS, DB_MAX_ENGINES, DB_POOL_MAX, DB_POOL_MIN, DB_POOL_MODE
+from utils.db_session import install_search_path_switch, install_session_setup
 
 tenant_engine_var: ContextVar[Optional[any]] = ContextVar("tenant_engine", default=None)
 tenant_cnpj_var: ContextVar[Optional[str]] = ContextVar("tenant_cnpj", default=None)
+tenant_schema_var: ContextVar[Optional[str]] = ContextVar("tenant_schema", default=None)
+
+_TRAFFIC_WINDOW = 60      # segundos considerados no dimensionamento do pool
+_RESIZE_INTERVAL = 60     # idade mínima do engine antes de redimensionar
+
+
+class ConnectionBudgetExceeded(RuntimeError):
+    """Orçamento de conexões (DB_MAX_CONNECTIONS) todo em uso por engines com lease"""
+
+
+class _EngineEntry:
+    __slots__ = ("engine", "pool_size", "max_overflow", "created_at", "last_used", "tenant", "schemas",
+                 "leases", "retired")
+
+    def __init__(self, engine, pool_size: int, max_overflow: int, tenant: str):
+        self.engine = engine
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.tenant = tenant
+        self.schemas = set()
+        self.leases = 0       # requisições/threads/jobs segurando o engine
+        self.retired = False  # fora do LRU, aguardando o último lease para o dispose()
+
+    @property
+    def reserved(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def checked_out(self) -> int:
+        try:
+            return self.engine.pool.checkedout()
+        except Exception:
+            return 0
+
+    def idle(self) -> bool:
+        return self.leases == 0 and self.checked_out() == 0
+
+
+class TenantEngineRegistry:
+    """
+    Engines SQLAlchemy por banco/schema de tenant, com limites.
+
+    - LRU: no máximo `max_engines` vivos; engines ociosos além de `idle_ttl`
+      são descartados com dispose() (fecha as conexões do pool).
+    - Orçamento: a soma de pool_size + max_overflow de todos os engines não
+      passa de `max_connections` (por worker); para abrir um engine novo os
+      ociosos menos usados são despejados, e se ainda faltar o pool nasce
+      menor (no limite 1 conexão, sem overflow). Sem nenhuma conexão livre
+      get_engine() levanta ConnectionBudgetExceeded (503 no middleware).
+    - Dimensionamento: pool_size segue o tráfego recente do tenant
+      (requisições no último minuto), entre `pool_min` e `pool_max`.
+    - shared=True: um engine por host/porta/banco/usuário atende todos os
+      schemas; o search_path vem de tenant_schema_var a cada checkout.
+    - Leases: get_engine() conta um lease até o release() correspondente
+      (o middleware segura o engine durante a requisição; run_blocking,
+      seções e jobs seguram enquanto o trabalho roda). Engine com lease não
+      é despejado nem redimensionado; se precisar sair do LRU (dispose_all
+      não conta), fica "aposentado", ainda dentro do orçamento, e o dispose()
+      acontece no último release. Sem isso, um engine despejado entre duas
+      queries de uma requisição recriaria o pool por fora do orçamento.
+    """
+
+    def __init__(self, max_connections: int = DB_MAX_CONNECTIONS, max_engines: int = DB_MAX_ENGINES,
+                 idle_ttl: int = DB_ENGINE_IDLE_TTL, pool_min: int = DB_POOL_MIN, pool_max: int = DB_POOL_MAX,
+                 shared: bool = DB_POOL_MODE == "shared"):
+        self.max_connections = max_connections
+        self.max_engines = max_engines
+        self.idle_ttl = idle_ttl
+        self.pool_min = pool_min
+        self.pool_max = max(pool_max, pool_min)
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._by_engine = {}   # id(engine) -> entrada (vivas e aposentadas com lease)
+        self._retired = []
+        self._traffic = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.resized = 0
+
+    # --- chaves / tráfego -------------------------------------------------
+    def key_for(self, db_config: dict):
+        key = (db_config.get("host"), str(db_config.get("port")), db_config.get("database"), db_config.get("user"))
+        return key if self.shared else key + (db_config.get("schema", "public"),)
+
+    def _hit(self, key, now: float) -> int:
+        """Registra uma requisição e devolve quantas houve na janela"""
+        hits = self._traffic.get(key)
+        if hits is None:
+            hits = self._traffic[key] = deque(maxlen=10000)
+        hits.append(now)
+        while hits and hits[0] < now - _TRAFFIC_WINDOW:
+            hits.popleft()
+        return len(hits)
+
+    def _recommended_size(self, recent: int) -> int:
+        # ~1 conexão extra a cada 30 req/min acima do mínimo
+        return max(self.pool_min, min(self.pool_max, self.pool_min + recent // 30))
+
+    # --- criação / despejo --------------------------------------------------
+    @staticmethod
+    def _label(key) -> str:
+        return "/".join(str(k) for k in (key[0],) + key[2:3] + key[4:])
+
+    def _reserved(self) -> int:
+        return sum(e.reserved for e in self._entries.values()) + sum(e.reserved for e in self._retired)
+
+    def _dispose(self, entry: _EngineEntry):
+        self._by_engine.pop(id(entry.engine), None)
+        try:
+            entry.engine.dispose()
+        except Exception as e:
+            print(f"⚠️ [DB CONTEXT] dispose falhou para {entry.tenant}: {e}", flush=True)
+        self.evicted += 1
+
+    def _evict(self, key):
+        """Tira o engine do LRU; o dispose() espera o último lease"""
+        entry = self._entries.pop(key)
+        if entry.leases > 0:
+            entry.retired = True
+            self._retired.append(entry)
+        else:
+            self._dispose(entry)
+
+    def _evict_idle_lru(self, keep) -> bool:
+        """Despeja o engine ocioso menos usado (exceto `keep`). False se não houver."""
+        for key, entry in self._entries.items():
+            if key != keep and entry.idle():
+                self._evict(key)
+                return True
+        return False
+
+    def _sweep(self, now: float):
+        """Descarta engines ociosos além do TTL e limpa tráfego antigo"""
+        for key in [k for k, e in self._entries.items()
+                    if now - e.last_used > self.idle_ttl and e.idle()]:
+            self._evict(key)
+        for key in [k for k, hits in self._traffic.items()
+                    if k not in self._entries and (not hits or hits[-1] < now - _TRAFFIC_WINDOW)]:
+            del self._traffic[key]
+
+    def _fit_budget(self, key, pool_size: int) -> tuple:
+        """
+        Abre espaço no orçamento para `pool_size` (x2 com overflow) e devolve
+        (pool_size, max_overflow) que cabem no que sobrou.
+        """
+        while len(self._entries) >= self.max_engines and self._evict_idle_lru(keep=key):
+            pass
+        while self._reserved() + pool_size * 2 > self.max_connections and self._evict_idle_lru(keep=key):
+            pass
+        available = self.max_connections - self._reserved()
+        if available <= 0:
+            raise ConnectionBudgetExceeded(
+                f"Orçamento de conexões esgotado ({self._reserved()}/{self.max_connections}); tente novamente")
+        size = max(1, min(pool_size, available // 2))
+        overflow = min(size, available - size)
+        if size + overflow < pool_size * 2:
+            print(f"⚠️ [DB CONTEXT] Orçamento de conexões quase esgotado ({self._reserved()}/{self.max_connections}); "
+                  f"pool de {self._label(key)} reduzido para {size}+{overflow}", flush=True)
+        return size, overflow
+
+    def _create(self, key, db_config: dict, pool_size: int, max_overflow: int, tenant: str) -> _EngineEntry:
+        user = db_config.get("user")
+        password = urllib.parse.quote_plus(db_config.get("password", ""))
+        db_url = f"postgresql://{user}:{password}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}"
+
+        engine = create_engine(
+            db_url,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            connect_args={"client_encoding": "utf8"}
+        )
+        if self.shared:
+            install_session_setup(engine)
+            install_search_path_switch(engine, tenant_schema_var.get)
+        else:
+            install_session_setup(engine, search_path=db_config.get('schema', 'public'))
+        entry = _EngineEntry(engine, pool_size, max_overflow, tenant)
+        self._entries[key] = entry
+        self._by_engine[id(engine)] = entry
+        self.created += 1
+        return entry
+
+    def get_engine(self, db_config: dict, tenant: str = None):
+        """
+        Engine do banco/schema do tenant (cria, reaproveita ou redimensiona),
+        com um lease: devolver com release(engine). ConnectionBudgetExceeded
+        se não couber nem uma conexão no orçamento.
+        """
+        key = self.key_for(db_config)
+        now = time.monotonic()
+        with self._lock:
+            recent = self._hit(key, now)
+            self._sweep(now)
+            wanted = self._recommended_size(recent)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = now
+                if tenant:
+                    entry.tenant = tenant
+                entry.schemas.add(db_config.get("schema", "public"))
+                self._entries.move_to_end(key)
+                resize = (
+                    abs(wanted - entry.pool_size) >= 2
+                    and now - entry.created_at > _RESIZE_INTERVAL
+                    and entry.idle()
+                )
+                if not resize:
+                    entry.leases += 1
+                    return entry.engine
+                self._evict(key)
+                self.resized += 1
+
+            size, overflow = self._fit_budget(key, wanted)
+            entry = self._create(key, db_config, size, overflow, tenant)
+            entry.schemas.add(db_config.get("schema", "public"))
+            entry.leases += 1
+            return entry.engine
+
+    def retain(self, engine) -> bool:
+        """Lease extra num engine já entregue (trabalho que sobrevive à requisição). False se não é do registry."""
+        with self._lock:
+            entry = self._by_engine.get(id(engine))
+            if entry is None or entry.engine is not engine:
+                return False
+            entry.leases += 1
+            return True
+
+    def capacity(self, engine):
+        """pool_size + max_overflow do engine, ou None se não é do registry"""
+        with self._lock:
+            entry = self._by_engine.get(id(engine))
+            return entry.reserved if entry is not None and entry.engine is engine else None
+
+    def release(self, engine):
+        """Devolve um lease; engine aposentado é descartado no último"""
+        with self._lock:
+            entry = self._by_engine.get(id(engine))
+            if entry is None or entry.engine is not engine:
+                return
+            entry.leases = max(0, entry.leases - 1)
+            if entry.retired and entry.leases == 0:
+                self._retired.remove(entry)
+                self._dispose(entry)
+
+    def stats(self):
+        """Conexões abertas/em uso por tenant e uso do orçamento"""
+        now = time.monotonic()
+        with self._lock:
+            tenants = []
+            for key, entry in reversed(self._entries.items()):
+                pool = entry.engine.pool
+                try:
+                    checked_in, checked_out = pool.checkedin(), pool.checkedout()
+                except Exception:
+                    checked_in, checked_out = 0, 0
+                hits = self._traffic.get(key) or ()
+                tenants.append({
+                    "tenant": entry.tenant,
+                    "host": key[0],
+                    "database": key[2],
+                    "schemas": sorted(entry.schemas),
+                    "pool_size": entry.pool_size,
+                    "max_overflow": entry.max_overflow,
+                    "open_connections": checked_in + checked_out,
+                    "in_use": checked_out,
+                    "leases": entry.leases,
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "requests_last_minute": sum(1 for t in hits if t >= now - _TRAFFIC_WINDOW),
+                })
+            return {
+                "mode": "shared" if self.shared else "schema",
+                "engines": len(self._entries),
+                "retired_in_use": len(self._retired),
+                "max_engines": self.max_engines,
+                "reserved_connections": self._reserved(),
+                "max_connections": self.max_connections,
+                "open_connections": sum(t["open_connections"] for t in tenants),
+                "created": self.created,
+                "evicted": self.evicted,
+                "resized": self.resized,
+                "tenants": tenants,
+            }
+
+    def dispose_all(self):
+        with self._lock:
+            for entry in list(self._entries.values()) + self._retired:
+                self._dispose(entry)
+            self._entries.clear()
+            self._retired = []
+
+
+engine_registry = TenantEngineRegistry()
 
-_engines_cache = {}
 
 def get_tenant_engine():
     return tenant_engine_var.get()
@@ -16,42 +318,65 @@ def get_tenant_engine():
 def get_tenant_cnpj():
     return tenant_cnpj_var.get()
 
+def get_tenant_key():
+    """
+    Identidade do banco da requisição: (CNPJ, engine, schema). Requisições sem
+    CNPJ de bancos diferentes (outro db-config) não se confundem; o engine fica
+    vivo (lease) enquanto houver trabalho usando a chave.
+    """
+    engine = tenant_engine_var.get()
+    return (tenant_cnpj_var.get(), id(engine) if engine is not None else None, tenant_schema_var.get())
+
+def hold_tenant_engine():
+    """
+    Lease no engine do tenant atual para trabalho que pode passar do fim da
+    requisição (thread do pool, seção com timeout, job). Devolve a função que
+    libera o lease; chamar uma única vez.
+    """
+    engine = tenant_engine_var.get()
+    if engine is None or not engine_registry.retain(engine):
+        return lambda: None
+    return functools.partial(engine_registry.release, engine)
+
+async def _release_after(body_iterator, release):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        release()
+
 async def db_context_middleware(request: Request, call_next):
     cnpj = request.headers.get("x-tenant-cnpj")
     db_config_raw = request.headers.get("x-tenant-db-config")
-    
+
     engine = None
+    schema = None
     if db_config_raw:
         try:
             db_config = json.loads(db_config_raw)
-            cache_key = f"{db_config.get('host')}_{db_config.get('database')}_{db_config.get('schema', 'public')}"
-            
-            if cache_key in _engines_cache:
-                engine = _engines_cache[cache_key]
-            else:
-                user = db_config.get("user")
-                password = urllib.parse.quote_plus(db_config.get("password", ""))
-                db_url = f"postgresql://{user}:{password}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}"
-                
-                engine = create_engine(
-                    db_url, 
-                    pool_pre_ping=True, 
-                    pool_size=20,
-                    max_overflow=10,
-                    connect_args={
-                        "options": f"-c search_path={db_config.get('schema', 'public')}",
-                        "client_encoding": "utf8"
-                    }
-                )
-                _engines_cache[cache_key] = engine
+            engine = engine_registry.get_engine(db_config, tenant=cnpj)
+            schema = db_config.get("schema", "public")
+        except ConnectionBudgetExceeded as e:
+            print(f"⚠️ [DB CONTEXT] {cnpj}: {e}", flush=True)
+            return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": "1"})
         except Exception as e:
             print(f"❌ [DB CONTEXT] Error creating engine for {cnpj}: {e}", flush=True)
             pass
-            
+
     token_engine = tenant_engine_var.set(engine)
     token_cnpj = tenant_cnpj_var.set(cnpj)
+    token_schema = tenant_schema_var.set(schema)
+    release = functools.partial(engine_registry.release, engine) if engine is not None else (lambda: None)
     try:
-        return await call_next(request)
+        response = await call_next(request)
+    except BaseException:
+        release()
+        raise
     finally:
         tenant_engine_var.reset(token_engine)
         tenant_cnpj_var.reset(token_cnpj)
+        tenant_schema_var.reset(token_schema)
+    # O corpo (StreamingResponse: bundle, exportações) ainda consulta o banco
+    # depois do call_next; o lease vai até o fim do envio
+    response.body_iterator = _release_after(response.body_iterator, release)
+    return response
@@ -169,6 +169,8 @@ const AIImportDialog = ({ open, onOpenChange, onImportComplete }) => {
             const formData = new FormData();
             formData.append('file', file);
             formData.append('sheet_name', selectedSheet);
+            // Com a indústria, um layout já importado antes é reaproveitado sem chamar a IA
+            if (selectedIndustry) formData.append('industry_id', selectedIndustry);
 
             const response = await fetch(getApiUrl(PYTHON_API_URL, '/api/price-table/analyze-sheet'), {
                 method: 'POST',
@@ -375,6 +377,20 @@ const AIImportDialog = ({ open, onOpenChange, onImportComplete }) => {
                                     </div>
                                 ))}
                             </div>
+                            <div>
+                                <Label className="text-sm font-medium">Indústria</Label>
+                                <Select value={selectedIndustry} onValueChange={setSelectedIndustry}>
+                                    <SelectTrigger className="mt-1"><SelectValue placeholder="Selecione..." /></SelectTrigger>
+                                    <SelectContent className="z-[9999]">
+                                        {industries
+                                            .filter(ind => ind.for_codigo && String(ind.for_codigo).trim() !== "")
+                                            .map(ind => (
+                                                <SelectItem key={ind.for_codigo} value={String(ind.for_codigo)}>{ind.for_nomered || "Indústria sem nome"}</SelectItem>
+                                            ))}
+                                    </SelectContent>
+                                </Select>
+                                <p className="text-xs text-slate-500 mt-1">Planilha já importada para esta indústria usa o mesmo mapeamento, sem nova análise da IA.</p>
+                            </div>
                         </div>
                     )}
 